@@ -14,6 +14,10 @@ export const submitCarbonData = async (formData) => {
 
     // Check if we have a prediction
     if (flaskResponse.data && flaskResponse.data.prediction !== undefined) {
+      // Lets the insights page reuse this result instead of scoring the form again
+      if (flaskResponse.data.resultToken) {
+        localStorage.setItem("carbonResultToken", flaskResponse.data.resultToken)
+      }
       return {
         prediction: flaskResponse.data.prediction,
         insights: {
@@ -122,7 +126,12 @@ export const getLatestCarbonData = async () => {
 
         // Get insights directly from Flask API with properly formatted data
         console.log("Sending formatted data to Flask API for insights:", formattedData)
-        const insightsResponse = await axios.post(`${FLASK_API_URL}/insights`, { carbonData: formattedData })
+        // The token from the last /predict is only honoured if it belongs to this data
+        const resultToken = localStorage.getItem("carbonResultToken") || undefined
+        const insightsResponse = await axios.post(`${FLASK_API_URL}/insights`, {
+          carbonData: formattedData,
+          resultToken,
+        })
 
         if (insightsResponse.data && insightsResponse.data.insights) {
           // Replace the insights in the response with the ones from Flask API
@@ -142,6 +151,53 @@ export const getLatestCarbonData = async () => {
   }
 }
 
+// How the prediction changes if one answer changes. Pass `changes` as
+// [{ field, value }] for specific edits, or `fields` to try every other answer
+// of those questions (omit both to try every categorical question)
+export const getWhatIfScenarios = async (formData, { changes, fields } = {}) => {
+  try {
+    const response = await axios.post(`${FLASK_API_URL}/whatif`, {
+      carbonData: formData,
+      ...(changes ? { changes } : {}),
+      ...(fields ? { fields } : {}),
+    })
+    return response.data
+  } catch (error) {
+    console.error("Error fetching what-if scenarios:", error)
+    throw error
+  }
+}
+
+// Where the footprint ranks among the reference population (overall and among
+// people with the same diet, transport and heating) plus the most similar
+// profiles. Pass the /predict resultToken to skip predicting again
+export const getPopulationBenchmark = async (formData, { resultToken, neighbours } = {}) => {
+  try {
+    const response = await axios.post(`${FLASK_API_URL}/benchmark`, {
+      carbonData: formData,
+      ...(resultToken ? { resultToken } : {}),
+      ...(neighbours !== undefined ? { neighbours } : {}),
+    })
+    return response.data
+  } catch (error) {
+    console.error("Error fetching population benchmark:", error)
+    throw error
+  }
+}
+
+// Population-level SHAP aggregates for the dashboard charts (mean |SHAP| and
+// average share per feature and category, overall and per segment). They are
+// precomputed offline; the browser revalidates its copy with the ETag
+export const getPopulationShapSummary = async () => {
+  try {
+    const response = await axios.get(`${FLASK_API_URL}/shap/summary`)
+    return response.data
+  } catch (error) {
+    console.error("Error fetching population SHAP summary:", error)
+    throw error
+  }
+}
+
 // Convert kg to tons
 export const kgToTons = (kg) => {
   return kg / 1000
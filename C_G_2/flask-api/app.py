@@ -1,497 +1,632 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import numpy as np
-import pandas as pd
-import pickle
+import functools
 import os
-import joblib
-import shap
-from catboost import CatBoostRegressor
-from catboost import Pool
+import threading
+import time
+from explainers import DEFAULT_EXPLAINER, EXPLAINER_BACKENDS
+from feature_schema import DEFAULT_SCHEMA, SchemaValidationError, model_schema
+from instrumentation import METRICS_CONTENT_TYPE, get_logger, observe_request, registry, stage
+from model_loader import MODEL_LOAD_MODE, ModelLoader
+from model_registry import BUNDLED_VERSION, MODEL_VERSION_HEADER, ModelRegistry, ModelVersion
+from population import MAX_POPULATION_NEIGHBOURS, POPULATION_NEIGHBOURS, PopulationIndex, ReferenceProfiles
+from prediction_cache import create_prediction_cache, file_fingerprint
+from recommendations import RecommendationEngine
+from scoring import ScoringPipeline
+from shap_summary import SHAP_SUMMARY_MAX_AGE, ShapSummaryStore, model_guid, summary_directory
+from tree_model import DEFAULT_TREES_PATH, ObliviousTreeModel, matches_validation
+from whatif import WhatIfScorer
 
 app = Flask(__name__)
-CORS(app, origins=["https://carbon-care-ml.vercel.app"])
-
-# Load CatBoost model
-model_path = 'catboost_model.pkl'
-if os.path.exists(model_path):
-    model = joblib.load(model_path)
-    print("CatBoost model loaded successfully")
-else:
-    print(f"Model file not found at {model_path}")
-    model = None
-
-# Initialize SHAP explainer
-explainer = None
-if model is not None:
+
+# Errors always; per-request payloads only at LOG_LEVEL=DEBUG and for LOG_SAMPLE_RATE of requests
+logger = get_logger()
+# Browser origins allowed to call the API (also used by the ASGI mode in asgi.py)
+ALLOWED_ORIGINS = ["https://carbon-care-ml.vercel.app"]
+CORS(app, origins=ALLOWED_ORIGINS, expose_headers=[MODEL_VERSION_HEADER])
+
+# CatBoost model, loaded in the background (see model_loader) so the port opens immediately;
+# replacements and trained versions are picked up later by the model registry (see model_registry.py)
+model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catboost_model.pkl')
+
+# Recommendation templates and rules, compiled once from recommendations.json
+recommendation_engine = RecommendationEngine.from_file()
+
+# 'catboost' predicts with the loaded model; 'trees' with the memory-mapped export
+# written by `python tree_model.py export` (same numbers, pages shared across workers).
+# Either way the native explainer's SHAP call still yields the served predictions.
+PREDICTION_ENGINE = os.environ.get('PREDICTION_ENGINE', 'catboost')
+tree_model_path = os.environ.get('TREE_MODEL_PATH', DEFAULT_TREES_PATH)
+
+# The bundled model's schema; requests are checked against their version's pipeline.schema
+schema = DEFAULT_SCHEMA
+
+
+def warm_up_explainer(model, pipeline):
+    """
+    Build the default explainer and run it once so the first request does not pay for it
+    """
     try:
-        # For CatBoost, we can use TreeExplainer
-        explainer = shap.TreeExplainer(model)
-        print("SHAP explainer initialized successfully")
+        pipeline.get_explainer(model=model).explain(pipeline.schema.to_pool([pipeline.schema.encode({})]))
     except Exception as e:
-        print(f"Error initializing SHAP explainer: {str(e)}")
-
-# Define feature categories
-FEATURE_CATEGORIES = {
-    'Personal Information': [
-        'Body Type', 'Sex', 'Diet', 'How Often Shower'
-    ],
-    'Transportation': [
-        'Transport', 'Vehicle Type', 'Vehicle Monthly Distance Km', 'Frequency of Traveling by Air'
-    ],
-    'Lifestyle': [
-        'Social Activity', 'Monthly Grocery Bill', 'How Long TV PC Daily Hour', 
-        'How Long Internet Daily Hour', 'How Many New Clothes Monthly'
-    ],
-    'Waste & Consumption': [
-        'Waste Bag Size', 'Waste Bag Weekly Count', 'Recycling', 'Cooking_With'
-    ],
-    'Home Energy': [
-        'Heating Energy Source', 'Energy efficiency'
-    ]
-}
-
-
-def preprocess_input_for_catboost(data):
-    """
-    Minimal preprocessing for CatBoost - it handles categorical features automatically
-    """
-    print(f"Preprocessing data for CatBoost: {data}")
-    
-    # Convert input data to DataFrame
-    input_df = pd.DataFrame([data])
-    
-    # Define expected columns based on your training data
-    expected_columns = [
-    'Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
-    'Transport', 'Vehicle Type', 'Social Activity', 'Monthly Grocery Bill',
-    'Frequency of Traveling by Air', 'Vehicle Monthly Distance Km',
-    'Waste Bag Size', 'Waste Bag Weekly Count', 'How Long TV PC Daily Hour',
-    'How Many New Clothes Monthly', 'How Long Internet Daily Hour',
-    'Energy efficiency', 'Recycling', 'Cooking_With'
-    ]
-    
-    # Fill missing columns with default values
-    for col in expected_columns:
-        if col not in input_df.columns:
-            if col in ['Monthly Grocery Bill', 'Vehicle Monthly Distance Km', 'Waste Bag Weekly Count',
-                      'How Long TV PC Daily Hour', 'How Many New Clothes Monthly', 'How Long Internet Daily Hour']:
-                input_df[col] = 0
-            else:
-                input_df[col] = 'None'
-    
-    # Reorder columns to match training data order
-    input_df = input_df[expected_columns]
-    
-    # Define categorical columns - these should match what you used during training
-    categorical_features = [
-        'Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
-        'Transport', 'Vehicle Type', 'Social Activity', 'Frequency of Traveling by Air',
-        'Waste Bag Size', 'Energy efficiency', 'Recycling', 'Cooking_With'
-    ]
-    
-    # Ensure categorical columns are strings
-    for col in categorical_features:
-        if col in input_df.columns:
-            input_df[col] = input_df[col].astype(str)
-    
-    # Ensure numerical columns are numeric
-    numerical_features = [
-        'Monthly Grocery Bill', 'Vehicle Monthly Distance Km', 'Waste Bag Weekly Count',
-        'How Long TV PC Daily Hour', 'How Many New Clothes Monthly', 'How Long Internet Daily Hour'
-    ]
-    
-    for col in numerical_features:
-        if col in input_df.columns:
-            try:
-                input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
-                input_df[col] = input_df[col].fillna(0)  # Fill NaN with 0
-            except:
-                input_df[col] = 0
-    
-    print(f"Processed DataFrame shape: {input_df.shape}")
-    print(f"DataFrame dtypes:\n{input_df.dtypes}")
-    print(f"Sample data:\n{input_df.head()}")
-    
-    return input_df
-def get_category_based_shap_importance(input_df, top_individual_features=3):
-    """
-    Calculate SHAP values and return both category-wise and individual feature importance
+        logger.error("Error initializing SHAP explainer: %s", e)
+
+
+def load_tree_model(model, pipeline, path):
     """
+    Memory-map the exported trees at path for PREDICTION_ENGINE=trees, if they still match the model
+    """
+    if PREDICTION_ENGINE != 'trees':
+        return
     try:
-        if explainer is None:
-            print("SHAP explainer not available")
-            return [], []
-        
-        print(f"Input DataFrame for SHAP:")
-        print(f"Shape: {input_df.shape}")
-        print(f"Data types: {input_df.dtypes.to_dict()}")
-        
-        # Calculate SHAP values
-        shap_values = explainer.shap_values(input_df)
-        
-        # Handle different SHAP output formats
-        if isinstance(shap_values, list):
-            # For multi-class or multi-output models
-            shap_vals = shap_values[0][0] if len(shap_values[0].shape) > 1 else shap_values[0]
-        else:
-            # For single output models
-            shap_vals = shap_values[0] if len(shap_values.shape) > 1 else shap_values
-        
-        # Get feature names
-        feature_names = input_df.columns.tolist()
-        
-        # Ensure we have the right number of SHAP values
-        if len(shap_vals) != len(feature_names):
-            print(f"Mismatch: {len(shap_vals)} SHAP values vs {len(feature_names)} features")
-            return [], []
-        
-        # Create feature importance dictionary
-        feature_importance = {}
-        for i, feature in enumerate(feature_names):
-            feature_importance[feature] = abs(float(shap_vals[i]))
-        
-        # Calculate total importance for percentage calculation
-        total_importance = sum(feature_importance.values())
-        
-        if total_importance == 0:
-            print("Total importance is zero, returning empty lists")
-            return [], []
-        
-        # Calculate category-wise importance
-        category_importance = {}
-        category_details = {}
-        
-        for category, features in FEATURE_CATEGORIES.items():
-            category_total = 0
-            category_features = []
-            
-            for feature in features:
-                if feature in feature_importance:
-                    importance = feature_importance[feature]
-                    category_total += importance
-                    category_features.append({
-                        'feature': feature,
-                        'importance': importance,
-                        'contribution': float(shap_vals[feature_names.index(feature)])
-                    })
-            
-            if category_total > 0:
-                category_importance[category] = category_total
-                category_details[category] = {
-                    'total_importance': category_total,
-                    'percentage': (category_total / total_importance) * 100,
-                    'features': sorted(category_features, key=lambda x: x['importance'], reverse=True)
-                }
-        
-        # Create category breakdown for pie chart
-        category_breakdown = []
-        for category, details in category_details.items():
-            category_breakdown.append({
-                'name': category,
-                'value': details['total_importance'],
-                'percentage': round(details['percentage'], 2),
-                'top_features': [f['feature'] for f in details['features'][:2]]  # Top 2 features in category
-            })
-        
-        # Sort categories by importance
-        category_breakdown = sorted(category_breakdown, key=lambda x: x['value'], reverse=True)
-        
-        # Get top individual features across all categories
-        all_features_sorted = sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)
-        top_individual_features_list = []
-        
-        for feature, importance in all_features_sorted[:top_individual_features]:
-            percentage = (importance / total_importance) * 100
-            if percentage > 1:  # Only include features with >1% contribution
-                # Find which category this feature belongs to
-                feature_category = "Other"
-                for cat, features in FEATURE_CATEGORIES.items():
-                    if feature in features:
-                        feature_category = cat
-                        break
-                
-                top_individual_features_list.append({
-                    'feature': feature,
-                    'category': feature_category,
-                    'contribution': float(shap_vals[feature_names.index(feature)]),
-                    'importance': float(importance),
-                    'percentage': round(percentage, 2)
-                })
-        
-        print(f"Category-based breakdown: {category_breakdown}")
-        print(f"Top individual features: {top_individual_features_list}")
-        
-        return category_breakdown, top_individual_features_list
-        
+        tree_model = ObliviousTreeModel.load(path)
+        if not matches_validation(tree_model, model):
+            raise ValueError(f"export at {path} does not match the model; re-run tree_model.py export")
+    except (OSError, ValueError) as e:
+        logger.error("Tree model not loaded, predicting with CatBoost: %s", e)
+        return
+    pipeline.tree_model = tree_model
+    logger.info("Tree model loaded from %s", path)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_reference_profiles(version_schema):
+    return ReferenceProfiles.load(version_schema)
+
+
+# The model loader and the registry watcher can build versions at the same time
+_reference_profiles_lock = threading.Lock()
+
+
+def reference_profiles(version_schema):
+    """
+    The reference dataset profiles encoded with a schema, read on first use and
+    shared by every version trained against that schema
+    """
+    with _reference_profiles_lock:
+        return _load_reference_profiles(version_schema)
+
+
+def build_population_index(pipeline):
+    """
+    Predict the reference profiles with pipeline's model and index the results; None if that fails
+    """
+    started = time.perf_counter()
+    try:
+        population = PopulationIndex.build(reference_profiles(pipeline.schema), pipeline)
     except Exception as e:
-        print(f"Error calculating SHAP values: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return [], []
+        logger.error("Population index not built: %s", e)
+        return None
+    logger.info("Population index of %d profiles built in %.2fs", len(population.profiles),
+                time.perf_counter() - started)
+    return population
+
+
+def build_version(name, path, model, fingerprint):
+    """
+    A warmed-up ModelVersion for a loaded model, with its own scoring pipeline
+
+    Requests for the version are validated and encoded with the feature schema
+    saved next to its model file (DEFAULT_SCHEMA when there is none).
+    """
+    try:
+        version_schema = model_schema(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Feature schema next to {path} not loaded: {e}")
+    # Every endpoint scores through the version's pipeline (see scoring.py); its
+    # prediction cache serves repeated questionnaires for this model file only
+    version_pipeline = ScoringPipeline(
+        version_schema, lambda: model, recommendation_engine, create_prediction_cache(lambda: fingerprint),
+        fingerprint=lambda: fingerprint
+    )
+    if name == BUNDLED_VERSION:
+        trees_path = tree_model_path
+    else:
+        trees_path = os.path.join(os.path.dirname(path), os.path.basename(DEFAULT_TREES_PATH))
+    load_tree_model(model, version_pipeline, trees_path)
+    warm_up_explainer(model, version_pipeline)
+    population = build_population_index(version_pipeline)
+    return ModelVersion(name, path, model, version_pipeline, fingerprint, population)
+
+
+# Every loaded model version; requests pick one with the X-Model-Version header
+model_registry = ModelRegistry(build_version, model_path)
+
+
+def install_bundled_model(model):
+    """
+    Warm up the model the loader read and serve it as the 'bundled' version
+    """
+    model_registry.install(build_version(BUNDLED_VERSION, model_path, model, file_fingerprint(model_path)))
+
+
+def get_explainer(name=None, model=None):
+    """
+    Return the named explainer backend (defaults to EXPLAINER_BACKEND) for the default model version
+    """
+    return model_registry.get().pipeline.get_explainer(name, model)
+
+
+model_loader = ModelLoader(model_path, warmups=[install_bundled_model])
+
+
+def model_unavailable_body():
+    """
+    (body, status code) for scoring requests that arrive before the model is ready
+    """
+    status = model_loader.status()
+    if status['state'] == 'failed':
+        return {'error': 'Model not loaded', 'status': status}, 500
+    return {'error': 'Model is still loading', 'status': status}, 503
+
+
+def model_unavailable():
+    """
+    Response for scoring requests that arrive before the model is ready
+    """
+    body, code = model_unavailable_body()
+    return jsonify(body), code, {'Retry-After': '1'} if code == 503 else {}
+
+
+def unknown_version_body(name):
+    """
+    (body, status code) for a request naming a model version that is not loaded
+    """
+    return {'error': f"Unknown model version '{name}'", 'versions': sorted(model_registry.versions)}, 404
+
+
+def request_version():
+    """
+    The model version the request asked for with X-Model-Version (default: the
+    default version), remembered for the response header; None if not loaded
+    """
+    version = model_registry.get(request.headers.get(MODEL_VERSION_HEADER))
+    if version is not None:
+        g.model_version = version.name
+    return version
+
+
+def invalid_input_body(error):
+    """
+    (body, status code) for a request the feature schema rejected
+    """
+    body = {'error': str(error), 'fields': error.errors}
+    if error.record is not None:
+        body['record'] = error.record
+    return body, 400
+
+
+def check_records(records, pipeline=None):
+    """
+    Validate every record of a batch against the pipeline's schema before any of them is scored
+    """
+    version_schema = (pipeline or model_registry.get().pipeline).schema
+    for i, data in enumerate(records):
+        try:
+            version_schema.check(data)
+        except SchemaValidationError as e:
+            raise SchemaValidationError(e.errors, record=i)
+
+
+def invalid_input(error):
+    body, code = invalid_input_body(error)
+    return jsonify(body), code
+
+
+def unknown_version():
+    body, code = unknown_version_body(request.headers.get(MODEL_VERSION_HEADER))
+    return jsonify(body), code
+
+# Upper bound on records accepted by /predict/batch in a single call
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+
+# /whatif comparisons: one batched model call per record, cached per record, changes and model
+whatif_scorer = WhatIfScorer(max_changes=MAX_BATCH_SIZE)
+
 
 def generate_category_based_recommendations(data, category_breakdown, top_features):
     """
     Generate recommendations based on category importance and top features
     """
-    print(f"Generating recommendations based on categories: {[c['name'] for c in category_breakdown]}")
-    
-    recommendations = []
-    
-    # Category-specific recommendation templates
-    category_recommendations = {
-        'Personal Information': {
-            'Diet': {
-                'omnivore': {
-                    'title': 'Adopt a more plant-based diet',
-                    'description': 'Your diet significantly impacts your carbon footprint. Try reducing meat consumption and incorporating more plant-based meals.',
-                    'impact': 'high'
-                },
-                'vegetarian': {
-                    'title': 'Optimize your vegetarian diet',
-                    'description': 'Great dietary choice! Focus on local, organic produce and consider reducing dairy consumption.',
-                    'impact': 'medium'
-                },
-                'vegan': {
-                    'title': 'Maintain your sustainable diet',
-                    'description': 'Excellent choice! Continue focusing on local, seasonal produce to minimize transportation emissions.',
-                    'impact': 'low'
-                }
-            },
-            'Body Type': {
-                'default': {
-                    'title': 'Maintain healthy lifestyle choices',
-                    'description': 'Your personal characteristics influence your baseline footprint. Focus on sustainable lifestyle choices.',
-                    'impact': 'low'
-                }
-            }
-        },
-        'Transportation': {
-            'high_impact': {
-                'title': 'Revolutionize your transportation',
-                'description': 'Transportation is your biggest carbon contributor. Consider electric vehicles, public transport, or remote work options.',
-                'impact': 'high'
-            },
-            'medium_impact': {
-                'title': 'Optimize your transportation choices',
-                'description': 'Transportation significantly impacts your footprint. Try carpooling, combining trips, or using more efficient vehicles.',
-                'impact': 'medium'
-            }
-        },
-        'Lifestyle': {
-            'high_impact': {
-                'title': 'Adopt sustainable lifestyle habits',
-                'description': 'Your lifestyle choices significantly impact your footprint. Focus on reducing consumption and energy use.',
-                'impact': 'high'
-            },
-            'medium_impact': {
-                'title': 'Fine-tune your lifestyle choices',
-                'description': 'Your lifestyle contributes notably to your footprint. Consider reducing screen time and consumption.',
-                'impact': 'medium'
-            }
-        },
-        'Waste & Consumption': {
-            'high_impact': {
-                'title': 'Minimize waste and consumption',
-                'description': 'Your consumption patterns significantly impact your footprint. Focus on reducing, reusing, and recycling.',
-                'impact': 'high'
-            },
-            'medium_impact': {
-                'title': 'Improve waste management',
-                'description': 'Your waste habits contribute to your footprint. Enhance recycling and reduce unnecessary purchases.',
-                'impact': 'medium'
-            }
-        },
-        'Home Energy': {
-            'high_impact': {
-                'title': 'Upgrade your home energy systems',
-                'description': 'Your home energy use significantly impacts your footprint. Consider renewable energy and efficient appliances.',
-                'impact': 'high'
-            },
-            'medium_impact': {
-                'title': 'Improve home energy efficiency',
-                'description': 'Your home energy contributes to your footprint. Focus on insulation and energy-efficient appliances.',
-                'impact': 'medium'
-            }
+    return recommendation_engine.recommend(data, category_breakdown, top_features)
+
+
+def score_records(records, explainer_name=None, pipeline=None):
+    """
+    Score a list of request dicts: repeats come from the prediction cache, the rest
+    are encoded into one Pool and scored with one model and one SHAP call
+    (pipeline defaults to the default model version's)
+    """
+    return (pipeline or model_registry.get().pipeline).score(records, explainer_name)
+
+
+def insights_body(result):
+    """
+    Shape a scored record the way /insights returns it
+    """
+    return {
+        'carbonEmission': result['prediction'],
+        'insights': {
+            'category_breakdown': result['category_breakdown'],
+            'top_individual_features': result['top_individual_features'],
+            'recommendations': result['recommendations']
         }
     }
-    
-    # Generate recommendations based on category importance
-    for i, category in enumerate(category_breakdown[:3]):  # Top 3 categories
-        category_name = category['name']
-        percentage = category['percentage']
-        
-        if category_name in category_recommendations:
-            if category_name == 'Personal Information':
-                # Handle diet-specific recommendations
-                diet = data.get('Diet', '').lower()
-                if diet in category_recommendations[category_name]['Diet']:
-                    rec = category_recommendations[category_name]['Diet'][diet].copy()
-                else:
-                    rec = category_recommendations[category_name]['Body Type']['default'].copy()
-            else:
-                # Handle other categories based on impact level
-                impact_level = 'high_impact' if percentage > 25 else 'medium_impact'
-                if impact_level in category_recommendations[category_name]:
-                    rec = category_recommendations[category_name][impact_level].copy()
-                else:
-                    continue
-            
-            rec['category'] = category_name
-            rec['description'] = f"This category contributes {percentage}% to your footprint. " + rec['description']
-            recommendations.append(rec)
-    
-    # Add specific feature-based recommendations
-    feature_specific_recommendations = {
-        'Vehicle Monthly Distance Km': {
-            'title': 'Reduce driving distance',
-            'description': 'Your monthly driving distance is a major factor. Consider working from home, carpooling, or using public transport.',
-            'impact': 'high'
-        },
-        'Monthly Grocery Bill': {
-            'title': 'Optimize food spending and choices',
-            'description': 'Your grocery spending indicates consumption patterns. Focus on local, seasonal, and less processed foods.',
-            'impact': 'medium'
-        },
-        'How Many New Clothes Monthly': {
-            'title': 'Reduce clothing consumption',
-            'description': 'Your clothing purchases significantly impact your footprint. Try second-hand shopping and extending garment life.',
-            'impact': 'medium'
-        },
-        'Waste Bag Weekly Count': {
-            'title': 'Minimize waste generation',
-            'description': 'Your waste production is significant. Focus on reducing packaging, composting, and reusing items.',
-            'impact': 'high'
-        }
+
+
+def predict_body(result, token):
+    """
+    Shape a scored record the way /predict returns it, with the token a follow-up
+    /insights call can send to reuse it
+    """
+    return dict(result, resultToken=token)
+
+
+def held_insights_result(payload, explainer_name=None, pipeline=None):
+    """
+    The result behind an /insights body's resultToken while it is still held - and,
+    when carbonData is sent too, only if the token belongs to that data; else None
+    """
+    token = payload.get('resultToken')
+    if not token:
+        return None
+    data = payload['carbonData'] if 'carbonData' in payload else None
+    return (pipeline or model_registry.get().pipeline).resolve(token, data, explainer_name)
+
+
+def whatif_comparison(payload, pipeline=None):
+    """
+    Score a /whatif body: {"carbonData": {...}} plus either "changes": [{"field", "value"}, ...]
+    or "fields": [...] (defaults to every alternative answer of every categorical field)
+
+    Raises ValueError for a malformed body
+    """
+    data = payload.get('carbonData') if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        raise ValueError('Expected {"carbonData": {...}}')
+    pipeline = pipeline or model_registry.get().pipeline
+    pipeline.schema.check(data)
+    changes = payload.get('changes')
+    if changes is not None:
+        changes = whatif_scorer.parse_changes(changes, pipeline.schema.columns)
+        for field, value in changes:
+            pipeline.schema.check({field: value})
+    fields = payload.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise ValueError('Expected "fields": [field name, ...]')
+    return whatif_scorer.compare(pipeline, data, changes, fields)
+
+
+def population_unavailable_body():
+    """
+    (body, status code) for /benchmark when the version has no population index
+    """
+    return {'error': 'Population benchmarks are not available (reference dataset not loaded)'}, 503
+
+
+def benchmark_comparison(payload, version=None):
+    """
+    Answer a /benchmark body: {"carbonData": {...}} plus optionally "resultToken" (a
+    /predict result to reuse instead of predicting again) and "neighbours" (how many
+    similar profiles to return). version defaults to the default model version and
+    must have a population index.
+
+    Raises ValueError for a malformed body
+    """
+    data = payload.get('carbonData') if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        raise ValueError('Expected {"carbonData": {...}}')
+    version = version or model_registry.get()
+    version.pipeline.schema.check(data)
+    neighbours = payload.get('neighbours', POPULATION_NEIGHBOURS)
+    if isinstance(neighbours, bool) or not isinstance(neighbours, int) \
+            or not 0 <= neighbours <= MAX_POPULATION_NEIGHBOURS:
+        raise ValueError(f'Expected "neighbours" between 0 and {MAX_POPULATION_NEIGHBOURS}')
+    row = version.pipeline.schema.encode(data)
+    held = held_insights_result(payload, pipeline=version.pipeline)
+    with stage('predict'):
+        prediction = held['prediction'] if held is not None else version.pipeline.predict_rows([row])[0]
+    with stage('benchmark'):
+        return version.population.compare(row, prediction, neighbours)
+
+
+# summary.json of each model's offline SHAP job (shap_summary.py), re-read only when it changes
+shap_summaries = ShapSummaryStore()
+
+
+def etag_matches(etag, if_none_match):
+    """
+    True if an If-None-Match header value lists etag (weak or strong) or is '*'
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def shap_summary_result(version, if_none_match=None):
+    """
+    (status code, body, headers) for GET /shap/summary: the version's precomputed
+    summary.json bytes as is, an empty 304 body when the client's ETag still
+    matches, or an error dict (404) when no summary was computed for this model
+    """
+    summary = shap_summaries.get(summary_directory(version.path))
+    if summary is None:
+        return 404, {'error': f"No SHAP summary for model version '{version.name}'; run shap_summary.py"}, {}
+    if summary.model_guid != model_guid(version.model):
+        return 404, {'error': f"The SHAP summary next to model version '{version.name}' was computed for "
+                              f"another model; re-run shap_summary.py"}, {}
+    headers = {
+        'ETag': summary.etag,
+        'Cache-Control': f'public, max-age={SHAP_SUMMARY_MAX_AGE}',
+        # The same URL serves a different summary per model version
+        'Vary': MODEL_VERSION_HEADER,
     }
-    
-    # Add recommendations for top individual features
-    for feature_info in top_features[:2]:  # Top 2 individual features
-        feature_name = feature_info['feature']
-        percentage = feature_info['percentage']
-        
-        if feature_name in feature_specific_recommendations:
-            rec = feature_specific_recommendations[feature_name].copy()
-            rec['category'] = feature_info['category']
-            rec['description'] = f"This factor contributes {percentage}% individually. " + rec['description']
-            recommendations.append(rec)
-    
-    # Add general recommendations based on data
-    if data.get('Energy efficiency') == 'No':
-        recommendations.append({
-            'category': 'Home Energy',
-            'title': 'Improve energy efficiency',
-            'description': 'You indicated low energy efficiency awareness. Upgrade to LED lighting and energy-efficient appliances.',
-            'impact': 'medium'
-        })
-    
-    recycling = data.get('Recycling', [])
-    if not recycling or 'None' in str(recycling):
-        recommendations.append({
-            'category': 'Waste & Consumption',
-            'title': 'Start comprehensive recycling',
-            'description': 'You\'re not recycling effectively. Implement proper sorting for paper, plastic, glass, and metal.',
-            'impact': 'medium'
-        })
-    
-    # Remove duplicates and limit to top 5
-    unique_recommendations = []
-    seen_titles = set()
-    for rec in recommendations:
-        if rec['title'] not in seen_titles:
-            unique_recommendations.append(rec)
-            seen_titles.add(rec['title'])
-    
-    print(f"Generated {len(unique_recommendations)} unique recommendations")
-    return unique_recommendations[:5]
+    if etag_matches(summary.etag, if_none_match):
+        return 304, b'', headers
+    return 200, summary.body, headers
+
+
+def predict_batch(records, explainer_name=None, pipeline=None):
+    """
+    Score a list of records together: one encoding pass, one Pool, one model and one SHAP call
+    """
+    records = list(records)
+    if not records:
+        return []
+    return score_records(records, explainer_name, pipeline)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route pattern, not raw path, so unknown URLs cannot grow the label set
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe_request(endpoint, response.status_code, time.perf_counter() - started, g.get('model_version'))
+    if 'model_version' in g:
+        response.headers[MODEL_VERSION_HEADER] = g.model_version
+    return response
+
+
+@registry.register_callback
+def prediction_cache_metrics():
+    stats = {
+        name: version.pipeline.prediction_cache.stats()
+        for name, version in sorted(model_registry.versions.items()) if version.pipeline.prediction_cache is not None
+    }
+    metrics = [
+        ('carbon_prediction_cache_hits_total', 'counter', 'Prediction cache hits', 'hits'),
+        ('carbon_prediction_cache_misses_total', 'counter', 'Prediction cache misses', 'misses'),
+        ('carbon_prediction_cache_evictions_total', 'counter', 'Prediction cache evictions', 'evictions'),
+        ('carbon_prediction_cache_entries', 'gauge', 'Entries in the prediction cache', 'size'),
+    ]
+    # Grouped by metric so each family's samples stay together
+    return [
+        (name, metric_type, documentation, version_stats.get(key), {'version': version})
+        for name, metric_type, documentation, key in metrics
+        for version, version_stats in stats.items()
+    ]
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        if model is None:
-            return jsonify({'error': 'Model not loaded'}), 500
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
 
         data = request.get_json(force=True)
-        print(f"Received data for prediction: {data}")
+        logger.sample("Received data for prediction: %s", data)
+        try:
+            version.pipeline.schema.check(data)
+        except SchemaValidationError as e:
+            return invalid_input(e)
 
-        # Preprocess input
-        input_df = preprocess_input_for_catboost(data)
+        explainer_name = request.args.get('explainer')
+        if explainer_name is not None and explainer_name not in EXPLAINER_BACKENDS:
+            return jsonify({'error': f"Unknown explainer '{explainer_name}'"}), 400
 
-        # Create Pool with categorical feature info
-        cat_features = [
-           'Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
-            'Transport', 'Vehicle Type', 'Social Activity', 'Frequency of Traveling by Air',
-            'Waste Bag Size', 'Energy efficiency', 'Recycling', 'Cooking_With'
-        ]
-        input_pool = Pool(data=input_df, cat_features=cat_features)
+        # Encode, look up the cache, and predict + explain from one Pool on a miss
+        result, token = version.pipeline.score_with_tokens([data], explainer_name)[0]
 
-        # Predict using Pool
-        prediction = float(abs(model.predict(input_pool)[0]))
+        return jsonify(predict_body(result, token))
+
+    except Exception as e:
+        logger.exception("Error in /predict")
+        return jsonify({'error': str(e)}), 500
 
-        # SHAP + Recommendations
-        category_breakdown, top_features = get_category_based_shap_importance(input_df)
-        recommendations = generate_category_based_recommendations(data, category_breakdown, top_features)
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    try:
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
+
+        payload = request.get_json(force=True)
+        # Accept either a bare list of records or {"records": [...]}
+        records = payload.get('records') if isinstance(payload, dict) else payload
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return jsonify({'error': 'Expected a list of records or {"records": [...]}'}), 400
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})'}), 413
+        try:
+            check_records(records, version.pipeline)
+        except SchemaValidationError as e:
+            return invalid_input(e)
+
+        explainer_name = request.args.get('explainer')
+        if explainer_name is not None and explainer_name not in EXPLAINER_BACKENDS:
+            return jsonify({'error': f"Unknown explainer '{explainer_name}'"}), 400
+
+        logger.sample("Received batch of %d records for prediction", len(records))
+        results = predict_batch(records, explainer_name, version.pipeline)
 
         return jsonify({
-            'prediction': prediction,
-            'category_breakdown': category_breakdown,
-            'top_individual_features': top_features,
-            'recommendations': recommendations
+            'count': len(results),
+            'results': results
         })
 
     except Exception as e:
-        print(f"❌ Error in /predict: {e}")
+        logger.exception("Error in /predict/batch")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/insights', methods=['POST'])
 def get_insights():
     try:
-        if model is None:
-            return jsonify({'error': 'Model not loaded'}), 500
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
             
-        data = request.json.get('carbonData', {})
-        print(f"Received data for insights: {data}")
-        
-        # Preprocess input for CatBoost
-        input_df = preprocess_input_for_catboost(data)
-        
-        # Make prediction
-        prediction = model.predict(input_df)[0]
-        prediction = abs(float(prediction))  # Ensure positive value
-        
-        print(f"Carbon emission prediction: {prediction}")
+        payload = request.json
+        data = payload.get('carbonData', {})
+        logger.sample("Received data for insights: %s", data)
+        try:
+            version.pipeline.schema.check(data)
+        except SchemaValidationError as e:
+            return invalid_input(e)
+
+        explainer_name = request.args.get('explainer')
+        if explainer_name is not None and explainer_name not in EXPLAINER_BACKENDS:
+            return jsonify({'error': f"Unknown explainer '{explainer_name}'"}), 400
         
-        # Get category-based SHAP importance
-        category_breakdown, top_features = get_category_based_shap_importance(input_df)
+        # Reuse the /predict result when its token is sent, otherwise score carbonData
+        result = held_insights_result(payload, explainer_name, version.pipeline)
+        if result is None:
+            if payload.get('resultToken') and 'carbonData' not in payload:
+                return jsonify({'error': 'Unknown or expired result token'}), 404
+            result = score_records([data], explainer_name, version.pipeline)[0]
         
-        # Generate targeted recommendations based on categories
-        recommendations = generate_category_based_recommendations(data, category_breakdown, top_features)
+        logger.sample("Carbon emission prediction: %s", result['prediction'])
         
         # Build comprehensive insights response
-        insights = {
-            'category_breakdown': category_breakdown,
-            'top_individual_features': top_features,
-            'recommendations': recommendations
-        }
-        
-        return jsonify({
-            'carbonEmission': prediction,
-            'insights': insights
-        })
+        return jsonify(insights_body(result))
         
     except Exception as e:
-        print(f"Error in /insights: {str(e)}")
+        logger.exception("Error in /insights")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/whatif', methods=['POST'])
+def whatif():
+    try:
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
+
+        payload = request.get_json(force=True)
+        logger.sample("Received data for what-if: %s", payload)
+        try:
+            result = whatif_comparison(payload, version.pipeline)
+        except SchemaValidationError as e:
+            return invalid_input(e)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify(result)
+
+    except Exception as e:
+        logger.exception("Error in /whatif")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/benchmark', methods=['POST'])
+def benchmark():
+    try:
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
+        if version.population is None:
+            body, code = population_unavailable_body()
+            return jsonify(body), code
+
+        payload = request.get_json(force=True)
+        logger.sample("Received data for benchmark: %s", payload)
+        try:
+            result = benchmark_comparison(payload, version)
+        except SchemaValidationError as e:
+            return invalid_input(e)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify(result)
+
+    except Exception as e:
+        logger.exception("Error in /benchmark")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/shap/summary', methods=['GET'])
+def shap_summary():
+    """Population SHAP aggregates precomputed by shap_summary.py - read-only, with ETag revalidation"""
+    try:
+        if not model_loader.ready:
+            return model_unavailable()
+        version = request_version()
+        if version is None:
+            return unknown_version()
+
+        status, body, headers = shap_summary_result(version, request.headers.get('If-None-Match'))
+        if isinstance(body, dict):
+            return jsonify(body), status
+        return Response(body, status=status, mimetype='application/json', headers=headers)
+
+    except Exception as e:
+        logger.exception("Error in /shap/summary")
+        return jsonify({'error': str(e)}), 500
+
+def health_status():
+    """
+    Liveness report shared by the Flask and ASGI /health endpoints
+    """
+    default = model_registry.get()
+    pipeline = default.pipeline if default is not None else None
+    return {
+        'status': 'healthy',
+        'model_loaded': model_loader.ready,
+        'shap_available': pipeline is not None and DEFAULT_EXPLAINER in pipeline.explainers
+                          and DEFAULT_EXPLAINER != 'none',
+        'explainer': DEFAULT_EXPLAINER,
+        'explainer_backends': sorted(EXPLAINER_BACKENDS),
+        'prediction_engine': 'trees' if pipeline is not None and pipeline.tree_model is not None else 'catboost',
+        'prediction_cache': pipeline.prediction_cache.stats()
+                            if pipeline is not None and pipeline.prediction_cache is not None else None,
+        # Per-version request latency and prediction cache stats
+        'models': model_registry.status()
+    }
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    status = {
-        'status': 'healthy',
-        'model_loaded': model is not None,
-        'shap_available': explainer is not None
-    }
-    return jsonify(status)
+    return jsonify(health_status())
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint - 200 once the model and explainer are loaded, 503 before"""
+    status = model_loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics: per-stage and per-endpoint latency histograms"""
+    return registry.render(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+# Start loading last, once everything the warm-up uses is defined
+model_loader.start()
+# Under gunicorn --preload the watcher is started per worker instead (see gunicorn.conf.py)
+if MODEL_LOAD_MODE != 'eager':
+    model_registry.start()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
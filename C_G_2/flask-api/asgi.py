@@ -0,0 +1,352 @@
+"""
+ASGI serving mode with request micro-batching.
+
+Exposes the same /predict, /insights, /predict/batch, /whatif, /benchmark,
+/shap/summary, /health and /ready contracts as the Flask app, but concurrent
+/predict and /insights calls are collected by a MicroBatcher (see batching.py)
+and scored together with one CatBoost + SHAP call on a worker thread.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+MICROBATCH_MAX_SIZE and MICROBATCH_MAX_WAIT_MS bound the batch size and the
+extra latency a request can pick up while its batch fills.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs
+
+from app import (
+    ALLOWED_ORIGINS, MAX_BATCH_SIZE, benchmark_comparison, check_records, health_status, held_insights_result,
+    insights_body, invalid_input_body, logger, model_loader, model_registry, model_unavailable_body,
+    population_unavailable_body, predict_batch, predict_body, shap_summary_result, unknown_version_body,
+    whatif_comparison,
+)
+from batching import MicroBatcher
+from explainers import DEFAULT_EXPLAINER, EXPLAINER_BACKENDS
+from feature_schema import SchemaValidationError
+from instrumentation import METRICS_CONTENT_TYPE, observe_request, registry
+from model_registry import MODEL_VERSION_HEADER
+
+# Every batch goes through this one thread, so CatBoost calls never overlap
+scoring_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scoring')
+
+# One batcher per (model version, explainer backend): a batch is scored with a
+# single model and backend
+batchers = {}
+# Close tasks of swapped-out versions' batchers, referenced until they finish
+closing_batchers = set()
+
+
+def get_batcher(version, explainer_name=None):
+    """
+    Return the micro-batcher for a model version and the named explainer (defaults to EXPLAINER_BACKEND)
+    """
+    name = explainer_name or DEFAULT_EXPLAINER
+    key = (version, name)
+    if key not in batchers:
+        # Versions the registry swapped out get no new requests; let their batchers drain
+        for stale in [k for k in batchers if model_registry.get(k[0].name) is not k[0]]:
+            task = asyncio.get_running_loop().create_task(batchers.pop(stale).close())
+            closing_batchers.add(task)
+            task.add_done_callback(closing_batchers.discard)
+        batchers[key] = MicroBatcher(
+            partial(version.pipeline.score_with_tokens, explainer_name=name), executor=scoring_executor
+        )
+    return batchers[key]
+
+
+class HTTPError(Exception):
+    """
+    Turned into a JSON {'error': ...} response by the app
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RawResponse:
+    """
+    A route result sent as is: already-encoded JSON with its own status and headers
+    """
+
+    def __init__(self, body, status=200, headers=()):
+        self.body = body
+        self.status = status
+        self.headers = list(headers)
+
+
+async def read_json(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    try:
+        return json.loads(body or b'null')
+    except ValueError:
+        raise HTTPError(400, 'Request body is not valid JSON')
+
+
+async def send_bytes(send, payload, content_type, status=200, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(payload)).encode('ascii')),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def send_json(send, body, status=200, headers=()):
+    await send_bytes(send, json.dumps(body).encode('utf-8'), b'application/json', status, headers)
+
+
+def cors_headers(scope):
+    origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin-1')
+    if origin in ALLOWED_ORIGINS:
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin'),
+                (b'access-control-expose-headers', MODEL_VERSION_HEADER.encode('latin-1'))]
+    return []
+
+
+def explainer_from_query(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    explainer_name = query.get('explainer', [None])[0]
+    if explainer_name is not None and explainer_name not in EXPLAINER_BACKENDS:
+        raise HTTPError(400, f"Unknown explainer '{explainer_name}'")
+    return explainer_name
+
+
+def check_input(data, version):
+    """
+    Reject data the version's feature schema cannot use before it reaches a batch
+    """
+    try:
+        version.pipeline.schema.check(data)
+    except SchemaValidationError as e:
+        body, code = invalid_input_body(e)
+        raise HTTPError(code, body)
+
+
+def require_model(scope):
+    """
+    The model version the request asked for with X-Model-Version (default: the default version)
+    """
+    if not model_loader.ready:
+        body, code = model_unavailable_body()
+        raise HTTPError(code, body)
+    name = dict(scope.get('headers', [])).get(MODEL_VERSION_HEADER.lower().encode('latin-1'))
+    name = name.decode('latin-1') if name else None
+    version = model_registry.get(name)
+    if version is None:
+        body, code = unknown_version_body(name)
+        raise HTTPError(code, body)
+    # Read back by app() for the response header and per-version metrics
+    scope['model_version'] = version.name
+    return version
+
+
+async def predict(scope, receive):
+    version = require_model(scope)
+    data = await read_json(receive)
+    logger.sample("Received data for prediction: %s", data)
+    explainer_name = explainer_from_query(scope)
+    if not isinstance(data, dict):
+        raise HTTPError(400, 'Expected a JSON object')
+    check_input(data, version)
+    result, token = await get_batcher(version, explainer_name).submit(data)
+    return predict_body(result, token)
+
+
+async def insights(scope, receive):
+    version = require_model(scope)
+    payload = await read_json(receive)
+    data = payload.get('carbonData', {}) if isinstance(payload, dict) else None
+    logger.sample("Received data for insights: %s", data)
+    explainer_name = explainer_from_query(scope)
+    if not isinstance(data, dict):
+        raise HTTPError(400, 'Expected {"carbonData": {...}}')
+    check_input(data, version)
+    # Reuse the /predict result when its token is sent, otherwise score carbonData
+    result = held_insights_result(payload, explainer_name, version.pipeline)
+    if result is None:
+        if payload.get('resultToken') and 'carbonData' not in payload:
+            raise HTTPError(404, 'Unknown or expired result token')
+        result, _ = await get_batcher(version, explainer_name).submit(data)
+    logger.sample("Carbon emission prediction: %s", result['prediction'])
+    return insights_body(result)
+
+
+async def predict_batch_route(scope, receive):
+    version = require_model(scope)
+    payload = await read_json(receive)
+    # Accept either a bare list of records or {"records": [...]}
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise HTTPError(400, 'Expected a list of records or {"records": [...]}')
+    if len(records) > MAX_BATCH_SIZE:
+        raise HTTPError(413, f'Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})')
+    try:
+        check_records(records, version.pipeline)
+    except SchemaValidationError as e:
+        body, code = invalid_input_body(e)
+        raise HTTPError(code, body)
+    explainer_name = explainer_from_query(scope)
+    logger.sample("Received batch of %d records for prediction", len(records))
+    # Already a batch: score it as is, on the same thread as the micro-batches
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(scoring_executor, predict_batch, records, explainer_name, version.pipeline)
+    return {'count': len(results), 'results': results}
+
+
+async def whatif(scope, receive):
+    version = require_model(scope)
+    payload = await read_json(receive)
+    logger.sample("Received data for what-if: %s", payload)
+    # One batched model call; run it on the scoring thread like the micro-batches
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(scoring_executor, whatif_comparison, payload, version.pipeline)
+    except SchemaValidationError as e:
+        body, code = invalid_input_body(e)
+        raise HTTPError(code, body)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+
+async def benchmark(scope, receive):
+    version = require_model(scope)
+    if version.population is None:
+        body, code = population_unavailable_body()
+        raise HTTPError(code, body)
+    payload = await read_json(receive)
+    logger.sample("Received data for benchmark: %s", payload)
+    # May predict the record; keep model calls on the scoring thread
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(scoring_executor, benchmark_comparison, payload, version)
+    except SchemaValidationError as e:
+        body, code = invalid_input_body(e)
+        raise HTTPError(code, body)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+
+async def shap_summary(scope, receive):
+    version = require_model(scope)
+    if_none_match = dict(scope.get('headers', [])).get(b'if-none-match', b'').decode('latin-1')
+    status, body, headers = shap_summary_result(version, if_none_match)
+    if isinstance(body, dict):
+        raise HTTPError(status, body)
+    return RawResponse(body, status, [
+        (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()
+    ])
+
+
+async def health(scope, receive):
+    status = health_status()
+    status['micro_batching'] = {
+        f'{version.name}/{name}': batcher.stats() for (version, name), batcher in batchers.items()
+    }
+    return status
+
+
+@registry.register_callback
+def micro_batching_metrics():
+    stats = [batcher.stats() for batcher in batchers.values()]
+    return [
+        ('carbon_microbatch_batches_total', 'counter', 'Micro-batches scored',
+         sum(s['batches'] for s in stats)),
+        ('carbon_microbatch_records_total', 'counter', 'Records scored through micro-batches',
+         sum(s['items'] for s in stats)),
+        ('carbon_microbatch_queued', 'gauge', 'Records waiting for a micro-batch',
+         sum(s['queued'] for s in stats)),
+    ]
+
+
+ROUTES = {
+    ('POST', '/predict'): predict,
+    ('POST', '/predict/batch'): predict_batch_route,
+    ('POST', '/insights'): insights,
+    ('POST', '/whatif'): whatif,
+    ('POST', '/benchmark'): benchmark,
+    ('GET', '/shap/summary'): shap_summary,
+    ('GET', '/health'): health,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            model_registry.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            model_registry.stop()
+            # Queued requests are scored before the executor goes away
+            for batcher in batchers.values():
+                await batcher.close()
+            if closing_batchers:
+                await asyncio.gather(*closing_batchers)
+            scoring_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    headers = cors_headers(scope)
+    if (method, path) == ('GET', '/metrics'):
+        return await send_bytes(send, registry.render().encode('utf-8'), METRICS_CONTENT_TYPE.encode('ascii'),
+                                200, headers)
+    if method == 'OPTIONS':
+        # CORS preflight
+        if headers:
+            requested = dict(scope.get('headers', [])).get(b'access-control-request-headers', b'')
+            headers += [(b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                        (b'access-control-allow-headers', requested)]
+        return await send_json(send, {}, 200, headers)
+
+    if (method, path) == ('GET', '/ready'):
+        status = model_loader.status()
+        return await send_json(send, status, 200 if status['ready'] else 503, headers)
+
+    route = ROUTES.get((method, path))
+    if route is None:
+        return await send_json(send, {'error': 'Not found'}, 404, headers)
+    started = time.perf_counter()
+    status = 200
+    try:
+        body = await route(scope, receive)
+        if isinstance(body, RawResponse):
+            status = body.status
+    except HTTPError as e:
+        error = e.args[0]
+        body = error if isinstance(error, dict) else {'error': error}
+        status = e.status
+        if status == 503:
+            headers.append((b'retry-after', b'1'))
+    except Exception as e:
+        logger.exception("Error in %s", path)
+        body = {'error': str(e)}
+        status = 500
+    model_version = scope.get('model_version')
+    observe_request(path, status, time.perf_counter() - started, model_version)
+    if model_version is not None:
+        headers.append((MODEL_VERSION_HEADER.lower().encode('latin-1'), model_version.encode('latin-1')))
+    if isinstance(body, RawResponse):
+        return await send_bytes(send, body.body, b'application/json', status, headers + body.headers)
+    return await send_json(send, body, status, headers)
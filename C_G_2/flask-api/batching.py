@@ -0,0 +1,134 @@
+"""
+Request micro-batching for the async serving mode.
+
+Concurrent single-record requests are collected for at most MICROBATCH_MAX_WAIT_MS
+(or until MICROBATCH_MAX_SIZE records are waiting) and handed to a synchronous
+handler as one list, on a worker thread, so the event loop keeps accepting
+requests while CatBoost and SHAP run on the whole batch at once.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Largest number of records scored together
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 32))
+# How long the first record of a batch may wait for company
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 5))
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches and runs handler(items) -> results on an executor
+    """
+
+    def __init__(self, handler, max_batch_size=MICROBATCH_MAX_SIZE, max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                 executor=None):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        # One thread by default: CatBoost already uses every core for a batch.
+        # A shared executor passed in is left running by close().
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='scoring')
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._pending = []
+        self._wakeup = None
+        self._full = None
+        self._worker = None
+        self._closing = False
+
+    def _start(self):
+        # Events and the collector task belong to the loop of the first submit
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._collect())
+
+    async def submit(self, item):
+        """
+        Queue one item and wait for its result (or the handler's exception);
+        raises RuntimeError once the batcher is closed
+        """
+        if self._closing:
+            raise RuntimeError('MicroBatcher is closed')
+        if self._worker is None:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    async def _collect(self):
+        while True:
+            await self._wakeup.wait()
+            # Closing: score what is queued without waiting for company
+            if not self._closing and len(self._pending) < self.max_batch_size and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if not self._pending:
+                self._wakeup.clear()
+            if len(self._pending) < self.max_batch_size:
+                self._full.clear()
+
+            # Requests that arrive while this batch is scored form the next one
+            if batch:
+                await self._run(batch)
+            if self._closing and not self._pending:
+                return
+
+    async def _run(self, batch):
+        items = [item for item, _ in batch]
+        self.batches += 1
+        self.items += len(items)
+        self.largest_batch = max(self.largest_batch, len(items))
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.handler, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # The client may have gone away while the batch was scored
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'queued': len(self._pending),
+        }
+
+    async def close(self):
+        """
+        Stop accepting items and score the ones already queued; anything the
+        collector could not finish fails with RuntimeError instead of hanging
+        """
+        self._closing = True
+        if self._worker is not None:
+            self._wakeup.set()
+            self._full.set()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        pending, self._pending = self._pending, []
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError('MicroBatcher closed before scoring the item'))
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,243 @@
+"""
+API latency benchmark: throughput, p50/p95/p99 and a per-stage breakdown, saved as JSON.
+
+Payloads are rows sampled from Dataset/Carbon Emission.csv. The app is driven
+in-process through the Flask test client and/or over HTTP against a running
+server, at one or more concurrency levels. The stage breakdown times each
+step of the scoring path separately, in-process: preprocess (encode + Pool),
+predict (model.predict), shap (explainer), aggregate (category summary) and
+recommendations. The native explainer derives predictions from the SHAP call,
+so the served path skips the predict stage; it is reported for reference.
+
+Run from the flask-api directory:
+
+    python benchmarks/bench_api.py --concurrency 1,8,32 --output results.json
+    python benchmarks/bench_api.py --mode http --url http://127.0.0.1:5000 --output http.json
+    python benchmarks/bench_api.py --output new.json --compare results.json
+
+The prediction cache is disabled in-process unless --cache is given, so every
+request pays for scoring; over HTTP it is whatever the server is configured with.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from common import API_DIR, load_payloads, request_body, run_concurrent, summarize_latencies
+from load_test import http_sender, wait_until_ready
+
+STAGES = ('preprocess', 'predict', 'shap', 'aggregate', 'recommendations')
+
+
+def import_app(cache):
+    if not cache:
+        os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        app.model_loader.wait()
+    if not app.model_loader.ready:
+        raise SystemExit(f"Model failed to load: {app.model_loader.error}")
+    return app
+
+
+def inprocess_sender(flask_app, endpoint, payloads):
+    """
+    Sender factory for run_concurrent: one Flask test client per thread
+    """
+    def make_sender():
+        client = flask_app.test_client()
+
+        def send(i):
+            response = client.post(endpoint, data=request_body(endpoint, payloads[i % len(payloads)]),
+                                   content_type='application/json')
+            return response.status_code == 200
+
+        return send, lambda: None
+
+    return make_sender
+
+
+def run_mode(mode, make_sender, endpoint, concurrency, total_requests, warmup):
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Warm-up requests are not measured (connection setup, first-call caches)
+        run_concurrent(make_sender, warmup, min(concurrency, max(1, warmup)))
+        latencies, errors, elapsed = run_concurrent(make_sender, total_requests, concurrency)
+    return {
+        'mode': mode,
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': errors,
+        'seconds': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency': summarize_latencies(latencies),
+    }
+
+
+def stage_breakdown(app, payloads, batch_size=1):
+    """
+    Time every scoring stage separately over payloads, batch_size records per call
+    """
+    from categories import get_category_aggregator
+
+    schema = app.schema
+    model = app.model_loader.model
+    explainer = app.get_explainer()
+    aggregator = get_category_aggregator(tuple(schema.columns))
+    timings = {stage: [] for stage in STAGES}
+
+    for start in range(0, len(payloads), batch_size):
+        records = payloads[start:start + batch_size]
+        t0 = time.perf_counter()
+        pool = schema.to_pool(schema.encode_many(records))
+        t1 = time.perf_counter()
+        model.predict(pool)
+        t2 = time.perf_counter()
+        contributions, _ = explainer.explain(pool)
+        t3 = time.perf_counter()
+        summaries = aggregator.summarize(contributions) if contributions is not None else [([], [])] * len(records)
+        t4 = time.perf_counter()
+        app.recommendation_engine.recommend_batch(
+            records, [summary[0] for summary in summaries], [summary[1] for summary in summaries]
+        )
+        t5 = time.perf_counter()
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            timings[stage].append(seconds)
+
+    return {
+        'batch_size': batch_size,
+        'stages': {stage: summarize_latencies(values) for stage, values in timings.items()},
+    }
+
+
+def environment(app=None):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=API_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'argv': sys.argv[1:],
+    }
+    if app is not None:
+        import catboost
+        from prediction_cache import file_fingerprint
+        info.update({
+            'catboost': catboost.__version__,
+            'model_fingerprint': file_fingerprint(app.model_path),
+            'recommendations_version': app.recommendation_engine.version,
+            'explainer': app.DEFAULT_EXPLAINER,
+        })
+    return info
+
+
+def print_run(run):
+    latency = run['latency']
+    print(f"{run['mode']:9s} {run['endpoint']:9s} c={run['concurrency']:<3d} "
+          f"{run['throughput_rps']:8.1f} req/s  p50 {latency['p50_ms']:7.1f} ms  "
+          f"p95 {latency['p95_ms']:7.1f} ms  p99 {latency['p99_ms']:7.1f} ms  errors {run['errors']}")
+
+
+def print_stages(breakdown):
+    print(f"stage breakdown (batch size {breakdown['batch_size']}):")
+    for stage, summary in breakdown['stages'].items():
+        print(f"  {stage:16s} mean {summary['mean_ms']:8.3f} ms  p50 {summary['p50_ms']:8.3f} ms  "
+              f"p99 {summary['p99_ms']:8.3f} ms")
+
+
+def _change(new, old):
+    return f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+
+
+def compare(results, baseline):
+    """
+    Print how results moved against a previously saved results file
+    """
+    print(f"vs baseline {baseline['environment'].get('git_commit')} ({baseline['environment'].get('timestamp')}):")
+    previous = {(r['mode'], r['endpoint'], r['concurrency']): r for r in baseline.get('runs', [])}
+    for run in results['runs']:
+        old = previous.get((run['mode'], run['endpoint'], run['concurrency']))
+        if old is None:
+            continue
+        print(f"  {run['mode']:9s} {run['endpoint']:9s} c={run['concurrency']:<3d} "
+              f"throughput {_change(run['throughput_rps'], old['throughput_rps'])}  "
+              f"p50 {_change(run['latency']['p50_ms'], old['latency']['p50_ms'])}  "
+              f"p95 {_change(run['latency']['p95_ms'], old['latency']['p95_ms'])}  "
+              f"p99 {_change(run['latency']['p99_ms'], old['latency']['p99_ms'])}")
+    old_breakdown = baseline.get('stage_breakdown') or {}
+    new_breakdown = results.get('stage_breakdown') or {}
+    if old_breakdown.get('batch_size') != new_breakdown.get('batch_size'):
+        return
+    old_stages = old_breakdown.get('stages', {})
+    for stage, summary in new_breakdown.get('stages', {}).items():
+        if stage in old_stages:
+            print(f"  stage {stage:16s} mean {_change(summary['mean_ms'], old_stages[stage]['mean_ms'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mode', default='inprocess', choices=['inprocess', 'http', 'both'])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server for --mode http/both')
+    parser.add_argument('--endpoints', default='/predict,/insights')
+    parser.add_argument('--concurrency', default='1,8', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per run')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests before each run')
+    parser.add_argument('--payloads', type=int, default=500, help='distinct dataset rows to sample')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stage-batch-size', type=int, default=1, help='records per call in the stage breakdown')
+    parser.add_argument('--no-stages', action='store_true', help='skip the in-process stage breakdown')
+    parser.add_argument('--cache', action='store_true', help='keep the prediction cache on in-process')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    endpoints = [e for e in args.endpoints.split(',') if e]
+    levels = [int(c) for c in args.concurrency.split(',') if c]
+    payloads = load_payloads(args.payloads, seed=args.seed)
+    in_process = args.mode in ('inprocess', 'both')
+    app = import_app(args.cache) if in_process or not args.no_stages else None
+
+    runs = []
+    if in_process:
+        for endpoint in endpoints:
+            for concurrency in levels:
+                sender = inprocess_sender(app.app, endpoint, payloads)
+                runs.append(run_mode('inprocess', sender, endpoint, concurrency, args.requests, args.warmup))
+                print_run(runs[-1])
+    if args.mode in ('http', 'both'):
+        if not wait_until_ready(args.url):
+            raise SystemExit(f"{args.url} did not become ready")
+        for endpoint in endpoints:
+            for concurrency in levels:
+                sender = http_sender(args.url, endpoint, payloads)
+                runs.append(run_mode('http', sender, endpoint, concurrency, args.requests, args.warmup))
+                print_run(runs[-1])
+
+    breakdown = None
+    if not args.no_stages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            breakdown = stage_breakdown(app, payloads[:args.requests], args.stage_batch_size)
+        print_stages(breakdown)
+
+    results = {'environment': environment(app), 'runs': runs, 'stage_breakdown': breakdown}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Microbenchmark: the original DataFrame preprocessing vs the compiled FeatureSchema fast path.
+
+The original function from app.py is kept below verbatim (its prints included),
+so the "before" numbers stay reproducible. preprocessing.py's DataFrame helper,
+still used for CSV scoring, is timed alongside it.
+
+Run from the flask-api directory:
+
+    python benchmarks/bench_preprocess.py --iterations 2000
+"""
+import argparse
+import contextlib
+import os
+import time
+
+import pandas as pd
+from common import load_payloads, summarize_latencies
+
+from catboost import Pool
+from feature_schema import CATEGORICAL_FEATURES, DEFAULT_SCHEMA
+from preprocessing import preprocess_input_for_catboost
+
+
+def legacy_preprocess_input_for_catboost(data):
+    """
+    The original single-record preprocessing from app.py (before the FeatureSchema change), kept verbatim
+    """
+    print(f"Preprocessing data for CatBoost: {data}")
+    
+    # Convert input data to DataFrame
+    input_df = pd.DataFrame([data])
+    
+    # Define expected columns based on your training data
+    expected_columns = [
+    'Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
+    'Transport', 'Vehicle Type', 'Social Activity', 'Monthly Grocery Bill',
+    'Frequency of Traveling by Air', 'Vehicle Monthly Distance Km',
+    'Waste Bag Size', 'Waste Bag Weekly Count', 'How Long TV PC Daily Hour',
+    'How Many New Clothes Monthly', 'How Long Internet Daily Hour',
+    'Energy efficiency', 'Recycling', 'Cooking_With'
+    ]
+    
+    # Fill missing columns with default values
+    for col in expected_columns:
+        if col not in input_df.columns:
+            if col in ['Monthly Grocery Bill', 'Vehicle Monthly Distance Km', 'Waste Bag Weekly Count',
+                      'How Long TV PC Daily Hour', 'How Many New Clothes Monthly', 'How Long Internet Daily Hour']:
+                input_df[col] = 0
+            else:
+                input_df[col] = 'None'
+    
+    # Reorder columns to match training data order
+    input_df = input_df[expected_columns]
+    
+    # Define categorical columns - these should match what you used during training
+    categorical_features = [
+        'Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
+        'Transport', 'Vehicle Type', 'Social Activity', 'Frequency of Traveling by Air',
+        'Waste Bag Size', 'Energy efficiency', 'Recycling', 'Cooking_With'
+    ]
+    
+    # Ensure categorical columns are strings
+    for col in categorical_features:
+        if col in input_df.columns:
+            input_df[col] = input_df[col].astype(str)
+    
+    # Ensure numerical columns are numeric
+    numerical_features = [
+        'Monthly Grocery Bill', 'Vehicle Monthly Distance Km', 'Waste Bag Weekly Count',
+        'How Long TV PC Daily Hour', 'How Many New Clothes Monthly', 'How Long Internet Daily Hour'
+    ]
+    
+    for col in numerical_features:
+        if col in input_df.columns:
+            try:
+                input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
+                input_df[col] = input_df[col].fillna(0)  # Fill NaN with 0
+            except:
+                input_df[col] = 0
+    
+    print(f"Processed DataFrame shape: {input_df.shape}")
+    print(f"DataFrame dtypes:\n{input_df.dtypes}")
+    print(f"Sample data:\n{input_df.head()}")
+    
+    return input_df
+
+
+def time_calls(fn, payloads, iterations):
+    durations = []
+    for i in range(iterations):
+        data = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        fn(data)
+        durations.append(time.perf_counter() - start)
+    return summarize_latencies(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--payloads', type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads)
+
+    schema = DEFAULT_SCHEMA
+    cases = {
+        'original (app.py before FeatureSchema)': legacy_preprocess_input_for_catboost,
+        'preprocessing.py DataFrame helper': preprocess_input_for_catboost,
+        'schema.encode': schema.encode,
+        'original + Pool': lambda d: Pool(legacy_preprocess_input_for_catboost(d),
+                                          cat_features=CATEGORICAL_FEATURES),
+        'schema.encode + Pool': lambda d: schema.to_pool([schema.encode(d)]),
+    }
+
+    # The original prints on every call; send it to /dev/null so the terminal
+    # does not dominate, but the formatting cost is still paid
+    with open(os.devnull, 'w') as devnull:
+        for name, fn in cases.items():
+            with contextlib.redirect_stdout(devnull):
+                time_calls(fn, payloads, min(100, args.iterations))  # warm-up
+                stats = time_calls(fn, payloads, args.iterations)
+            print(f"{name:45s} p50={stats['p50_ms']:.4f}ms p99={stats['p99_ms']:.4f}ms "
+                  f"mean={stats['mean_ms']:.4f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Startup benchmark: time until app.py is importable (the port can open) and
+time until the model is ready, in background and eager load modes.
+
+Run from the flask-api directory:
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so import caches do not carry over between runs
+PROBE = """
+import contextlib, io, json, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+imported = time.perf_counter() - start
+with contextlib.redirect_stdout(io.StringIO()):
+    app.model_loader.wait()
+ready = time.perf_counter() - start
+print(json.dumps({'import_seconds': imported, 'ready_seconds': ready, 'state': app.model_loader.state}))
+"""
+
+
+def run_probe(mode):
+    env = dict(os.environ, MODEL_LOAD_MODE=mode)
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=API_DIR, env=env,
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for mode in ('background', 'eager'):
+        results = [run_probe(mode) for _ in range(args.runs)]
+        imported = statistics.median(r['import_seconds'] for r in results)
+        ready = statistics.median(r['ready_seconds'] for r in results)
+        print(f"{mode:10s} import (port can open) = {imported:.3f}s  model ready = {ready:.3f}s  "
+              f"(median of {args.runs})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Shared helpers for the flask-api benchmarks: realistic payloads, a concurrent
+request driver and latency summaries.
+"""
+import csv
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+from feature_schema import LIST_FEATURES, NUMERICAL_FEATURES, parse_list_value  # noqa: E402
+
+DATASET_PATH = os.path.join(API_DIR, '..', '..', 'Dataset', 'Carbon Emission.csv')
+
+
+def load_payloads(n=200, seed=0, path=DATASET_PATH):
+    """
+    Sample n rows of the reference dataset and shape them like frontend requests
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    rng = random.Random(seed)
+    payloads = []
+    for row in rng.choices(rows, k=n):
+        row = dict(row)
+        row.pop('CarbonEmission', None)
+        for col in NUMERICAL_FEATURES:
+            row[col] = float(row[col])
+        # The dataset stores stringified lists; the frontend sends real ones
+        for col in LIST_FEATURES:
+            row[col] = parse_list_value(row[col])
+        payloads.append(row)
+    return payloads
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(seconds):
+    """
+    p50/p95/p99/mean of a list of durations, reported in milliseconds
+    """
+    ordered = sorted(seconds)
+    return {
+        'count': len(ordered),
+        'mean_ms': 1000.0 * sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50_ms': 1000.0 * percentile(ordered, 50),
+        'p95_ms': 1000.0 * percentile(ordered, 95),
+        'p99_ms': 1000.0 * percentile(ordered, 99),
+    }
+
+
+def request_body(endpoint, data):
+    """
+    JSON body the frontend sends to endpoint for one questionnaire
+    """
+    return json.dumps({'carbonData': data} if endpoint == '/insights' else data)
+
+
+def run_concurrent(make_sender, total_requests, concurrency):
+    """
+    Call send(i) for i in range(total_requests) from `concurrency` threads.
+
+    make_sender() is called once per thread (e.g. to open its own connection) and
+    returns (send, close); send(i) returns True on success. Returns (latencies in
+    seconds of the successful calls, error count, wall-clock seconds).
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker():
+        send, close = make_sender()
+        local_latencies = []
+        local_errors = 0
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                started = time.perf_counter()
+                if send(i):
+                    local_latencies.append(time.perf_counter() - started)
+                else:
+                    local_errors += 1
+        finally:
+            close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
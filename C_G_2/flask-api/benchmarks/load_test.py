@@ -0,0 +1,109 @@
+"""
+HTTP load test: concurrent single-record requests against a running API.
+
+Reports throughput and latency percentiles, plus the server's micro-batching
+stats when it runs in the ASGI mode. Start the server first, e.g.
+
+    uvicorn asgi:app --port 5000                       # micro-batched
+    gunicorn app:app                                   # sync workers
+
+then, from the flask-api directory:
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 32 --requests 2000
+"""
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+from common import load_payloads, request_body, run_concurrent, summarize_latencies
+
+
+def http_sender(url, endpoint, payloads, timeout=30.0):
+    """
+    Sender factory for run_concurrent: one keep-alive connection per thread
+    """
+    target = urlsplit(url)
+
+    def make_sender():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=timeout)
+
+        def send(i):
+            body = request_body(endpoint, payloads[i % len(payloads)])
+            try:
+                connection.request('POST', endpoint, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                return response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                return False
+
+        return send, connection.close
+
+    return make_sender
+
+
+def run_load(url, endpoint, payloads, concurrency, total_requests, timeout=30.0):
+    """
+    Send total_requests POSTs from `concurrency` threads; returns
+    (latencies in seconds, error count, wall-clock seconds)
+    """
+    return run_concurrent(http_sender(url, endpoint, payloads, timeout), total_requests, concurrency)
+
+
+def fetch_json(url, path):
+    target = urlsplit(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=10)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        connection.close()
+
+
+def wait_until_ready(url, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = fetch_json(url, '/ready')
+            if status == 200:
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--endpoint', default='/predict', choices=['/predict', '/insights'])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--payloads', type=int, default=500,
+                        help='distinct dataset rows to cycle through (fewer rows means more cache hits)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not wait_until_ready(args.url):
+        raise SystemExit(f"{args.url} did not become ready")
+    payloads = load_payloads(args.payloads, seed=args.seed)
+    latencies, errors, elapsed = run_load(args.url, args.endpoint, payloads, args.concurrency, args.requests)
+
+    summary = summarize_latencies(latencies)
+    print(f"{args.endpoint} x{args.requests} at concurrency {args.concurrency}: "
+          f"{len(latencies) / elapsed:.1f} req/s, {errors} errors")
+    print(f"  latency mean {summary['mean_ms']:.1f} ms  p50 {summary['p50_ms']:.1f} ms  "
+          f"p95 {summary['p95_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms")
+
+    _, health = fetch_json(args.url, '/health')
+    for name, stats in (health or {}).get('micro_batching', {}).items():
+        print(f"  micro-batching [{name}]: {stats['batches']} batches, "
+              f"mean size {stats['mean_batch_size']:.1f}, largest {stats['largest_batch']}")
+
+
+if __name__ == '__main__':
+    main()
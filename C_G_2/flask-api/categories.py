@@ -0,0 +1,161 @@
+"""
+Feature categories and vectorized aggregation of SHAP values into them.
+
+The feature -> category membership is compiled once into a matrix, so category
+totals, percentages and top features for a whole (rows x features) SHAP array
+come from a handful of NumPy operations instead of per-feature Python loops.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from feature_schema import DEFAULT_SCHEMA
+from instrumentation import get_logger
+
+# Feature -> category groups, from the feature schema artifact (feature_schema.json)
+FEATURE_CATEGORIES = DEFAULT_SCHEMA.feature_categories
+
+# Category reported for a feature that is in no FEATURE_CATEGORIES group
+OTHER_CATEGORY = 'Other'
+
+logger = get_logger()
+
+
+class CategoryAggregator:
+    """
+    Precomputed feature -> category index for one feature order
+    """
+
+    def __init__(self, feature_names, feature_categories=FEATURE_CATEGORIES,
+                 top_individual_features=3, top_features_per_category=2, min_feature_percentage=1):
+        self.feature_names = list(feature_names)
+        self.category_names = list(feature_categories)
+        self.top_individual_features = top_individual_features
+        self.top_features_per_category = top_features_per_category
+        self.min_feature_percentage = min_feature_percentage
+
+        position = {feature: i for i, feature in enumerate(self.feature_names)}
+        # Column indices of each category's features, in FEATURE_CATEGORIES order
+        self.category_members = [
+            np.array([position[f] for f in features if f in position], dtype=int)
+            for features in feature_categories.values()
+        ]
+        # (features x categories) 0/1 matrix: importance @ membership = category totals
+        self.membership = np.zeros((len(self.feature_names), len(self.category_names)))
+        for c, members in enumerate(self.category_members):
+            self.membership[members, c] = 1.0
+        if (self.membership.sum(axis=1) > 1).any():
+            raise ValueError('A feature can belong to only one category')
+
+        # Category index per feature (uncategorized features sort after every category)
+        self.feature_category_index = np.full(len(self.feature_names), len(self.category_names))
+        for c, members in enumerate(self.category_members):
+            self.feature_category_index[members] = c
+        self.feature_category = [
+            self.category_names[c] if c < len(self.category_names) else OTHER_CATEGORY
+            for c in self.feature_category_index
+        ]
+        # Columns grouped by category in FEATURE_CATEGORIES order, uncategorized last
+        uncategorized = [i for i in range(len(self.feature_names)) if self.membership[i].sum() == 0]
+        self._grouped_columns = np.concatenate(self.category_members + [np.array(uncategorized, dtype=int)])
+        self._grouped_category = self.feature_category_index[self._grouped_columns]
+        k = top_features_per_category
+        # Columns of the grouped order that hold each category's top-k features
+        self._top_slices = []
+        top_columns = []
+        start = 0
+        for members in self.category_members:
+            count = min(k, len(members))
+            self._top_slices.append(slice(len(top_columns), len(top_columns) + count))
+            top_columns.extend(range(start, start + count))
+            start += len(members)
+        self._top_columns = np.array(top_columns, dtype=int)
+
+    def summarize(self, contributions):
+        """
+        Category breakdown and top individual features for every row of a SHAP array
+
+        Returns [(category_breakdown, top_individual_features), ...], one per row.
+        Orderings use a stable sort, so ties keep FEATURE_CATEGORIES / column order.
+        """
+        contributions = np.atleast_2d(np.asarray(contributions, dtype=float))
+        n_rows, n_features = contributions.shape
+        if n_features != len(self.feature_names):
+            logger.error("Mismatch: %d SHAP values vs %d features", n_features, len(self.feature_names))
+            return [([], []) for _ in range(n_rows)]
+
+        importance = np.abs(contributions)
+        total = importance.sum(axis=1)
+        nonzero = total > 0
+        safe_total = np.where(nonzero, total, 1.0)[:, None]
+
+        category_totals = importance @ self.membership
+        category_percentages = category_totals / safe_total * 100
+        category_order = np.argsort(-category_totals, axis=1, kind='stable')
+
+        # Sort within each category block by importance; lexsort is stable, so ties
+        # keep the FEATURE_CATEGORIES order and each category's best features land
+        # in a fixed slice
+        rows = np.arange(n_rows)[:, None]
+        grouped_importance = importance[:, self._grouped_columns]
+        grouped_category = np.broadcast_to(self._grouped_category, grouped_importance.shape)
+        grouped = self._grouped_columns[np.lexsort((-grouped_importance, grouped_category), axis=1)]
+        category_top = grouped[:, self._top_columns]
+
+        feature_rank_order = np.argsort(-importance, axis=1, kind='stable')
+        feature_order = feature_rank_order[:, :self.top_individual_features]
+        top_importance = importance[rows, feature_order]
+        top_percentages = top_importance / safe_total * 100
+        top_contribution = contributions[rows, feature_order]
+
+        # From here on only plain Python values go into the JSON-bound dicts
+        names = self.feature_names
+        category_totals_list = category_totals.tolist()
+        category_percentages_list = category_percentages.tolist()
+        category_order_list = category_order.tolist()
+        category_top_list = category_top.tolist()
+        feature_order_list = feature_order.tolist()
+        top_percentages_list = top_percentages.tolist()
+        top_importance_list = top_importance.tolist()
+        top_contribution_list = top_contribution.tolist()
+
+        results = []
+        for row in range(n_rows):
+            if not nonzero[row]:
+                results.append(([], []))
+                continue
+
+            category_breakdown = []
+            for c in category_order_list[row]:
+                value = category_totals_list[row][c]
+                if value > 0:
+                    category_breakdown.append({
+                        'name': self.category_names[c],
+                        'value': value,
+                        'percentage': round(category_percentages_list[row][c], 2),
+                        'top_features': [names[i] for i in category_top_list[row][self._top_slices[c]]]
+                    })
+
+            top_individual_features = []
+            for i, percentage, importance_value, contribution in zip(
+                    feature_order_list[row], top_percentages_list[row],
+                    top_importance_list[row], top_contribution_list[row]):
+                if percentage > self.min_feature_percentage:
+                    top_individual_features.append({
+                        'feature': names[i],
+                        'category': self.feature_category[i],
+                        'contribution': contribution,
+                        'importance': importance_value,
+                        'percentage': round(percentage, 2)
+                    })
+
+            results.append((category_breakdown, top_individual_features))
+        return results
+
+
+@lru_cache(maxsize=8)
+def get_category_aggregator(feature_names):
+    """
+    Shared aggregator for a feature order (pass a tuple)
+    """
+    return CategoryAggregator(feature_names)
@@ -0,0 +1,147 @@
+"""
+CityHash64 (v1.0, the variant CatBoost uses to hash categorical values).
+
+CatBoost keys categorical values by CityHash64(utf-8 bytes) truncated to 32
+bits; tree_model.py needs the same numbers to evaluate an exported model
+without the catboost package. Pure Python: about 5-10 microseconds per value,
+so callers cache the result per distinct string.
+"""
+from functools import lru_cache
+
+_MASK = 0xFFFFFFFFFFFFFFFF
+
+K0 = 0xc3a5c85c97cb3127
+K1 = 0xb492b66fbe98f273
+K2 = 0x9ae16a3b2f90404f
+K3 = 0xc949d7c7509e6557
+K_MUL = 0x9ddfea08eb382d69
+
+
+def _fetch64(s, i):
+    return int.from_bytes(s[i:i + 8], 'little')
+
+
+def _fetch32(s, i):
+    return int.from_bytes(s[i:i + 4], 'little')
+
+
+def _rotate(value, shift):
+    if shift == 0:
+        return value
+    return ((value >> shift) | (value << (64 - shift))) & _MASK
+
+
+def _shift_mix(value):
+    return value ^ (value >> 47)
+
+
+def _hash_len16(u, v):
+    a = ((u ^ v) * K_MUL) & _MASK
+    a ^= a >> 47
+    b = ((v ^ a) * K_MUL) & _MASK
+    b ^= b >> 47
+    return (b * K_MUL) & _MASK
+
+
+def _hash_len0to16(s):
+    n = len(s)
+    if n > 8:
+        a = _fetch64(s, 0)
+        b = _fetch64(s, n - 8)
+        return _hash_len16(a, _rotate((b + n) & _MASK, n)) ^ b
+    if n >= 4:
+        a = _fetch32(s, 0)
+        return _hash_len16((n + (a << 3)) & _MASK, _fetch32(s, n - 4))
+    if n > 0:
+        y = (s[0] + (s[n >> 1] << 8)) & 0xFFFFFFFF
+        z = (n + (s[n - 1] << 2)) & 0xFFFFFFFF
+        return (_shift_mix(((y * K2) ^ (z * K3)) & _MASK) * K2) & _MASK
+    return K2
+
+
+def _hash_len17to32(s):
+    n = len(s)
+    a = (_fetch64(s, 0) * K1) & _MASK
+    b = _fetch64(s, 8)
+    c = (_fetch64(s, n - 8) * K2) & _MASK
+    d = (_fetch64(s, n - 16) * K0) & _MASK
+    return _hash_len16((_rotate((a - b) & _MASK, 43) + _rotate(c, 30) + d) & _MASK,
+                       (a + _rotate(b ^ K3, 20) - c + n) & _MASK)
+
+
+def _hash_len33to64(s):
+    n = len(s)
+    z = _fetch64(s, 24)
+    a = (_fetch64(s, 0) + (n + _fetch64(s, n - 16)) * K0) & _MASK
+    b = _rotate((a + z) & _MASK, 52)
+    c = _rotate(a, 37)
+    a = (a + _fetch64(s, 8)) & _MASK
+    c = (c + _rotate(a, 7)) & _MASK
+    a = (a + _fetch64(s, 16)) & _MASK
+    vf = (a + z) & _MASK
+    vs = (b + _rotate(a, 31) + c) & _MASK
+    a = (_fetch64(s, 16) + _fetch64(s, n - 32)) & _MASK
+    z = _fetch64(s, n - 8)
+    b = _rotate((a + z) & _MASK, 52)
+    c = _rotate(a, 37)
+    a = (a + _fetch64(s, n - 24)) & _MASK
+    c = (c + _rotate(a, 7)) & _MASK
+    a = (a + _fetch64(s, n - 16)) & _MASK
+    wf = (a + z) & _MASK
+    ws = (b + _rotate(a, 31) + c) & _MASK
+    r = _shift_mix(((vf + ws) * K2 + (wf + vs) * K0) & _MASK)
+    return (_shift_mix((r * K0 + vs) & _MASK) * K2) & _MASK
+
+
+def _weak_hash_len32_with_seeds(s, i, a, b):
+    w, x, y, z = (_fetch64(s, i + offset) for offset in (0, 8, 16, 24))
+    a = (a + w) & _MASK
+    b = _rotate((b + a + z) & _MASK, 21)
+    c = a
+    a = (a + x + y) & _MASK
+    b = (b + _rotate(a, 44)) & _MASK
+    return (a + z) & _MASK, (b + c) & _MASK
+
+
+def city_hash64(s):
+    """
+    CityHash64 v1.0 of a bytes object
+    """
+    n = len(s)
+    if n <= 16:
+        return _hash_len0to16(s)
+    if n <= 32:
+        return _hash_len17to32(s)
+    if n <= 64:
+        return _hash_len33to64(s)
+
+    # Hash the end first, then the rest in 64-byte chunks with 56 bytes of state
+    x = _fetch64(s, 0)
+    y = _fetch64(s, n - 16) ^ K1
+    z = _fetch64(s, n - 56) ^ K0
+    v = _weak_hash_len32_with_seeds(s, n - 64, n, y)
+    w = _weak_hash_len32_with_seeds(s, n - 32, (n * K1) & _MASK, K0)
+    z = (z + _shift_mix(v[1]) * K1) & _MASK
+    x = (_rotate((z + x) & _MASK, 39) * K1) & _MASK
+    y = (_rotate(y, 33) * K1) & _MASK
+
+    for i in range(0, (n - 1) & ~63, 64):
+        x = (_rotate((x + y + v[0] + _fetch64(s, i + 16)) & _MASK, 37) * K1) & _MASK
+        y = (_rotate((y + v[1] + _fetch64(s, i + 48)) & _MASK, 42) * K1) & _MASK
+        x ^= w[1]
+        y ^= v[0]
+        z = _rotate(z ^ w[0], 33)
+        v = _weak_hash_len32_with_seeds(s, i, (v[1] * K1) & _MASK, (x + w[0]) & _MASK)
+        w = _weak_hash_len32_with_seeds(s, i + 32, (z + w[1]) & _MASK, y)
+        z, x = x, z
+
+    return _hash_len16((_hash_len16(v[0], w[0]) + _shift_mix(y) * K1 + z) & _MASK,
+                       (_hash_len16(v[1], w[1]) + x) & _MASK)
+
+
+@lru_cache(maxsize=65536)
+def categorical_hash(value):
+    """
+    CatBoost's 32-bit hash of a categorical value (its str() form, utf-8 encoded)
+    """
+    return city_hash64(str(value).encode('utf-8')) & 0xFFFFFFFF
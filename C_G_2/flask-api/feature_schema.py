@@ -0,0 +1,302 @@
+"""
+Compiled feature schema for the CatBoost model.
+
+The schema is a versioned artifact, feature_schema.json: column order, dtypes,
+defaults, allowed answers and the feature -> category map. It is loaded once
+into a FeatureSchema that validates request dicts with one cheap check per
+field and turns them straight into model-ordered rows (categorical strings and
+float numerics) without building a pandas DataFrame. The module-level column
+lists below are read from the same artifact.
+"""
+import ast
+import json
+import math
+import os
+
+SCHEMA_FILE_NAME = 'feature_schema.json'
+FEATURE_SCHEMA_PATH = os.environ.get(
+    'FEATURE_SCHEMA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), SCHEMA_FILE_NAME)
+)
+# Highest feature_schema.json format this code understands (2 added the per-column "fill")
+SCHEMA_FORMAT_VERSION = 2
+
+# Value used for a categorical answer that is missing from the request
+MISSING_CATEGORY = 'None'
+
+
+class SchemaValidationError(ValueError):
+    """
+    A request dict the schema rejects; errors is {field: problem}
+    """
+
+    def __init__(self, errors, record=None):
+        super().__init__('Invalid input: ' + '; '.join(f'{field}: {problem}' for field, problem in errors.items()))
+        self.errors = errors
+        # Index of the rejected record when validating a batch
+        self.record = record
+
+
+def to_numeric_or_zero(value):
+    """
+    Same result as pd.to_numeric(errors='coerce').fillna(0) for a single value
+    """
+    if value is None or isinstance(value, (list, tuple, dict)):
+        return 0.0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+
+def parse_list_value(value):
+    """
+    "['Stove', 'Oven']" -> ['Stove', 'Oven']; anything else is returned unchanged
+    """
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+        if isinstance(parsed, list):
+            return parsed
+    return value
+
+
+class FeatureSchema:
+    """
+    Column order, per-column encoders and validators compiled once, applied to every request
+    """
+
+    def __init__(self, columns, categorical_features, numerical_features, list_features=(),
+                 allowed_values=None, list_items=None, minimums=None, defaults=None,
+                 fills=None, feature_categories=None, version=None):
+        self.columns = list(columns)
+        self.categorical_features = [c for c in self.columns if c in set(categorical_features)]
+        self.numerical_features = [c for c in self.columns if c in set(numerical_features)]
+        self.list_features = [c for c in self.columns if c in set(list_features)]
+        self.cat_feature_indices = [
+            i for i, col in enumerate(self.columns) if col in set(categorical_features)
+        ]
+        # Known answers per categorical column (the what-if alternatives, in questionnaire order)
+        self.allowed_values = dict(allowed_values or {})
+        # Known elements of each multi-select answer
+        self.list_items = dict(list_items or {})
+        self.minimums = dict(minimums or {})
+        self.defaults = {
+            col: (defaults or {}).get(col, MISSING_CATEGORY if col in set(categorical_features) else 0)
+            for col in self.columns
+        }
+        # Answer an unanswered ('') categorical question is encoded as: what the
+        # training data filled its empty answers with
+        self.fills = dict(fills or {})
+        self.feature_categories = dict(feature_categories or {})
+        self.version = version
+        # (column, default, is_categorical, is_list, fill) in model order - the whole encoding plan
+        self._plan = tuple(
+            (col, self.defaults[col], col in set(categorical_features), col in set(list_features),
+             self.fills.get(col))
+            for col in self.columns
+        )
+        # (column, check) - check(value) returns a problem string or None
+        self._checks = tuple((col, self._compile_check(col)) for col in self.columns)
+
+    @classmethod
+    def from_dict(cls, document):
+        """
+        Build a schema from a feature_schema.json document
+        """
+        if document.get('format_version', 1) > SCHEMA_FORMAT_VERSION:
+            raise ValueError(f"Feature schema format {document['format_version']} is newer than "
+                             f"{SCHEMA_FORMAT_VERSION}; update feature_schema.py")
+        columns = document['columns']
+        return cls(
+            [c['name'] for c in columns],
+            [c['name'] for c in columns if c['dtype'] in ('category', 'list')],
+            [c['name'] for c in columns if c['dtype'] not in ('category', 'list')],
+            [c['name'] for c in columns if c['dtype'] == 'list'],
+            allowed_values={c['name']: c['values'] for c in columns if 'values' in c},
+            list_items={c['name']: c['items'] for c in columns if 'items' in c},
+            minimums={c['name']: c['min'] for c in columns if 'min' in c},
+            defaults={c['name']: c['default'] for c in columns if 'default' in c},
+            fills={c['name']: c['fill'] for c in columns if 'fill' in c},
+            feature_categories=document.get('feature_categories'),
+            version=document.get('version'),
+        )
+
+    @classmethod
+    def load(cls, path=FEATURE_SCHEMA_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        """
+        The feature_schema.json document for this schema (also written next to trained models)
+        """
+        columns = []
+        for col in self.columns:
+            column = {'name': col}
+            if col in self.list_features:
+                column['dtype'] = 'list'
+            elif col in self.categorical_features:
+                column['dtype'] = 'category'
+            else:
+                column['dtype'] = 'float64'
+            column['default'] = self.defaults[col]
+            if col in self.fills:
+                column['fill'] = self.fills[col]
+            if col in self.allowed_values:
+                column['values'] = self.allowed_values[col]
+            if col in self.list_items:
+                column['items'] = self.list_items[col]
+            if col in self.minimums:
+                column['min'] = self.minimums[col]
+            columns.append(column)
+        return {
+            'format_version': SCHEMA_FORMAT_VERSION,
+            'version': self.version,
+            'missing_category': MISSING_CATEGORY,
+            'columns': columns,
+            'feature_categories': self.feature_categories,
+        }
+
+    def _compile_check(self, col):
+        """
+        Validator for one column's answer; missing (None) and unanswered ('') answers
+        always pass, since encode() gives them the default
+        """
+        if col in self.list_features:
+            allowed = frozenset(self.allowed_values.get(col, ()))
+            items = frozenset(self.list_items.get(col, ()))
+
+            def check(value):
+                if isinstance(value, str):
+                    if not value or value == MISSING_CATEGORY or not allowed or value in allowed:
+                        return None
+                    value = parse_list_value(value)
+                    if isinstance(value, str):
+                        return 'expected a list of answers'
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    return 'expected a list of answers'
+                unknown = [item for item in value if items and item not in items]
+                return f'unknown answer {unknown[0]!r}' if unknown else None
+        elif col in self.categorical_features:
+            allowed = frozenset(self.allowed_values.get(col, ()))
+
+            def check(value):
+                if not isinstance(value, str):
+                    return 'expected a string'
+                if value and allowed and value not in allowed and value != MISSING_CATEGORY:
+                    return f'unknown answer {value!r}'
+                return None
+        else:
+            minimum = self.minimums.get(col)
+
+            def check(value):
+                if isinstance(value, str):
+                    if not value.strip():
+                        return None
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        return 'expected a number'
+                elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return 'expected a number'
+                if not math.isfinite(value):
+                    return 'expected a finite number'
+                if minimum is not None and value < minimum:
+                    return f'must be at least {minimum}'
+                return None
+        return check
+
+    def validate(self, data):
+        """
+        {field: problem} for the answers in data the model cannot use; empty if all are fine
+
+        One dict lookup and one type/membership check per schema field, so bad
+        requests are turned away before any encoding or scoring work. Keys the
+        schema does not know are ignored and missing answers get their defaults,
+        as in encode().
+        """
+        errors = {}
+        get = data.get
+        for col, check in self._checks:
+            value = get(col)
+            if value is not None:
+                problem = check(value)
+                if problem is not None:
+                    errors[col] = problem
+        return errors
+
+    def check(self, data):
+        """
+        Raise SchemaValidationError unless data is a dict the model can use
+        """
+        if not isinstance(data, dict):
+            raise SchemaValidationError({'': 'expected a JSON object'})
+        errors = self.validate(data)
+        if errors:
+            raise SchemaValidationError(errors)
+
+    def encode(self, data):
+        """
+        Encode one request dict into a model-ordered row
+        """
+        row = []
+        append = row.append
+        get = data.get
+        for col, default, categorical, is_list, fill in self._plan:
+            value = get(col, default)
+            if is_list:
+                # Lists and their stringified form encode to the same training-data string
+                append(str(parse_list_value(value)))
+            elif categorical:
+                if value == '' and fill is not None:
+                    value = fill
+                append(value if type(value) is str else str(value))
+            else:
+                append(to_numeric_or_zero(value))
+        return row
+
+    def encode_many(self, records):
+        """
+        Encode a list of request dicts into model-ordered rows
+        """
+        return [self.encode(data) for data in records]
+
+    def to_pool(self, rows):
+        """
+        Wrap encoded rows in a CatBoost Pool with the categorical indices set
+        """
+        from catboost import Pool
+        return Pool(data=rows, cat_features=self.cat_feature_indices, feature_names=self.columns)
+
+
+DEFAULT_SCHEMA = FeatureSchema.load()
+
+
+
+def model_schema(model_path):
+    """
+    The schema a model was trained against: the feature_schema.json next to
+    model_path (train.py writes one into every version directory), else DEFAULT_SCHEMA
+
+    A file describing the same contract as DEFAULT_SCHEMA returns DEFAULT_SCHEMA
+    itself, so versions sharing a contract share everything built from it.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(model_path)), SCHEMA_FILE_NAME)
+    if not os.path.isfile(path):
+        return DEFAULT_SCHEMA
+    schema = FeatureSchema.load(path)
+    return DEFAULT_SCHEMA if schema.to_dict() == DEFAULT_SCHEMA.to_dict() else schema
+
+
+# Columns in the order the model was trained on
+EXPECTED_COLUMNS = DEFAULT_SCHEMA.columns
+CATEGORICAL_FEATURES = DEFAULT_SCHEMA.categorical_features
+NUMERICAL_FEATURES = DEFAULT_SCHEMA.numerical_features
+# Multi-select answers: the frontend sends lists, the dataset stores their str() form
+LIST_FEATURES = DEFAULT_SCHEMA.list_features
+# Known answers for each categorical question (list answers in their str() form) -
+# the alternatives a what-if comparison tries
+ANSWER_OPTIONS = DEFAULT_SCHEMA.allowed_values
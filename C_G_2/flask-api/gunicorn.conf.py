@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for the Flask API (picked up automatically from this directory).
+
+By default each worker starts serving at once and loads the model on its own
+background thread; /ready reports per-worker progress. Nothing runs the model
+before the workers fork.
+
+Workers: gunicorn's default of one unless WEB_CONCURRENCY says otherwise. Every
+worker holds its own model, explainer and population index, and a CatBoost call
+already uses all cores, so extra workers mainly add memory and help when
+requests wait on I/O. Size WEB_CONCURRENCY to the replica's memory and traffic.
+
+GUNICORN_PRELOAD=1 (opt-in) makes the master import app.py and load the model
+eagerly before forking, so the workers share one copy of it copy-on-write. The
+master then also runs the explainer warm-up and the population prediction, so
+CatBoost's thread pool exists before fork; only enable it after checking that
+the workers come up healthy on the target platform.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+if preload_app:
+    # Loader threads do not survive fork, so load in the master before forking
+    os.environ.setdefault('MODEL_LOAD_MODE', 'eager')
+
+
+def post_fork(server, worker):
+    # Nor does the model registry's watcher thread: start one in every worker
+    if preload_app:
+        import app
+        app.model_registry.start()
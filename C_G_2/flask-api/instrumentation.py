@@ -0,0 +1,264 @@
+"""
+Hot-path instrumentation: timing spans, fixed-bucket histograms rendered in the
+Prometheus text format for /metrics, and a sampled, level-controlled logger.
+
+Observing a value is a bisect plus two additions under a lock, so spans can
+stay on for every request. Metrics are per process; with several gunicorn
+workers each worker reports its own numbers.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Fraction of requests whose payload and result are logged at DEBUG level
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+# Seconds; spans range from tens of microseconds (encoding) to seconds (big batches)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with one child per label value tuple
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(labels)
+            if child is None:
+                # [per-bucket counts..., +Inf count], sum
+                child = self._children[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            child[0][index] += 1
+            child[1] += value
+
+    def time(self, *labels):
+        """
+        Context manager that observes the duration of its block
+        """
+        return _Span(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._children.items()}
+
+    def summary(self, *labels):
+        """
+        {'count', 'mean', 'p50', 'p95'} for one child; percentiles are bucket upper bounds
+        """
+        with self._lock:
+            child = self._children.get(labels)
+            counts, total = (list(child[0]), child[1]) if child is not None else ([], 0.0)
+        count = sum(counts)
+        summary = {'count': count, 'mean': total / count if count else None}
+        for name, quantile in (('p50', 0.5), ('p95', 0.95)):
+            summary[name] = None
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                if cumulative >= quantile * count:
+                    summary[name] = bound
+                    break
+        return summary
+
+    def render(self):
+        lines = []
+        for labels, (counts, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter with one value per label value tuple
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in values]
+
+
+class _Span:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Registry:
+    """
+    Metrics plus scrape-time callbacks, rendered together for /metrics
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.callbacks = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_callback(self, callback):
+        """
+        callback() -> [(name, type, documentation, value[, labels]), ...] read at scrape
+        time; for values kept elsewhere (e.g. cache stats). None values are skipped,
+        and labels is an optional {label name: value} dict
+        """
+        self.callbacks.append(callback)
+        return callback
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        described = set()
+        for callback in self.callbacks:
+            for name, metric_type, documentation, value, *labels in callback():
+                if value is None:
+                    continue
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                label_text = _format_labels(list(labels[0]), list(labels[0].values())) if labels else ''
+                lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'carbon_stage_seconds', 'Time spent in each scoring stage', ['stage']
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    'carbon_request_seconds', 'End-to-end request handling time', ['endpoint']
+))
+REQUESTS_TOTAL = registry.register(Counter(
+    'carbon_requests_total', 'Requests handled, by endpoint and status code', ['endpoint', 'status']
+))
+MODEL_REQUEST_SECONDS = registry.register(Histogram(
+    'carbon_model_request_seconds', 'Scoring request handling time, by model version', ['version']
+))
+SCORED_BATCH_RECORDS = registry.register(Histogram(
+    'carbon_scored_batch_records', 'Records scored per model call (cache misses only)',
+    buckets=BATCH_SIZE_BUCKETS
+))
+
+
+def stage(name):
+    """
+    with stage('shap'): ... - records the block's duration in carbon_stage_seconds
+    """
+    return STAGE_SECONDS.time(name)
+
+
+def observe_request(endpoint, status, seconds, model_version=None):
+    REQUEST_SECONDS.observe(seconds, endpoint)
+    REQUESTS_TOTAL.inc(endpoint, str(status))
+    if model_version is not None:
+        MODEL_REQUEST_SECONDS.observe(seconds, model_version)
+
+
+class SampledLogger:
+    """
+    Logger whose per-request DEBUG messages are kept for only a sample of calls
+
+    Arguments are formatted lazily, so a skipped message costs one level check
+    and one random draw; warnings and errors are always logged.
+    """
+
+    def __init__(self, logger, sample_rate=LOG_SAMPLE_RATE):
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    def sampled(self):
+        """
+        True when this call's diagnostics should be logged
+        """
+        return self.logger.isEnabledFor(logging.DEBUG) and random.random() < self.sample_rate
+
+    def sample(self, msg, *args):
+        if self.sampled():
+            self.logger.debug(msg, *args)
+
+    def __getattr__(self, name):
+        # info/warning/error/exception go straight to the wrapped logger
+        return getattr(self.logger, name)
+
+
+def get_logger(name='carbon_api'):
+    """
+    The API logger: level from LOG_LEVEL, payload logging sampled at LOG_SAMPLE_RATE
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return SampledLogger(logger)
@@ -0,0 +1,104 @@
+"""
+Non-blocking model loading.
+
+Importing catboost/shap and unpickling the model takes seconds, so the web app
+starts serving immediately and loads the model on a background thread. /ready
+reports progress; /health only says the process is alive.
+"""
+import os
+import threading
+import time
+
+from instrumentation import get_logger
+
+# 'background' loads on a thread after import; 'eager' loads during import,
+# which is what gunicorn --preload needs so forked workers share the model
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'background')
+
+logger = get_logger()
+
+
+class ModelLoader:
+    """
+    Loads a pickled CatBoost model (and warms its explainer) exactly once
+    """
+
+    def __init__(self, path, warmups=()):
+        self.path = path
+        # Callables run with the loaded model before it is marked ready
+        self.warmups = list(warmups)
+        self.model = None
+        self.state = 'pending'
+        self.stage = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self, mode=MODEL_LOAD_MODE):
+        """
+        Begin loading; returns immediately in background mode
+        """
+        with self._lock:
+            if self.state != 'pending':
+                return
+            self.state = 'loading'
+            self.started_at = time.monotonic()
+        if mode == 'eager':
+            self._load()
+        else:
+            self._thread = threading.Thread(target=self._load, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Block until loading finished (successfully or not); returns readiness
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"Model file not found at {self.path}")
+
+            self.stage = 'importing catboost'
+            import catboost  # noqa: F401  (the unpickler needs it; imported here to time it)
+            import joblib
+
+            self.stage = 'loading model'
+            model = joblib.load(self.path)
+            logger.info("CatBoost model loaded successfully")
+
+            for warmup in self.warmups:
+                self.stage = f"warming up: {getattr(warmup, '__name__', 'warmup')}"
+                warmup(model)
+
+            self.model = model
+            self.state = 'ready'
+            self.stage = None
+            self._ready.set()
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            logger.error("Error loading model: %s", e)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def status(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return {
+            'ready': self.ready,
+            'state': self.state,
+            'stage': self.stage,
+            'error': self.error,
+            'model_path': self.path,
+            'elapsed_seconds': round(end - self.started_at, 3) if self.started_at is not None else None,
+        }
@@ -0,0 +1,230 @@
+"""
+Model registry: several loaded model versions, swapped in without restarting workers.
+
+The bundled catboost_model.pkl is version 'bundled'; every version directory
+train.py writes under MODELS_DIR is a version named after its directory. A
+watcher thread polls both every MODEL_POLL_INTERVAL seconds and loads what
+changed in the background - the model is unpickled, its explainer built and run
+once, its tree export mapped and its population index built - before the
+version is swapped in with a single reference assignment. Requests in flight
+finish on the version they started with, and the first request after a swap
+pays no cold start.
+
+Requests are served by the default version (MODEL_DEFAULT_VERSION: 'bundled',
+a directory name, or 'latest' for the newest directory) unless they name a
+loaded version in the X-Model-Version header, for A/B or shadow scoring. The
+newest MODEL_KEEP_VERSIONS directories are kept loaded.
+"""
+import os
+import threading
+import time
+
+from instrumentation import MODEL_REQUEST_SECONDS, get_logger
+from prediction_cache import file_fingerprint
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Version directories written by train.py (models/<version>/catboost_model.pkl)
+MODELS_DIR = os.environ.get('MODELS_DIR', os.path.join(API_DIR, 'models'))
+MODEL_FILE_NAME = 'catboost_model.pkl'
+# Seconds between checks for new versions; 0 turns watching off
+MODEL_POLL_INTERVAL = float(os.environ.get('MODEL_POLL_INTERVAL', 5))
+MODEL_KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', 2))
+MODEL_DEFAULT_VERSION = os.environ.get('MODEL_DEFAULT_VERSION', 'bundled')
+
+# Request header picking a version; responses carry the version that served them
+MODEL_VERSION_HEADER = 'X-Model-Version'
+BUNDLED_VERSION = 'bundled'
+
+logger = get_logger()
+
+
+class ModelVersion:
+    """
+    One loaded model with its own scoring pipeline (explainers, prediction cache, result tokens)
+    """
+
+    def __init__(self, name, path, model, pipeline, fingerprint, population=None):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.pipeline = pipeline
+        # file_fingerprint(path) when loading started; a different one means the file was replaced
+        self.fingerprint = fingerprint
+        # PopulationIndex of the reference profiles under this model; None if not built
+        self.population = population
+        self.loaded_at = time.time()
+
+    def stats(self):
+        latency = MODEL_REQUEST_SECONDS.summary(self.name)
+        cache = self.pipeline.prediction_cache
+        return {
+            'version': self.name,
+            'path': self.path,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.loaded_at)),
+            'requests': latency['count'],
+            # Percentiles are histogram bucket bounds; None past the last bucket
+            'latency_ms': {
+                name: round(latency[name] * 1000, 3) if latency[name] not in (None, float('inf')) else None
+                for name in ('mean', 'p50', 'p95')
+            },
+            'prediction_cache': cache.stats() if cache is not None else None,
+            'population': self.population.stats() if self.population is not None else None,
+        }
+
+
+class ModelRegistry:
+    """
+    Loaded model versions by name, plus the watcher that loads new ones
+    """
+
+    def __init__(self, build_version, bundled_path, models_dir=MODELS_DIR, poll_interval=MODEL_POLL_INTERVAL,
+                 keep=MODEL_KEEP_VERSIONS, default_version=MODEL_DEFAULT_VERSION):
+        # build_version(name, path, model, fingerprint) -> warmed-up ModelVersion
+        self._build_version = build_version
+        self.bundled_path = bundled_path
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self.keep = keep
+        self.default_version = default_version
+        # (versions by name, default name), replaced as a whole so readers never
+        # see a half-updated pair
+        self._state = ({}, None)
+        # Fingerprint each version last failed to load with, so a broken file is
+        # retried only once it changes
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    @property
+    def versions(self):
+        return self._state[0]
+
+    def get(self, name=None):
+        """
+        The named version (the default one for None); None if it is not loaded
+        """
+        versions, default = self._state
+        return versions.get(name or default)
+
+    def _pick_default(self, versions):
+        directories = sorted(name for name in versions if name != BUNDLED_VERSION)
+        if self.default_version == 'latest' and directories:
+            return directories[-1]
+        if self.default_version in versions:
+            return self.default_version
+        if BUNDLED_VERSION in versions:
+            return BUNDLED_VERSION
+        return directories[-1] if directories else None
+
+    def install(self, version):
+        """
+        Swap a loaded version in (replacing one of the same name) and drop versions no longer kept
+        """
+        with self._lock:
+            versions = dict(self._state[0])
+            versions[version.name] = version
+            default = self._pick_default(versions)
+            kept = set(self.wanted_versions(versions))
+            versions = {name: v for name, v in versions.items() if name in kept or name in (default, BUNDLED_VERSION)}
+            self._state = (versions, default)
+        logger.info("Model version '%s' ready (default: '%s')", version.name, default)
+
+    def available_versions(self):
+        """
+        {name: model path} of the complete version directories in models_dir
+        """
+        try:
+            names = os.listdir(self.models_dir)
+        except OSError:
+            return {}
+        paths = {}
+        for name in names:
+            path = os.path.join(self.models_dir, name, MODEL_FILE_NAME)
+            # train.py writes to a dot-prefixed directory and renames it when complete
+            if not name.startswith('.') and os.path.isfile(path):
+                paths[name] = path
+        return paths
+
+    def wanted_versions(self, names):
+        """
+        The directory versions among names to keep loaded: the newest few, plus a pinned default
+        """
+        directories = sorted(name for name in names if name != BUNDLED_VERSION)
+        wanted = directories[-self.keep:] if self.keep > 0 else []
+        if self.default_version in directories and self.default_version not in wanted:
+            wanted.append(self.default_version)
+        return wanted
+
+    def load(self, name, path):
+        """
+        Load, warm up and install one version; returns it, or None if loading failed
+        """
+        fingerprint = file_fingerprint(path)
+        started = time.perf_counter()
+        try:
+            import catboost  # noqa: F401  (the unpickler needs it)
+            import joblib
+            version = self._build_version(name, path, joblib.load(path), fingerprint)
+        except Exception as e:
+            self._failed[name] = fingerprint
+            logger.error("Model version '%s' not loaded from %s: %s", name, path, e)
+            return None
+        self._failed.pop(name, None)
+        self.install(version)
+        logger.info("Model version '%s' loaded in %.1fs", name, time.perf_counter() - started)
+        return version
+
+    def scan(self):
+        """
+        Load what changed since the last scan: a replaced bundled model file or new version directories
+        """
+        versions = self.versions
+        bundled = versions.get(BUNDLED_VERSION)
+        if bundled is not None:
+            fingerprint = file_fingerprint(self.bundled_path)
+            if fingerprint not in (bundled.fingerprint, 'missing', self._failed.get(BUNDLED_VERSION)):
+                self.load(BUNDLED_VERSION, self.bundled_path)
+
+        available = self.available_versions()
+        for name in self.wanted_versions(available):
+            if name in versions or self._failed.get(name) == file_fingerprint(available[name]):
+                continue
+            self.load(name, available[name])
+
+    def _watch(self):
+        while True:
+            try:
+                self.scan()
+            except Exception:
+                logger.exception("Model registry scan failed")
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def start(self):
+        """
+        Start the watcher thread (again in a forked child, where the parent's thread does not exist)
+        """
+        if self.poll_interval <= 0:
+            return
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        # A lock held by the parent's watcher at fork time would never be released here
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        versions, default = self._state
+        return {
+            'default': default,
+            'models_dir': self.models_dir,
+            'versions': [versions[name].stats() for name in sorted(versions)],
+        }
@@ -0,0 +1,277 @@
+"""
+Population benchmarks: how a footprint compares with the reference dataset's.
+
+The reference profiles (Dataset/Carbon Emission.csv) are read and encoded once
+per process. Each model version then predicts them once and keeps the
+predicted and the measured emissions as sorted arrays - overall and per answer
+of the POPULATION_SLICES questions - so a percentile rank is a binary search.
+Similar profiles come from a k-NN search over a compact float32 matrix of the
+profiles: numeric answers scaled to unit variance, single answers one-hot and
+multi-select answers multi-hot. For 10 000 profiles that is one matrix-vector
+product and one partial sort, well under a millisecond per query.
+"""
+import csv
+import math
+import os
+
+import numpy as np
+
+from feature_schema import MISSING_CATEGORY, parse_list_value
+from tree_model import DATASET_PATH
+
+POPULATION_DATASET_PATH = os.environ.get('POPULATION_DATASET_PATH', DATASET_PATH)
+# Questions whose answer also gets a percentile among the profiles giving the same answer
+POPULATION_SLICES = [
+    col.strip() for col in os.environ.get('POPULATION_SLICES', 'Diet,Transport,Heating Energy Source').split(',')
+    if col.strip()
+]
+# Similar profiles returned by default, and at most
+POPULATION_NEIGHBOURS = int(os.environ.get('POPULATION_NEIGHBOURS', 5))
+MAX_POPULATION_NEIGHBOURS = 50
+
+# Dataset column holding the measured emission (kg CO2e per month)
+TARGET = 'CarbonEmission'
+
+# A different single answer adds 1 to the squared distance, like one standard
+# deviation of a numeric answer; each differing multi-select item adds 1/2
+_ONE_HOT_WEIGHT = math.sqrt(0.5)
+_LIST_ITEM_WEIGHT = math.sqrt(0.5)
+
+
+def read_reference_dataset(schema, path=POPULATION_DATASET_PATH):
+    """
+    (encoded rows, measured emissions) of the reference dataset CSV
+    """
+    with open(path, newline='') as f:
+        records = list(csv.DictReader(f))
+    emissions = [float(record.pop(TARGET)) for record in records]
+    return schema.encode_many(records), emissions
+
+
+def answer_slices(schema, rows, slices=POPULATION_SLICES):
+    """
+    {question: {answer: indices of the rows giving it}} for each question in slices
+    """
+    result = {}
+    for col in slices:
+        if col not in schema.categorical_features:
+            raise ValueError(f"Cannot slice the population by {col!r}: not a categorical question")
+        answers = np.array([row[schema.columns.index(col)] for row in rows], dtype=object)
+        result[col] = {value: np.flatnonzero(answers == value) for value in sorted(set(answers))}
+    return result
+
+
+class ProfileVectorizer:
+    """
+    Encoded rows -> float32 vectors whose Euclidean distance measures how different two profiles are
+    """
+
+    def __init__(self, schema, rows):
+        self.schema = schema
+        # Row positions of the numeric answers, which fill the start of the vector
+        self._numeric = [schema.columns.index(col) for col in schema.numerical_features]
+        numeric = np.array([[row[i] for i in self._numeric] for row in rows], dtype=float).reshape(
+            len(rows), len(self._numeric))
+        self.means = numeric.mean(axis=0) if len(rows) else np.zeros(len(self._numeric))
+        std = numeric.std(axis=0) if len(rows) else np.ones(len(self._numeric))
+        self.scales = np.where(std > 0, std, 1.0)
+
+        # (row position, {answer: vector offset}) per single answer and
+        # (row position, {item: vector offset}, parsed lists) per multi-select answer
+        size = len(self._numeric)
+        self._one_hot = []
+        self._multi_hot = []
+        for i, col in enumerate(schema.columns):
+            if col in schema.list_features:
+                items = schema.list_items.get(col, ())
+                self._multi_hot.append((i, {item: size + j for j, item in enumerate(items)}, {}))
+                size += len(items)
+            elif col in schema.categorical_features:
+                values = schema.allowed_values.get(col, ())
+                self._one_hot.append((i, {value: size + j for j, value in enumerate(values)}))
+                size += len(values)
+        self.size = size
+
+    def _list_offsets(self, value, offsets, memo):
+        # Encoded lists repeat a handful of strings, so each is parsed only once
+        found = memo.get(value)
+        if found is None:
+            items = parse_list_value(value)
+            found = [offsets[item] for item in items if item in offsets] if isinstance(items, list) else []
+            memo[value] = found
+        return found
+
+    def transform(self, row, out=None):
+        """
+        Vector of one encoded row (written into out when given)
+        """
+        vector = np.zeros(self.size, dtype=np.float32) if out is None else out
+        vector[:len(self._numeric)] = (np.array([row[i] for i in self._numeric]) - self.means) / self.scales
+        for i, offsets in self._one_hot:
+            offset = offsets.get(row[i])
+            if offset is not None:
+                vector[offset] = _ONE_HOT_WEIGHT
+        for i, offsets, memo in self._multi_hot:
+            for offset in self._list_offsets(row[i], offsets, memo):
+                vector[offset] = _LIST_ITEM_WEIGHT
+        return vector
+
+    def transform_many(self, rows):
+        matrix = np.zeros((len(rows), self.size), dtype=np.float32)
+        for row, out in zip(rows, matrix):
+            self.transform(row, out)
+        return matrix
+
+
+class ReferenceProfiles:
+    """
+    The reference dataset encoded once: model rows, measured emissions, answer
+    slices and the k-NN matrix, shared by every model version
+    """
+
+    def __init__(self, schema, rows, emissions, slices=POPULATION_SLICES):
+        self.schema = schema
+        self.rows = rows
+        self.emissions = np.asarray(emissions, dtype=float)
+        self.vectorizer = ProfileVectorizer(schema, rows)
+        self.matrix = self.vectorizer.transform_many(rows)
+        self.squared_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        # Parsed multi-select answers by their encoded string, for profile()
+        self._lists = {}
+        # {question: {answer: indices of the profiles giving it}}
+        self.slices = answer_slices(schema, rows, slices)
+
+    @classmethod
+    def load(cls, schema, path=POPULATION_DATASET_PATH, slices=POPULATION_SLICES):
+        return cls(schema, *read_reference_dataset(schema, path), slices)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def profile(self, i):
+        """
+        Answers of profile i, with multi-select answers as lists
+        """
+        profile = dict(zip(self.schema.columns, self.rows[i]))
+        for col in self.schema.list_features:
+            value = profile[col]
+            if value not in self._lists:
+                self._lists[value] = parse_list_value(value)
+            profile[col] = list(self._lists[value])
+        return profile
+
+    def nearest(self, row, k):
+        """
+        (indices, distances) of the k profiles closest to an encoded row, closest first
+        """
+        k = min(k, len(self.rows))
+        if k <= 0:
+            return np.array([], dtype=int), np.array([])
+        query = self.vectorizer.transform(row)
+        # |p - q|² = |p|² - 2 p·q + |q|²; the last term does not change the order
+        distances = self.squared_norms - 2 * (self.matrix @ query)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        squared = np.maximum(distances[nearest] + float(query @ query), 0)
+        return nearest, np.sqrt(squared)
+
+
+def percentile_rank(sorted_values, value):
+    """
+    Percentage of sorted_values below value, counting ties as half below
+    """
+    if not len(sorted_values):
+        return None
+    below = np.searchsorted(sorted_values, value, side='left')
+    at_most = np.searchsorted(sorted_values, value, side='right')
+    return float(100.0 * (below + at_most) / (2 * len(sorted_values)))
+
+
+def sorted_median(sorted_values):
+    n = len(sorted_values)
+    if not n:
+        return None
+    return float(sorted_values[(n - 1) // 2] + sorted_values[n // 2]) / 2
+
+
+class Distribution:
+    """
+    Sorted predicted and measured emissions of a group of reference profiles
+    """
+
+    def __init__(self, predictions, emissions):
+        self.predictions = np.sort(predictions)
+        self.emissions = np.sort(emissions)
+        # Computed once: only the percentiles depend on the query
+        self.summary = {
+            'profiles': len(self.predictions),
+            'median': sorted_median(self.predictions),
+            'measured_median': sorted_median(self.emissions),
+        }
+
+    def compare(self, prediction):
+        return dict(
+            self.summary,
+            # Against the model's predictions for the profiles: like for like with prediction
+            percentile=percentile_rank(self.predictions, prediction),
+            # Against what the profiles actually measured
+            measured_percentile=percentile_rank(self.emissions, prediction),
+        )
+
+
+class PopulationIndex:
+    """
+    Percentile ranks and similar profiles for one model version's predictions
+    """
+
+    def __init__(self, profiles, predictions):
+        self.profiles = profiles
+        self.predictions = np.asarray(predictions, dtype=float)
+        self.overall = Distribution(self.predictions, profiles.emissions)
+        self.slices = {
+            col: {
+                value: Distribution(self.predictions[indices], profiles.emissions[indices])
+                for value, indices in answers.items()
+            }
+            for col, answers in profiles.slices.items()
+        }
+
+    @classmethod
+    def build(cls, profiles, pipeline):
+        """
+        Index the reference profiles under pipeline's model (one batched prediction)
+        """
+        return cls(profiles, pipeline.predict_rows(profiles.rows))
+
+    def compare(self, row, prediction, neighbours=POPULATION_NEIGHBOURS):
+        """
+        Where prediction (for the encoded row) ranks overall and among the profiles
+        sharing each sliced answer, plus the most similar reference profiles
+        """
+        columns = self.profiles.schema.columns
+        slices = {}
+        for col, distributions in self.slices.items():
+            answer = row[columns.index(col)]
+            distribution = distributions.get(answer)
+            # Missing or unseen answers have no group to compare with
+            slices[col] = None if distribution is None or answer == MISSING_CATEGORY else dict(
+                distribution.compare(prediction), answer=answer
+            )
+        indices, distances = self.profiles.nearest(row, neighbours)
+        return {
+            'prediction': float(prediction),
+            'population': self.overall.compare(prediction),
+            'slices': slices,
+            'similar': [
+                {
+                    'distance': float(distance),
+                    'prediction': float(self.predictions[i]),
+                    'carbonEmission': float(self.profiles.emissions[i]),
+                    'profile': self.profiles.profile(i),
+                }
+                for i, distance in zip(indices, distances)
+            ],
+        }
+
+    def stats(self):
+        return {'profiles': len(self.profiles), 'slices': sorted(self.slices)}
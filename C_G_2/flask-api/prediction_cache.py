@@ -0,0 +1,215 @@
+"""
+Bounded prediction cache keyed on the preprocessed questionnaire row.
+
+The in-process backend is an LRU with a TTL. A shared backend (any client with
+redis-style get/set, e.g. redis.Redis) can be swapped in so several
+workers share hits; the local backend is its drop-in stand-in.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import get_logger
+
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 600))
+PREDICTION_CACHE_URL = os.environ.get('PREDICTION_CACHE_URL')
+
+logger = get_logger()
+
+
+def canonical_key(row, *extra):
+    """
+    Stable hash of an encoded row (plus anything else the result depends on)
+    """
+    payload = json.dumps([list(row), list(extra)], separators=(',', ':'), default=float)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Changes whenever the file at path is replaced or rewritten
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class LocalLRUBackend:
+    """
+    In-process LRU with per-entry expiry; hits, misses and evictions are counted
+    under the same lock as the entries
+    """
+    name = 'local'
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SharedBackend:
+    """
+    Cache shared between processes through a redis-style client
+
+    Values are stored as JSON; expiry and eviction are left to the server.
+    """
+    name = 'shared'
+
+    def __init__(self, client, namespace='carbon-care:prediction'):
+        self.client = client
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url):
+        # redis is only needed when a shared cache is configured
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        raw = None
+        try:
+            raw = self.client.get(f"{self.namespace}:{key}")
+        finally:
+            # A failed read counts as a miss
+            with self._lock:
+                if raw is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(f"{self.namespace}:{key}", json.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        # Keys carry the model fingerprint, so stale entries are never read again
+        # and simply expire on the server
+        pass
+
+    def size(self):
+        # Not tracked locally for a shared store
+        return None
+
+
+class PredictionCache:
+    """
+    Prediction, SHAP breakdown and recommendations per canonical row
+
+    Entries are namespaced by the model fingerprint, so replacing the model
+    file invalidates everything without an explicit flush.
+    """
+
+    def __init__(self, backend, ttl=PREDICTION_CACHE_TTL, fingerprint=lambda: '', check_interval=1.0):
+        self.backend = backend
+        self.ttl = ttl
+        self._fingerprint_fn = fingerprint
+        self._fingerprint = fingerprint()
+        self._check_interval = check_interval
+        self._checked_at = time.monotonic()
+
+    def _current_fingerprint(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self._check_interval:
+            self._checked_at = now
+            fingerprint = self._fingerprint_fn()
+            if fingerprint != self._fingerprint:
+                logger.info("Model fingerprint changed (%s -> %s), clearing prediction cache",
+                            self._fingerprint, fingerprint)
+                self._fingerprint = fingerprint
+                self.backend.clear()
+        return self._fingerprint
+
+    @property
+    def hits(self):
+        return self.backend.hits
+
+    @property
+    def misses(self):
+        return self.backend.misses
+
+    def key(self, row, *extra):
+        return canonical_key(row, self._current_fingerprint(), *extra)
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Prediction cache read failed: %s", e)
+            value = None
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning("Prediction cache write failed: %s", e)
+
+    def stats(self):
+        hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': self.backend.name,
+            'size': self.backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'evictions': self.backend.evictions,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'ttl_seconds': self.ttl,
+        }
+
+
+def create_prediction_cache(fingerprint, url=PREDICTION_CACHE_URL, max_size=PREDICTION_CACHE_SIZE):
+    """
+    Shared backend when PREDICTION_CACHE_URL is set, local LRU otherwise; None when disabled
+    """
+    if url:
+        try:
+            return PredictionCache(SharedBackend.from_url(url), fingerprint=fingerprint)
+        except Exception as e:
+            logger.error("Shared prediction cache unavailable (%s), falling back to local cache", e)
+    if max_size <= 0:
+        return None
+    return PredictionCache(LocalLRUBackend(max_size), fingerprint=fingerprint)
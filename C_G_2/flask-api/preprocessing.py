@@ -0,0 +1,57 @@
+"""
+DataFrame preprocessing for CatBoost, used for batches and CSV chunks.
+
+Same semantics as FeatureSchema.encode, applied column by column with pandas.
+"""
+import pandas as pd
+
+from feature_schema import (
+    CATEGORICAL_FEATURES, EXPECTED_COLUMNS, LIST_FEATURES, MISSING_CATEGORY, NUMERICAL_FEATURES,
+    parse_list_value, to_numeric_or_zero
+)
+from instrumentation import get_logger
+
+logger = get_logger()
+
+
+def preprocess_batch_for_catboost(records):
+    """
+    Columnar preprocessing for a list of records or a DataFrame - one frame for the whole batch
+    """
+    if isinstance(records, pd.DataFrame):
+        input_df = records.reindex(columns=EXPECTED_COLUMNS)
+    else:
+        input_df = pd.DataFrame.from_records(list(records), columns=EXPECTED_COLUMNS)
+
+    # Stringified lists ("['Metal']" from the CSV) and real lists encode the same way
+    for col in LIST_FEATURES:
+        input_df[col] = input_df[col].map(parse_list_value)
+
+    # Missing answers get the same defaults as single-record preprocessing
+    for col in CATEGORICAL_FEATURES:
+        column = input_df[col]
+        input_df[col] = column.where(column.notna(), MISSING_CATEGORY).astype(str)
+
+    for col in NUMERICAL_FEATURES:
+        try:
+            input_df[col] = pd.to_numeric(input_df[col], errors='coerce').fillna(0).astype(float)
+        except (TypeError, ValueError):
+            # Unhashable or nested values: convert cell by cell so one bad row
+            # does not zero the column for the whole batch
+            input_df[col] = input_df[col].map(to_numeric_or_zero)
+
+    return input_df
+
+
+def preprocess_input_for_catboost(data):
+    """
+    Minimal preprocessing for CatBoost - it handles categorical features automatically
+    """
+    input_df = preprocess_batch_for_catboost([data])
+
+    # dtypes/head() are expensive to render; only build them for sampled calls
+    if logger.sampled():
+        logger.debug("Preprocessed data for CatBoost: %s\nshape %s\ndtypes:\n%s\nsample:\n%s",
+                     data, input_df.shape, input_df.dtypes, input_df.head())
+
+    return input_df
@@ -0,0 +1,151 @@
+"""
+Recommendation engine compiled once from recommendations.json.
+
+The data file holds every template, threshold and rule, so the wording and the
+rules can be edited without touching code. At load time the templates are
+indexed by (category, impact level), (category, answer) and feature, and the
+rules are turned into predicates.
+"""
+import hashlib
+import json
+import os
+
+RECOMMENDATIONS_PATH = os.environ.get(
+    'RECOMMENDATIONS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recommendations.json')
+)
+
+
+def _equals(expected):
+    return lambda value: value == expected
+
+
+def _empty_or_contains(needle):
+    # Empty answers come as [] / '' from the frontend and as '[]' once stringified
+    return lambda value: not value or str(value) == '[]' or needle in str(value)
+
+
+RULE_OPS = {
+    'equals': _equals,
+    'empty_or_contains': _empty_or_contains,
+}
+
+
+def _template(rec, category=None):
+    # (title, description, impact, category) - category None means "fill in at use"
+    return (rec['title'], rec['description'], rec['impact'], rec.get('category', category))
+
+
+class RecommendationEngine:
+    """
+    Turns a SHAP category breakdown and the raw answers into at most N recommendations
+    """
+
+    def __init__(self, config):
+        limits = config.get('limits', {})
+        self.top_categories = limits.get('top_categories', 3)
+        self.top_features = limits.get('top_features', 2)
+        self.max_recommendations = limits.get('max_recommendations', 5)
+        self.high_impact_threshold = config.get('high_impact_threshold', 25)
+        self.version = hashlib.blake2b(
+            json.dumps(config, sort_keys=True).encode('utf-8'), digest_size=8
+        ).hexdigest()
+
+        # "...{percentage}..." split once so rendering is plain concatenation
+        self._category_prefix = tuple(config['category_prefix'].split('{percentage}', 1))
+        self._feature_prefix = tuple(config['feature_prefix'].split('{percentage}', 1))
+
+        self._by_impact = {}
+        self._by_answer = {}
+        self._answer_field = {}
+        self._answer_default = {}
+        for category, spec in config.get('categories', {}).items():
+            if 'answer_field' in spec:
+                self._answer_field[category] = spec['answer_field']
+                self._by_answer[category] = {
+                    answer.lower(): _template(rec, category) for answer, rec in spec.get('answers', {}).items()
+                }
+                if 'default' in spec:
+                    self._answer_default[category] = _template(spec['default'], category)
+            for level, rec in spec.get('impact_levels', {}).items():
+                self._by_impact[(category, level)] = _template(rec, category)
+
+        self._by_feature = {feature: _template(rec) for feature, rec in config.get('features', {}).items()}
+
+        self._rules = [
+            (rule['field'], RULE_OPS[rule['op']](rule['value']), _template(rule['recommendation']))
+            for rule in config.get('rules', [])
+        ]
+
+    @classmethod
+    def from_file(cls, path=RECOMMENDATIONS_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _answer(self, data, category):
+        value = data.get(self._answer_field[category], '')
+        return '' if value is None else str(value).lower()
+
+    def _category_template(self, category, answer, high):
+        if category in self._answer_field:
+            return self._by_answer[category].get(answer, self._answer_default.get(category))
+        return self._by_impact.get((category, 'high' if high else 'medium'))
+
+    def _assemble(self, category_breakdown, answers, high_flags, top_features, rule_hits):
+        recommendations = []
+        seen_titles = set()
+
+        # (template, category, description) candidates in priority order
+        candidates = []
+        head, tail = self._category_prefix
+        for category, answer, high in zip(category_breakdown, answers, high_flags):
+            name = category['name']
+            template = self._category_template(name, answer, high)
+            if template is not None:
+                candidates.append((template, name, f"{head}{category['percentage']}{tail}{template[1]}"))
+
+        head, tail = self._feature_prefix
+        for feature_info in top_features[:self.top_features]:
+            template = self._by_feature.get(feature_info['feature'])
+            if template is not None:
+                candidates.append(
+                    (template, feature_info['category'], f"{head}{feature_info['percentage']}{tail}{template[1]}")
+                )
+
+        for rule, hit in zip(self._rules, rule_hits):
+            if hit:
+                template = rule[2]
+                candidates.append((template, template[3], template[1]))
+
+        for template, category, description in candidates:
+            title = template[0]
+            if title not in seen_titles:
+                seen_titles.add(title)
+                recommendations.append({
+                    'title': title,
+                    'description': description,
+                    'impact': template[2],
+                    'category': category
+                })
+                if len(recommendations) == self.max_recommendations:
+                    break
+        return recommendations
+
+    def recommend(self, data, category_breakdown, top_features):
+        """
+        Recommendations for one record
+        """
+        top = category_breakdown[:self.top_categories]
+        answers = [self._answer(data, c['name']) if c['name'] in self._answer_field else None for c in top]
+        high_flags = [c['percentage'] > self.high_impact_threshold for c in top]
+        rule_hits = [predicate(data.get(field)) for field, predicate, _ in self._rules]
+        return self._assemble(top, answers, high_flags, top_features, rule_hits)
+
+    def recommend_batch(self, records, category_breakdowns, top_features_list):
+        """
+        Recommendations for many records, one recommend() call each
+        """
+        return [
+            self.recommend(data, breakdown, top_features)
+            for data, breakdown, top_features in zip(records, category_breakdowns, top_features_list)
+        ]
@@ -0,0 +1,201 @@
+"""
+Bulk scoring CLI for questionnaire CSVs shaped like Dataset/Carbon Emission.csv.
+
+Streams the input in chunks, scores the chunks on a process pool that shares
+the loaded model, and writes predictions (and optionally SHAP columns) to CSV
+or Parquet without holding the whole file in memory.
+
+    python score_csv.py "../../Dataset/Carbon Emission.csv" scored.csv --shap
+    python score_csv.py input.csv scored.parquet --chunksize 20000 --workers 8
+    python score_csv.py input.csv scored.csv --trees catboost_model.trees
+
+With --trees, predictions come from the memory-mapped tree export (see
+tree_model.py): workers share its pages and start without importing catboost or
+unpickling the model. CatBoost itself is faster per row on big chunks, so this
+pays off for many short-lived workers rather than for one long run.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from explainers import CatBoostNativeExplainer
+from feature_schema import CATEGORICAL_FEATURES, EXPECTED_COLUMNS
+from preprocessing import preprocess_batch_for_catboost
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catboost_model.pkl')
+
+PREDICTION_COLUMN = 'PredictedCarbonEmission'
+
+# Set in the parent before the pool forks (shared copy-on-write) or by the
+# initializer under the spawn start method
+_model = None
+_trees = None
+_thread_count = -1
+
+
+def _init_worker(model_path, thread_count, trees_path=None):
+    global _model, _trees, _thread_count
+    if trees_path is not None:
+        if _trees is None:
+            from tree_model import ObliviousTreeModel
+            _trees = ObliviousTreeModel.load(trees_path)
+    elif _model is None:
+        _model = joblib.load(model_path)
+    _thread_count = thread_count
+
+
+def score_chunk(chunk, with_shap=False, keep_columns=True):
+    """
+    Score one DataFrame chunk; returns the output frame for that chunk
+    """
+    input_df = preprocess_batch_for_catboost(chunk)
+
+    if _trees is not None:
+        contributions, raw_predictions = None, _trees.predict(input_df[EXPECTED_COLUMNS].to_numpy(dtype=object))
+    else:
+        from catboost import Pool
+        pool = Pool(data=input_df, cat_features=CATEGORICAL_FEATURES, thread_count=_thread_count)
+        if with_shap:
+            contributions, raw_predictions = CatBoostNativeExplainer(_model, _thread_count).explain(pool)
+        else:
+            contributions, raw_predictions = None, _model.predict(pool, thread_count=_thread_count)
+
+    output = chunk.reset_index(drop=True) if keep_columns else pd.DataFrame(index=range(len(chunk)))
+    # Same convention as the API: emissions are reported as a positive number
+    output[PREDICTION_COLUMN] = np.abs(np.asarray(raw_predictions, dtype=float))
+    if contributions is not None:
+        for i, feature in enumerate(EXPECTED_COLUMNS):
+            output[f"shap_{feature}"] = contributions[:, i]
+    return output
+
+
+def read_chunks(path, chunksize):
+    # Categorical answers stay strings; keep_default_na=False keeps empty answers
+    # as '' (what the frontend sends) rather than NaN
+    return pd.read_csv(
+        path,
+        chunksize=chunksize,
+        dtype={col: str for col in CATEGORICAL_FEATURES},
+        keep_default_na=False,
+    )
+
+
+class OutputWriter:
+    """
+    Appends scored chunks to a CSV or Parquet file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._header_written = False
+
+    def write(self, frame):
+        if self.parquet:
+            # pyarrow is only needed for Parquet output
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._header_written else 'w',
+                         header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def score_csv(input_path, output_path, model_path=DEFAULT_MODEL_PATH, chunksize=5000, workers=None,
+              with_shap=False, keep_columns=True, trees_path=None):
+    """
+    Score input_path chunk by chunk into output_path; returns the number of rows written
+    """
+    global _model, _thread_count
+    if with_shap and trees_path is not None:
+        raise ValueError('SHAP columns need the CatBoost model; drop trees_path')
+    workers = workers or os.cpu_count() or 1
+    # Workers split the cores between them instead of each using all of them
+    thread_count = -1 if workers == 1 else max(1, (os.cpu_count() or 1) // workers)
+
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    if start_method == 'fork' and trees_path is None:
+        # Load once here; forked workers share the model pages
+        _model = joblib.load(model_path)
+
+    writer = OutputWriter(output_path)
+    rows = 0
+    started = time.perf_counter()
+    try:
+        if workers == 1:
+            _init_worker(model_path, thread_count, trees_path)
+            for chunk in read_chunks(input_path, chunksize):
+                result = score_chunk(chunk, with_shap, keep_columns)
+                writer.write(result)
+                rows += len(result)
+        else:
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(model_path, thread_count, trees_path)) as executor:
+                # At most two chunks per worker in flight keeps memory bounded,
+                # and writing in submission order keeps the output in input order
+                pending = deque()
+                for chunk in read_chunks(input_path, chunksize):
+                    pending.append(executor.submit(score_chunk, chunk, with_shap, keep_columns))
+                    if len(pending) >= 2 * workers:
+                        result = pending.popleft().result()
+                        writer.write(result)
+                        rows += len(result)
+                        _report_progress(rows, started)
+                while pending:
+                    result = pending.popleft().result()
+                    writer.write(result)
+                    rows += len(result)
+    finally:
+        writer.close()
+
+    _report_progress(rows, started)
+    return rows
+
+
+def _report_progress(rows, started):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a questionnaire CSV with the CatBoost model')
+    parser.add_argument('input', help='CSV with the questionnaire columns (extra columns are kept)')
+    parser.add_argument('output', help='output path; .parquet writes Parquet, anything else CSV')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='pickled CatBoost model')
+    parser.add_argument('--chunksize', type=int, default=5000, help='rows per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--shap', action='store_true', help='add shap_<feature> columns')
+    parser.add_argument('--trees', default=None,
+                        help='predict from this tree export (tree_model.py) instead of the pickled model')
+    parser.add_argument('--predictions-only', action='store_true',
+                        help='write only the prediction (and SHAP) columns')
+    args = parser.parse_args(argv)
+    if args.shap and args.trees:
+        parser.error('--shap needs the CatBoost model; it cannot be combined with --trees')
+
+    score_csv(args.input, args.output, model_path=args.model, chunksize=args.chunksize,
+              workers=args.workers, with_shap=args.shap, keep_columns=not args.predictions_only,
+              trees_path=args.trees)
+
+
+if __name__ == '__main__':
+    main()
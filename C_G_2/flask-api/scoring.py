@@ -0,0 +1,186 @@
+"""
+The scoring pipeline shared by every endpoint.
+
+One pass turns request dicts into prediction, SHAP category breakdown, top
+features and recommendations: encode -> cache lookup -> one Pool -> one
+explainer call (which also yields the prediction) -> category summary ->
+recommendations. Each scored record gets a result token, so a follow-up call
+(e.g. /insights after /predict) can reuse the result instead of scoring again.
+"""
+import os
+
+import numpy as np
+
+from categories import get_category_aggregator
+from explainers import DEFAULT_EXPLAINER, create_explainer
+from instrumentation import SCORED_BATCH_RECORDS, get_logger, stage
+from prediction_cache import LocalLRUBackend, canonical_key
+
+# Results handed out with a token stay retrievable this long (seconds)...
+RESULT_TOKEN_TTL = float(os.environ.get('RESULT_TOKEN_TTL', 600))
+# ...in a per-process store of at most this many results
+RESULT_TOKEN_STORE_SIZE = int(os.environ.get('RESULT_TOKEN_STORE_SIZE', 1024))
+
+logger = get_logger()
+
+
+class ScoringPipeline:
+    """
+    Prediction, explanation and recommendations for request dicts, in one pass
+    """
+
+    def __init__(self, schema, model_source, recommendation_engine, prediction_cache=None,
+                 fingerprint=lambda: '', default_explainer=DEFAULT_EXPLAINER):
+        self.schema = schema
+        # Callable returning the loaded model, so the pipeline can exist before loading ends
+        self._model_source = model_source
+        self.recommendation_engine = recommendation_engine
+        self.prediction_cache = prediction_cache
+        self.fingerprint = fingerprint
+        self.default_explainer = default_explainer
+        # SHAP explainer backends, built on first use and reused afterwards
+        self.explainers = {}
+        # Memory-mapped tree export (tree_model.py) used for predictions the
+        # explainer does not already provide; None predicts with the CatBoost model
+        self.tree_model = None
+        # Recently returned results by token; independent of the prediction cache
+        # so tokens work even when caching is switched off
+        self.results = LocalLRUBackend(RESULT_TOKEN_STORE_SIZE)
+
+    @property
+    def model(self):
+        return self._model_source()
+
+    def get_explainer(self, name=None, model=None):
+        """
+        Return the named explainer backend (defaults to EXPLAINER_BACKEND) for the loaded model
+        """
+        name = name or self.default_explainer
+        if name not in self.explainers:
+            self.explainers[name] = create_explainer(name, model or self.model)
+            logger.info("SHAP explainer '%s' initialized successfully", name)
+        return self.explainers[name]
+
+    def token(self, row, explainer_name=None):
+        """
+        Result token of an encoded row: identifies the inputs, model and settings
+        the result was computed with (and doubles as its prediction cache key)
+        """
+        extra = (explainer_name or self.default_explainer, self.recommendation_engine.version)
+        if self.prediction_cache is not None:
+            return self.prediction_cache.key(row, *extra)
+        return canonical_key(row, self.fingerprint(), *extra)
+
+    def predict_rows(self, rows):
+        """
+        Predictions (no explanations) for encoded rows from one model call - the
+        tree export when loaded, else the CatBoost model
+        """
+        if self.tree_model is not None:
+            raw_predictions = self.tree_model.predict(rows)
+        else:
+            raw_predictions = self.model.predict(self.schema.to_pool(rows))
+        return np.abs(np.asarray(raw_predictions, dtype=float))
+
+    def score_pool(self, input_pool, explainer_name=None, rows=None):
+        """
+        Predict and explain every row of input_pool from a single Pool (rows are
+        its encoded rows, for the tree export)
+
+        Returns (predictions, [(category_breakdown, top_individual_features), ...], complete)
+        where complete is False when the explainer failed and the breakdowns are empty
+        """
+        contributions, raw_predictions = None, None
+        complete = True
+        try:
+            with stage('shap'):
+                contributions, raw_predictions = self.get_explainer(explainer_name).explain(input_pool)
+        except Exception:
+            complete = False
+            logger.exception("Error calculating SHAP values")
+
+        if raw_predictions is None:
+            with stage('predict'):
+                if self.tree_model is not None and rows is not None:
+                    raw_predictions = self.tree_model.predict(rows)
+                else:
+                    raw_predictions = self.model.predict(input_pool)
+        predictions = np.abs(np.asarray(raw_predictions, dtype=float))
+
+        if contributions is None:
+            return predictions, [([], []) for _ in range(len(predictions))], complete
+
+        with stage('aggregate'):
+            summaries = get_category_aggregator(tuple(self.schema.columns)).summarize(contributions)
+        return predictions, summaries, complete
+
+    def score_with_tokens(self, records, explainer_name=None):
+        """
+        Score a list of request dicts; returns [(result, token), ...]
+
+        Repeats come from the prediction cache; the rest are encoded into one Pool
+        and scored with one explainer call. Complete results are kept under their
+        token for RESULT_TOKEN_TTL seconds.
+        """
+        with stage('preprocess'):
+            rows = self.schema.encode_many(records)
+        cache = self.prediction_cache
+        results = [None] * len(rows)
+        misses = []
+
+        with stage('cache_lookup'):
+            tokens = [self.token(row, explainer_name) for row in rows]
+            for i, token in enumerate(tokens):
+                if cache is not None:
+                    results[i] = cache.get(token)
+                if results[i] is None:
+                    misses.append(i)
+
+        if misses:
+            SCORED_BATCH_RECORDS.observe(len(misses))
+            miss_rows = [rows[i] for i in misses]
+            with stage('pool'):
+                input_pool = self.schema.to_pool(miss_rows)
+            predictions, shap_summaries, complete = self.score_pool(input_pool, explainer_name, miss_rows)
+            with stage('recommendations'):
+                all_recommendations = self.recommendation_engine.recommend_batch(
+                    [records[i] for i in misses],
+                    [summary[0] for summary in shap_summaries],
+                    [summary[1] for summary in shap_summaries]
+                )
+            for i, prediction, (category_breakdown, top_features), recommendations in zip(
+                    misses, predictions, shap_summaries, all_recommendations):
+                results[i] = {
+                    'prediction': float(prediction),
+                    'category_breakdown': category_breakdown,
+                    'top_individual_features': top_features,
+                    'recommendations': recommendations
+                }
+                # Do not pin a failed explanation in the cache or behind a token
+                if complete:
+                    if cache is not None:
+                        cache.set(tokens[i], results[i])
+                    self.results.set(tokens[i], results[i], RESULT_TOKEN_TTL)
+
+        return list(zip(results, tokens))
+
+    def score(self, records, explainer_name=None):
+        """
+        Score a list of request dicts; returns one result dict per record
+        """
+        return [result for result, _ in self.score_with_tokens(records, explainer_name)]
+
+    def resolve(self, token, data=None, explainer_name=None):
+        """
+        Result previously handed out under token, or None if unknown or expired
+
+        With data, the token is only honoured if it is data's own token, so a stale
+        token sent next to different answers can never return someone else's result.
+        """
+        if data is not None and token != self.token(self.schema.encode(data), explainer_name):
+            return None
+        result = self.results.get(token)
+        if result is None and self.prediction_cache is not None:
+            # A shared cache also resolves tokens handed out by other workers
+            result = self.prediction_cache.get(token)
+        return result
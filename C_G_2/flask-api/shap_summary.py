@@ -0,0 +1,293 @@
+"""
+Population SHAP summary: SHAP values of the whole reference dataset, computed offline.
+
+The job splits the reference dataset into chunks and scores them on a process
+pool with the model's native ShapValues. Every worker writes its chunk straight
+into one memory-mapped values.npy (rows x (features + bias), float32). The
+aggregates the dashboard charts are then written to summary.json: mean |SHAP|
+and average share per feature and per FEATURE_CATEGORIES group, overall and per
+answer of each POPULATION_SLICES question. Both go next to the model:
+
+    catboost_model.shap/values.npy          (and models/<version>/catboost_model.shap/)
+    catboost_model.shap/summary.json
+
+Run from the flask-api directory, after training or installing a model:
+
+    python shap_summary.py                                       # catboost_model.pkl
+    python shap_summary.py --model models/<version>/catboost_model.pkl --workers 4
+
+The API serves summary.json as is from GET /shap/summary with an ETag, re-reading
+it only when the file changes, so these views cost nothing at request time. A
+summary computed for another model (its model_guid differs) is not served.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from categories import get_category_aggregator
+from feature_schema import model_schema
+from population import POPULATION_DATASET_PATH, POPULATION_SLICES, answer_slices, read_reference_dataset
+from prediction_cache import file_fingerprint
+from tree_model import DEFAULT_MODEL_PATH
+
+FORMAT_VERSION = 1
+VALUES_FILE_NAME = 'values.npy'
+SUMMARY_FILE_NAME = 'summary.json'
+
+# Rows per ShapValues call in the offline job
+SHAP_CHUNK_ROWS = int(os.environ.get('SHAP_CHUNK_ROWS', 1000))
+# How long clients may reuse /shap/summary before revalidating it with its ETag (seconds)
+SHAP_SUMMARY_MAX_AGE = int(os.environ.get('SHAP_SUMMARY_MAX_AGE', 300))
+
+# Set by the worker initializer: (model, its schema, values memmap, CatBoost threads)
+_worker = None
+
+
+def summary_directory(model_path):
+    """
+    Where the SHAP summary of the model at model_path lives: catboost_model.pkl -> catboost_model.shap
+    """
+    return os.path.splitext(model_path)[0] + '.shap'
+
+
+def model_guid(model):
+    """
+    CatBoost's id for a trained model; a retrained model gets a new one
+    """
+    metadata = model.get_metadata()
+    return metadata['model_guid'] if 'model_guid' in metadata else None
+
+
+def _init_worker(model_path, values_path, thread_count):
+    global _worker
+    import joblib
+    _worker = (joblib.load(model_path), model_schema(model_path), np.load(values_path, mmap_mode='r+'), thread_count)
+
+
+def shap_chunk(start, rows):
+    """
+    Write the ShapValues of rows into values[start:start + len(rows)]; returns the row count
+    """
+    model, schema, values, thread_count = _worker
+    values[start:start + len(rows)] = model.get_feature_importance(
+        data=schema.to_pool(rows), type='ShapValues', thread_count=thread_count
+    )
+    values.flush()
+    return len(rows)
+
+
+def compute_values(model_path, rows, values_path, workers=None, chunk_rows=SHAP_CHUNK_ROWS):
+    """
+    ShapValues of every row into a new values.npy at values_path, chunk by chunk on a process pool
+    """
+    global _worker
+    values = np.lib.format.open_memmap(values_path, mode='w+', dtype=np.float32,
+                                       shape=(len(rows), len(model_schema(model_path).columns) + 1))
+    values.flush()
+    del values
+
+    chunks = [(start, rows[start:start + chunk_rows]) for start in range(0, len(rows), chunk_rows)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+    # Workers split the cores between them instead of each using all of them
+    thread_count = -1 if workers == 1 else max(1, (os.cpu_count() or 1) // workers)
+    if workers == 1:
+        _init_worker(model_path, values_path, thread_count)
+        try:
+            for start, chunk in chunks:
+                shap_chunk(start, chunk)
+        finally:
+            _worker = None
+        return
+
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                             initializer=_init_worker, initargs=(model_path, values_path, thread_count)) as executor:
+        # list() re-raises the first failed chunk's error
+        list(executor.map(shap_chunk, *zip(*chunks)))
+
+
+def aggregate(contributions, predictions, aggregator):
+    """
+    Mean |SHAP|, mean SHAP and average share (percent of a row's total |SHAP|)
+    per feature and per category for a group of rows
+    """
+    importance = np.abs(contributions)
+    total = importance.sum(axis=1)
+    counted = total > 0
+    shares = importance[counted] / total[counted, None] * 100
+    mean_share = shares.mean(axis=0) if len(shares) else np.zeros(importance.shape[1])
+    mean_importance = importance.mean(axis=0)
+    mean_contribution = contributions.mean(axis=0)
+    category_importance = mean_importance @ aggregator.membership
+    category_share = mean_share @ aggregator.membership
+
+    features = [
+        {
+            'feature': name,
+            'category': aggregator.feature_category[i],
+            'mean_abs_shap': float(mean_importance[i]),
+            'mean_shap': float(mean_contribution[i]),
+            'share': round(float(mean_share[i]), 2),
+        }
+        for i, name in enumerate(aggregator.feature_names)
+    ]
+    categories = [
+        {
+            'name': name,
+            'mean_abs_shap': float(category_importance[c]),
+            'share': round(float(category_share[c]), 2),
+        }
+        for c, name in enumerate(aggregator.category_names)
+    ]
+    return {
+        'rows': len(contributions),
+        'mean_prediction': float(predictions.mean()) if len(predictions) else None,
+        'features': sorted(features, key=lambda f: -f['mean_abs_shap']),
+        'categories': sorted(categories, key=lambda c: -c['mean_abs_shap']),
+    }
+
+
+def summarize(schema, values, rows, slices=POPULATION_SLICES):
+    """
+    The summary.json document for a (rows x (features + bias)) SHAP array of rows encoded with schema
+    """
+    aggregator = get_category_aggregator(tuple(schema.columns))
+    contributions = np.asarray(values[:, :-1], dtype=float)
+    # For a regressor the bias plus the contributions is the raw prediction
+    predictions = np.abs(values[:, -1] + contributions.sum(axis=1))
+    return {
+        'overall': aggregate(contributions, predictions, aggregator),
+        'segments': {
+            col: {
+                answer: aggregate(contributions[indices], predictions[indices], aggregator)
+                for answer, indices in answers.items()
+            }
+            for col, answers in answer_slices(schema, rows, slices).items()
+        },
+    }
+
+
+def compute_summary(model_path=DEFAULT_MODEL_PATH, dataset_path=POPULATION_DATASET_PATH, directory=None,
+                    workers=None, chunk_rows=SHAP_CHUNK_ROWS):
+    """
+    Compute values.npy and summary.json for the model at model_path; returns the summary document
+
+    Both are written to a temporary directory first and moved into place once
+    complete, so the API never reads a half-written summary.
+    """
+    import catboost  # noqa: F401  (the unpickler needs it)
+    import joblib
+    from train import dataset_digest
+    directory = directory or summary_directory(model_path)
+    started = time.perf_counter()
+    # Encoded the way the model's version serves requests (see app.build_version)
+    schema = model_schema(model_path)
+    rows, _ = read_reference_dataset(schema, dataset_path)
+    guid = model_guid(joblib.load(model_path))
+
+    parent, name = os.path.split(os.path.abspath(directory))
+    tmp_dir = os.path.join(parent, f'.{name}.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        values_path = os.path.join(tmp_dir, VALUES_FILE_NAME)
+        compute_values(model_path, rows, values_path, workers, chunk_rows)
+        shap_seconds = time.perf_counter() - started
+        document = dict(
+            format_version=FORMAT_VERSION,
+            model_guid=guid,
+            dataset_sha256=dataset_digest(dataset_path),
+            created_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            features=schema.columns,
+            expected_value=float(np.load(values_path, mmap_mode='r')[0, -1]) if rows else None,
+            **summarize(schema, np.load(values_path, mmap_mode='r'), rows),
+            timings={'shap': round(shap_seconds, 3), 'total': round(time.perf_counter() - started, 3)},
+        )
+        with open(os.path.join(tmp_dir, SUMMARY_FILE_NAME), 'w') as f:
+            json.dump(document, f, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # A directory cannot be replaced in one rename: move the old one aside first.
+    # Processes that memory-mapped the old values keep reading them until they close them.
+    old_dir = os.path.join(parent, f'.{name}.old')
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return document
+
+
+class ShapSummary:
+    """
+    One summary.json as served: its bytes, parsed document and ETag
+    """
+
+    def __init__(self, directory, body, fingerprint):
+        self.directory = directory
+        self.body = body
+        self.document = json.loads(body)
+        # Content-based, so every worker and host hands out the same ETag for the same file
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.fingerprint = fingerprint
+
+    @property
+    def model_guid(self):
+        return self.document.get('model_guid')
+
+
+class ShapSummaryStore:
+    """
+    summary.json per summary directory, read once and again only when the file changes
+    """
+
+    def __init__(self):
+        self._summaries = {}
+
+    def get(self, directory):
+        """
+        The current ShapSummary in directory, or None if there is none
+        """
+        path = os.path.join(directory, SUMMARY_FILE_NAME)
+        fingerprint = file_fingerprint(path)
+        if fingerprint == 'missing':
+            return None
+        summary = self._summaries.get(directory)
+        if summary is None or summary.fingerprint != fingerprint:
+            try:
+                with open(path, 'rb') as f:
+                    body = f.read()
+            except OSError:
+                return None
+            summary = ShapSummary(directory, body, fingerprint)
+            self._summaries[directory] = summary
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute population SHAP values and their aggregates')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='pickled CatBoost model')
+    parser.add_argument('--dataset', default=POPULATION_DATASET_PATH, help='reference dataset CSV')
+    parser.add_argument('--out', default=None, help='output directory (default: next to the model)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-rows', type=int, default=SHAP_CHUNK_ROWS, help='rows per ShapValues call')
+    args = parser.parse_args(argv)
+
+    document = compute_summary(args.model, args.dataset, args.out, args.workers, args.chunk_rows)
+    top = ', '.join(f"{c['name']} {c['share']:.1f}%" for c in document['overall']['categories'])
+    print(f"SHAP values of {document['overall']['rows']} rows in {document['timings']['shap']:.1f}s")
+    print(f"Average category share: {top}")
+    print(f"Saved {args.out or summary_directory(args.model)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Shared fixtures for the flask-api tests.
+
+Run from the flask-api directory:
+
+    python -m pytest -q tests
+
+The app is imported once per session with the bundled model and no registry
+watcher; tests that need more model versions install them into a registry of
+their own or restore the app's registry afterwards.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+# Only the bundled model, loaded once and never swapped behind a test's back
+os.environ.setdefault('MODEL_POLL_INTERVAL', '0')
+os.environ.setdefault('MODELS_DIR', os.path.join(tempfile.gettempdir(), 'carbon-care-tests-no-models'))
+
+from feature_schema import SCHEMA_FILE_NAME  # noqa: E402
+from model_registry import MODEL_FILE_NAME  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_responses.json')
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    assert app.model_loader.wait(timeout=300), app.model_loader.status()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    """
+    Records and the original app.py's /predict and /insights responses for them
+    """
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def records(baseline):
+    return [dict(record) for record in baseline['records']]
+
+
+@pytest.fixture
+def version_dir(app_module, tmp_path):
+    """
+    make(name, schema_document=None) -> models/<name>/ holding a copy of the bundled
+    model (and a feature_schema.json when given), as train.py lays a version out
+    """
+    def make(name, schema_document=None):
+        directory = tmp_path / 'models' / name
+        directory.mkdir(parents=True)
+        shutil.copyfile(app_module.model_path, directory / MODEL_FILE_NAME)
+        if schema_document is not None:
+            (directory / SCHEMA_FILE_NAME).write_text(json.dumps(schema_document))
+        return directory
+    return make
+
+
+@pytest.fixture
+def restore_registry(app_module):
+    """
+    Put the app's model registry back the way it was after the test
+    """
+    state = app_module.model_registry._state
+    yield app_module.model_registry
+    app_module.model_registry._state = state
@@ -0,0 +1,132 @@
+"""
+The ASGI serving mode answers like the Flask app, with single records micro-batched.
+"""
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def asgi(app_module):
+    import asgi
+    return asgi
+
+
+@pytest.fixture
+def call(asgi):
+    """
+    call(method, path, body=None, headers=()) -> (status, headers, decoded body)
+    """
+    async def request(method, path, body=None, headers=()):
+        messages = []
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+                 'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+
+        async def receive():
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi.app(scope, receive, send)
+        start, response = messages
+        response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+        data = response['body']
+        if response_headers.get('content-type') == 'application/json' and data:
+            data = json.loads(data)
+        return start['status'], response_headers, data
+
+    def run(*requests):
+        async def main():
+            try:
+                return await asyncio.gather(*[request(*args) for args in requests])
+            finally:
+                # Batchers belong to this event loop; the next test runs another one
+                for batcher in asgi.batchers.values():
+                    await batcher.close()
+                asgi.batchers.clear()
+        return asyncio.run(main())
+    return run
+
+
+def test_predict_matches_flask(call, client, records):
+    status, headers, body = call(('POST', '/predict', records[0]))[0]
+    assert status == 200
+    assert headers['x-model-version'] == 'bundled'
+    assert body == client.post('/predict', json=records[0]).get_json()
+
+
+def test_concurrent_predicts_are_batched(call, asgi, client, records, monkeypatch):
+    batch_sizes = []
+    score_with_tokens = asgi.model_registry.get().pipeline.score_with_tokens
+
+    def recording(records, explainer_name=None):
+        batch_sizes.append(len(records))
+        return score_with_tokens(records, explainer_name)
+    # Batchers are created on first use and bind the pipeline's method then
+    monkeypatch.setattr(asgi.model_registry.get().pipeline, 'score_with_tokens', recording)
+
+    responses = call(*[('POST', '/predict', record) for record in records[:8]])
+    assert sum(batch_sizes) == 8
+    assert len(batch_sizes) < 8
+    assert [status for status, _, _ in responses] == [200] * 8
+    for record, (_, _, body) in zip(records, responses):
+        assert body == client.post('/predict', json=record).get_json()
+
+
+def test_insights_and_batch(call, client, records):
+    (status, _, insights), (batch_status, _, batch) = call(
+        ('POST', '/insights', {'carbonData': records[1]}), ('POST', '/predict/batch', records[:3]))
+    assert status == 200
+    assert insights == client.post('/insights', json={'carbonData': records[1]}).get_json()
+    assert batch_status == 200
+    assert batch == client.post('/predict/batch', json=records[:3]).get_json()
+
+
+def test_whatif_and_benchmark_match_flask(call, client, records):
+    whatif = {'carbonData': records[2], 'fields': ['Diet']}
+    benchmark = {'carbonData': records[2], 'neighbours': 2}
+    (_, _, whatif_body), (_, _, benchmark_body) = call(('POST', '/whatif', whatif), ('POST', '/benchmark', benchmark))
+    assert whatif_body == client.post('/whatif', json=whatif).get_json()
+    assert benchmark_body == client.post('/benchmark', json=benchmark).get_json()
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/predict', {'Diet': 'carnivore'}),
+    ('/insights', {'carbonData': {'Diet': 'carnivore'}}),
+    ('/whatif', {'carbonData': {'Diet': 'carnivore'}}),
+    ('/benchmark', {'carbonData': {'Diet': 'carnivore'}}),
+])
+def test_invalid_answers_return_the_fields_map(call, path, body):
+    status, _, response = call(('POST', path, body))[0]
+    assert status == 400
+    assert response['fields'] == {'Diet': "unknown answer 'carnivore'"}
+
+
+def test_batch_names_the_rejected_record(call, records):
+    status, _, body = call(('POST', '/predict/batch', [records[0], {'Sex': 1}]))[0]
+    assert status == 400
+    assert (body['record'], body['fields']) == (1, {'Sex': 'expected a string'})
+
+
+def test_error_responses(call):
+    (not_found, _, _), (bad_version, _, version_body), (bad_shape, _, _) = call(
+        ('GET', '/nope'), ('POST', '/predict', {}, [('X-Model-Version', 'nope')]), ('POST', '/predict', [1, 2]))
+    assert not_found == 404
+    assert bad_version == 404 and version_body['versions'] == ['bundled']
+    assert bad_shape == 400
+
+
+def test_shap_summary_etag(call):
+    status, headers, _ = call(('GET', '/shap/summary'))[0]
+    assert status == 200
+    status, _, body = call(('GET', '/shap/summary', None, [('If-None-Match', headers['etag'])]))[0]
+    assert (status, body) == (304, b'')
+
+
+def test_health_and_ready(call):
+    (health_status, _, health), (ready_status, _, ready) = call(('GET', '/health'), ('GET', '/ready'))
+    assert health_status == 200 and health['model_loaded'] is True
+    assert ready_status == 200 and ready['state'] == 'ready'
@@ -0,0 +1,52 @@
+"""
+/predict and /insights answer exactly what the original app.py answered.
+
+baseline_responses.json holds the original app's responses for dataset rows
+and frontend-style variants (numbers as strings, stringified lists, partial and
+empty questionnaires). An empty 'Vehicle Type' is the one intended difference:
+it now encodes as the training fill value, covered in test_feature_schema.py.
+"""
+import math
+
+import pytest
+
+
+def assert_close(expected, actual, path='$'):
+    if isinstance(expected, float) or isinstance(actual, float):
+        assert math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-9), (path, expected, actual)
+    elif isinstance(expected, dict):
+        assert set(expected) == set(actual), (path, set(expected) ^ set(actual))
+        for key in expected:
+            assert_close(expected[key], actual[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), (path, expected, actual)
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            assert_close(a, b, f'{path}[{i}]')
+    else:
+        assert expected == actual, (path, expected, actual)
+
+
+@pytest.mark.parametrize('i', range(16))
+def test_predict_matches_baseline(client, baseline, i):
+    response = client.post('/predict', json=baseline['records'][i])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body.pop('resultToken')
+    assert_close(baseline['predict'][i], body)
+
+
+@pytest.mark.parametrize('i', range(16))
+def test_insights_matches_baseline(client, baseline, i):
+    response = client.post('/insights', json={'carbonData': baseline['records'][i]})
+    assert response.status_code == 200
+    assert_close(baseline['insights'][i], response.get_json())
+
+
+def test_batch_matches_single_predictions(client, baseline):
+    response = client.post('/predict/batch', json={'records': baseline['records']})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == len(baseline['records'])
+    for expected, result in zip(baseline['predict'], body['results']):
+        result.pop('resultToken', None)
+        assert_close(expected, result)
@@ -0,0 +1,86 @@
+"""
+MicroBatcher: batching concurrent submits, errors, and draining on close.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def doubler(calls):
+    def handler(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+    return handler
+
+
+def test_concurrent_submits_share_a_batch():
+    calls = []
+
+    async def main():
+        batcher = MicroBatcher(doubler(calls), max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+        await batcher.close()
+        return results, batcher.stats()
+
+    results, stats = run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert calls == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert (stats['batches'], stats['items'], stats['largest_batch']) == (3, 10, 4)
+
+
+def test_handler_errors_reach_every_caller_of_the_batch():
+    def handler(items):
+        raise ValueError('model failed')
+
+    async def main():
+        batcher = MicroBatcher(handler, max_wait_ms=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        await batcher.close()
+        return results
+
+    assert [str(e) for e in run(main())] == ['model failed', 'model failed']
+
+
+def test_close_scores_what_is_queued():
+    calls = []
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(5)
+        return doubler(calls)(items)
+
+    async def main():
+        batcher = MicroBatcher(slow, max_batch_size=2, max_wait_ms=1000)
+        tasks = [asyncio.ensure_future(batcher.submit(i)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        closing = asyncio.ensure_future(batcher.close())
+        await asyncio.sleep(0.01)
+        release.set()
+        await closing
+        with pytest.raises(RuntimeError, match='closed'):
+            await batcher.submit(5)
+        return [task.result() for task in tasks]
+
+    assert run(main()) == [0, 2, 4, 6, 8]
+    assert sum(len(call) for call in calls) == 5
+
+
+def test_close_leaves_a_shared_executor_running():
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def main():
+        batcher = MicroBatcher(doubler([]), executor=executor)
+        assert await batcher.submit(1) == 2
+        await batcher.close()
+
+    run(main())
+    assert executor.submit(lambda: 'still running').result() == 'still running'
+    executor.shutdown()
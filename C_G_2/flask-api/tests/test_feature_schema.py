@@ -0,0 +1,131 @@
+"""
+FeatureSchema validation and encoding, and the 400 responses built from it.
+"""
+import json
+
+import pytest
+
+from feature_schema import (
+    DEFAULT_SCHEMA, FEATURE_SCHEMA_PATH, SCHEMA_FORMAT_VERSION, FeatureSchema, SchemaValidationError, model_schema
+)
+
+
+def column(name):
+    return DEFAULT_SCHEMA.columns.index(name)
+
+
+def test_validate_reports_every_bad_field():
+    errors = DEFAULT_SCHEMA.validate({
+        'Diet': 'carnivore',
+        'Sex': 3,
+        'Monthly Grocery Bill': 'abc',
+        'Vehicle Monthly Distance Km': -1,
+        'How Long TV PC Daily Hour': float('nan'),
+        'Recycling': ['Metal', 'Wood'],
+    })
+    assert errors == {
+        'Diet': "unknown answer 'carnivore'",
+        'Sex': 'expected a string',
+        'Monthly Grocery Bill': 'expected a number',
+        'Vehicle Monthly Distance Km': 'must be at least 0',
+        'How Long TV PC Daily Hour': 'expected a finite number',
+        'Recycling': "unknown answer 'Wood'",
+    }
+
+
+def test_missing_and_unanswered_fields_pass(records):
+    assert DEFAULT_SCHEMA.validate({}) == {}
+    assert DEFAULT_SCHEMA.validate({'Diet': '', 'Monthly Grocery Bill': ' ', 'Recycling': []}) == {}
+    for record in records:
+        assert DEFAULT_SCHEMA.validate(record) == {}
+
+
+def test_check_rejects_non_objects():
+    with pytest.raises(SchemaValidationError) as raised:
+        DEFAULT_SCHEMA.check(['Diet', 'vegan'])
+    assert raised.value.errors == {'': 'expected a JSON object'}
+
+
+def test_encode_fills_defaults_in_model_order():
+    row = DEFAULT_SCHEMA.encode({'Diet': 'vegan', 'Monthly Grocery Bill': '120', 'Recycling': ['Metal']})
+    assert len(row) == len(DEFAULT_SCHEMA.columns)
+    assert row[column('Diet')] == 'vegan'
+    assert row[column('Sex')] == 'None'
+    assert row[column('Monthly Grocery Bill')] == 120.0
+    assert row[column('Waste Bag Weekly Count')] == 0
+    assert row[column('Recycling')] == "['Metal']"
+    # The frontend's lists and the dataset's stringified lists encode the same way
+    assert DEFAULT_SCHEMA.encode({'Recycling': "['Metal']"}) == DEFAULT_SCHEMA.encode({'Recycling': ['Metal']})
+
+
+def test_empty_vehicle_type_encodes_as_training_fill():
+    assert '' not in DEFAULT_SCHEMA.allowed_values['Vehicle Type']
+    fill = DEFAULT_SCHEMA.fills['Vehicle Type']
+    assert fill in DEFAULT_SCHEMA.allowed_values['Vehicle Type']
+    assert DEFAULT_SCHEMA.encode({'Vehicle Type': ''})[column('Vehicle Type')] == fill
+    # A missing answer still gets the default
+    assert DEFAULT_SCHEMA.encode({})[column('Vehicle Type')] == 'None'
+
+
+def test_empty_vehicle_type_predicts_like_the_fill(client, records):
+    record = dict(records[0], **{'Vehicle Type': ''})
+    empty = client.post('/predict', json=record).get_json()
+    filled = client.post('/predict', json=dict(record, **{'Vehicle Type': 'lpg'})).get_json()
+    assert empty['prediction'] == filled['prediction']
+
+
+def test_schema_file_round_trips():
+    with open(FEATURE_SCHEMA_PATH) as f:
+        document = json.load(f)
+    assert DEFAULT_SCHEMA.to_dict() == document
+    assert FeatureSchema.from_dict(document).to_dict() == document
+
+
+def test_newer_schema_format_is_refused():
+    document = dict(DEFAULT_SCHEMA.to_dict(), format_version=SCHEMA_FORMAT_VERSION + 1)
+    with pytest.raises(ValueError, match='newer'):
+        FeatureSchema.from_dict(document)
+
+
+def test_model_schema_reads_the_file_next_to_the_model(tmp_path):
+    model_path = tmp_path / 'catboost_model.pkl'
+    assert model_schema(model_path) is DEFAULT_SCHEMA
+
+    (tmp_path / 'feature_schema.json').write_text(json.dumps(DEFAULT_SCHEMA.to_dict()))
+    assert model_schema(model_path) is DEFAULT_SCHEMA
+
+    document = DEFAULT_SCHEMA.to_dict()
+    diet = next(c for c in document['columns'] if c['name'] == 'Diet')
+    diet['values'] = [value for value in diet['values'] if value != 'vegan']
+    (tmp_path / 'feature_schema.json').write_text(json.dumps(document))
+    schema = model_schema(model_path)
+    assert schema is not DEFAULT_SCHEMA
+    assert schema.validate({'Diet': 'vegan'}) == {'Diet': "unknown answer 'vegan'"}
+
+
+def test_predict_rejects_invalid_fields(client):
+    response = client.post('/predict', json={'Diet': 'carnivore', 'Monthly Grocery Bill': 'abc'})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['fields'] == {'Diet': "unknown answer 'carnivore'", 'Monthly Grocery Bill': 'expected a number'}
+    assert 'record' not in body
+
+
+def test_insights_rejects_invalid_fields(client):
+    response = client.post('/insights', json={'carbonData': {'Sex': 1}})
+    assert response.status_code == 400
+    assert response.get_json()['fields'] == {'Sex': 'expected a string'}
+
+
+def test_batch_names_the_rejected_record(client, records):
+    response = client.post('/predict/batch', json=[records[0], {'Diet': 'carnivore'}])
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['record'] == 1
+    assert body['fields'] == {'Diet': "unknown answer 'carnivore'"}
+
+
+def test_batch_shape_and_size_errors(client, app_module, monkeypatch):
+    assert client.post('/predict/batch', json={'records': 'nope'}).status_code == 400
+    monkeypatch.setattr(app_module, 'MAX_BATCH_SIZE', 2)
+    assert client.post('/predict/batch', json=[{}, {}, {}]).status_code == 413
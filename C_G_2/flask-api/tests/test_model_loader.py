@@ -0,0 +1,62 @@
+"""
+Background model loading, /ready vs /health, the 503 before the model is ready, and /metrics.
+"""
+import pytest
+
+from model_loader import ModelLoader
+
+
+def test_background_load_runs_warmups(app_module):
+    warmed = []
+    loader = ModelLoader(app_module.model_path, warmups=[warmed.append])
+    loader.start(mode='background')
+    assert loader.wait(timeout=120)
+    assert loader.status()['state'] == 'ready'
+    assert warmed == [loader.model]
+
+
+def test_missing_model_fails(tmp_path):
+    loader = ModelLoader(str(tmp_path / 'catboost_model.pkl'))
+    loader.start(mode='eager')
+    status = loader.status()
+    assert (status['ready'], status['state']) == (False, 'failed')
+    assert 'not found' in status['error']
+
+
+def test_ready_and_health(client):
+    ready = client.get('/ready')
+    assert ready.status_code == 200
+    assert ready.get_json()['state'] == 'ready'
+    health = client.get('/health').get_json()
+    assert health['status'] == 'healthy' and health['model_loaded'] is True
+    assert [version['version'] for version in health['models']['versions']] == ['bundled']
+
+
+@pytest.mark.parametrize('path', ['/predict', '/predict/batch', '/insights', '/whatif', '/benchmark'])
+def test_scoring_waits_for_the_model(client, app_module, monkeypatch, path):
+    monkeypatch.setattr(app_module, 'model_loader', ModelLoader(app_module.model_path))
+    response = client.post(path, json={})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['error'] == 'Model is still loading'
+    assert client.get('/ready').status_code == 503
+    assert client.get('/health').status_code == 200
+
+
+def test_failed_load_is_500(client, app_module, monkeypatch, tmp_path):
+    loader = ModelLoader(str(tmp_path / 'catboost_model.pkl'))
+    loader.start(mode='eager')
+    monkeypatch.setattr(app_module, 'model_loader', loader)
+    response = client.post('/predict', json={})
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Model not loaded'
+
+
+def test_metrics_count_requests(client):
+    client.post('/predict', json={})
+    client.post('/predict', json={'Diet': 'carnivore'})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'carbon_requests_total{endpoint="/predict",status="200"}' in text
+    assert 'carbon_requests_total{endpoint="/predict",status="400"}' in text
+    assert 'carbon_stage_seconds_count{stage="preprocess"}' in text
+    assert 'carbon_prediction_cache_hits_total{version="bundled"}' in text
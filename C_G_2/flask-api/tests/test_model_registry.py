@@ -0,0 +1,122 @@
+"""
+Model registry: loading version directories, hot-swapping a replaced model and
+per-request version selection with X-Model-Version.
+"""
+import os
+import shutil
+
+import pytest
+
+from feature_schema import DEFAULT_SCHEMA
+from model_registry import BUNDLED_VERSION, MODEL_FILE_NAME, ModelRegistry
+
+
+def schema_without_vegan():
+    document = DEFAULT_SCHEMA.to_dict()
+    diet = next(c for c in document['columns'] if c['name'] == 'Diet')
+    diet['values'] = [value for value in diet['values'] if value != 'vegan']
+    return document
+
+
+@pytest.fixture
+def registry(app_module, tmp_path):
+    def make(**settings):
+        return ModelRegistry(app_module.build_version, app_module.model_path, models_dir=str(tmp_path / 'models'),
+                             poll_interval=0, **settings)
+    return make
+
+
+def test_scan_loads_the_newest_directories(registry, version_dir):
+    version_dir('20260101-000000')
+    version_dir('20260201-000000')
+    version_dir('.20260301-000000.tmp')
+    models = registry(keep=1, default_version='latest')
+    models.scan()
+    assert sorted(models.versions) == ['20260201-000000']
+    assert models.get().name == '20260201-000000'
+
+    version_dir('20260301-000000')
+    models.scan()
+    assert sorted(models.versions) == ['20260301-000000']
+    assert models.get().name == '20260301-000000'
+
+
+def test_replaced_model_file_is_swapped_in(app_module, registry, tmp_path):
+    bundled_path = tmp_path / MODEL_FILE_NAME
+    shutil.copyfile(app_module.model_path, bundled_path)
+    models = registry()
+    models.bundled_path = str(bundled_path)
+    old = models.load(BUNDLED_VERSION, str(bundled_path))
+    assert models.get() is old
+
+    models.scan()
+    assert models.get() is old
+
+    # Rewritten in place, as a deploy would: a new fingerprint
+    stat = os.stat(bundled_path)
+    bundled_path.write_bytes(bundled_path.read_bytes())
+    os.utime(bundled_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    models.scan()
+    new = models.get()
+    assert new is not old and new.name == BUNDLED_VERSION
+    # Requests that already hold the old version finish on it
+    record = {'Diet': 'vegan'}
+    assert old.pipeline.score([record])[0]['prediction'] == new.pipeline.score([record])[0]['prediction']
+
+
+def test_broken_version_is_not_retried_until_it_changes(registry, version_dir, monkeypatch):
+    directory = version_dir('20260101-000000')
+    (directory / MODEL_FILE_NAME).write_bytes(b'not a model')
+    models = registry()
+    models.scan()
+    assert models.versions == {}
+
+    loads = []
+    monkeypatch.setattr(models, 'load', lambda name, path: loads.append(name))
+    models.scan()
+    assert loads == []
+    (directory / MODEL_FILE_NAME).write_bytes(b'still not a model')
+    models.scan()
+    assert loads == ['20260101-000000']
+
+
+def test_version_keeps_its_own_schema(app_module, registry, version_dir):
+    version_dir('20260101-000000', DEFAULT_SCHEMA.to_dict())
+    version_dir('20260201-000000', schema_without_vegan())
+    models = registry(keep=2)
+    models.scan()
+    assert models.get('20260101-000000').pipeline.schema is DEFAULT_SCHEMA
+    schema = models.get('20260201-000000').pipeline.schema
+    assert 'vegan' not in schema.allowed_values['Diet']
+    # Versions with the same schema share the reference profiles
+    bundled = app_module.model_registry.get(BUNDLED_VERSION)
+    assert models.get('20260101-000000').population.profiles is bundled.population.profiles
+    assert models.get('20260201-000000').population.profiles is not bundled.population.profiles
+
+
+def test_requests_pick_a_version_by_header(client, restore_registry, version_dir):
+    directory = version_dir('20260101-000000', schema_without_vegan())
+    restore_registry.load('20260101-000000', str(directory / MODEL_FILE_NAME))
+    assert restore_registry.get().name == BUNDLED_VERSION
+
+    response = client.post('/predict', json={'Diet': 'vegan'})
+    assert response.status_code == 200
+    assert response.headers['X-Model-Version'] == BUNDLED_VERSION
+
+    headers = {'X-Model-Version': '20260101-000000'}
+    response = client.post('/predict', json={'Diet': 'vegetarian'}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers['X-Model-Version'] == '20260101-000000'
+    for path, body in [('/predict', {'Diet': 'vegan'}), ('/insights', {'carbonData': {'Diet': 'vegan'}}),
+                       ('/whatif', {'carbonData': {'Diet': 'vegan'}}), ('/benchmark', {'carbonData': {'Diet': 'vegan'}})]:
+        response = client.post(path, json=body, headers=headers)
+        assert response.status_code == 400, path
+        assert response.get_json()['fields'] == {'Diet': "unknown answer 'vegan'"}
+    changes = client.post('/whatif', json={'carbonData': {}, 'fields': ['Diet']}, headers=headers).get_json()['changes']
+    assert 'vegan' not in [change['value'] for change in changes]
+
+
+def test_unknown_version_is_404(client):
+    response = client.post('/predict', json={}, headers={'X-Model-Version': 'nope'})
+    assert response.status_code == 404
+    assert response.get_json() == {'error': "Unknown model version 'nope'", 'versions': [BUNDLED_VERSION]}
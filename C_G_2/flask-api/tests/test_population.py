@@ -0,0 +1,118 @@
+"""
+Population benchmarks: percentile and median maths, the k-NN search, and /benchmark.
+"""
+import numpy as np
+import pytest
+
+from population import Distribution, percentile_rank, sorted_median
+
+
+@pytest.mark.parametrize('values, value, expected', [
+    ([1, 2, 3, 4], 0, 0.0),
+    ([1, 2, 3, 4], 5, 100.0),
+    ([1, 2, 3, 4], 2.5, 50.0),
+    # Ties count as half below
+    ([1, 2, 3, 4], 2, 37.5),
+    ([2, 2, 2, 2], 2, 50.0),
+    ([], 1, None),
+])
+def test_percentile_rank(values, value, expected):
+    assert percentile_rank(np.array(values, dtype=float), value) == expected
+
+
+def test_percentile_rank_matches_a_direct_count():
+    rng = np.random.default_rng(0)
+    values = np.sort(rng.integers(0, 20, size=500).astype(float))
+    for value in (-1.0, 0.0, 7.0, 7.5, 19.0, 25.0):
+        below = np.sum(values < value)
+        ties = np.sum(values == value)
+        assert percentile_rank(values, value) == pytest.approx(100.0 * (below + ties / 2) / len(values))
+
+
+@pytest.mark.parametrize('values', [[5.0], [1.0, 3.0], [1.0, 2.0, 10.0], list(np.linspace(0, 1, 101))])
+def test_sorted_median_matches_numpy(values):
+    assert sorted_median(np.array(values)) == pytest.approx(float(np.median(values)))
+
+
+def test_sorted_median_of_nothing():
+    assert sorted_median(np.array([])) is None
+
+
+def test_distribution_compares_with_predictions_and_measurements():
+    distribution = Distribution(np.array([3.0, 1.0, 2.0]), np.array([10.0, 30.0, 20.0]))
+    assert distribution.compare(2.0) == {
+        'profiles': 3,
+        'median': 2.0,
+        'measured_median': 20.0,
+        'percentile': 50.0,
+        'measured_percentile': 0.0,
+    }
+
+
+@pytest.fixture
+def population(app_module):
+    population = app_module.model_registry.get().population
+    assert population is not None
+    return population
+
+
+def test_nearest_matches_brute_force(population, records):
+    profiles = population.profiles
+    row = profiles.schema.encode(records[0])
+    indices, distances = profiles.nearest(row, 10)
+    query = profiles.vectorizer.transform(row).astype(float)
+    brute = np.sqrt(((profiles.matrix.astype(float) - query) ** 2).sum(axis=1))
+    assert np.allclose(distances, np.sort(brute)[:10], atol=1e-4)
+    assert np.allclose(brute[indices], distances, atol=1e-4)
+
+
+def test_benchmark_ranks_the_prediction(client, population, records):
+    record = records[0]
+    prediction = client.post('/predict', json=record).get_json()['prediction']
+    response = client.post('/benchmark', json={'carbonData': record, 'neighbours': 3})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['prediction'] == pytest.approx(prediction)
+    assert body['population']['profiles'] == len(population.profiles)
+    # Ranked as predicted by /benchmark: the record is itself a reference profile, so
+    # the last-digit difference from /predict's SHAP-sum prediction can decide a tie
+    assert body['population']['percentile'] == percentile_rank(population.overall.predictions, body['prediction'])
+    assert body['slices']['Diet']['answer'] == record['Diet']
+    assert len(body['similar']) == 3
+    distances = [similar['distance'] for similar in body['similar']]
+    assert distances == sorted(distances)
+
+
+def test_benchmark_reuses_a_result_token(client, app_module, records, monkeypatch):
+    token = client.post('/predict', json=records[1]).get_json()['resultToken']
+    pipeline = app_module.model_registry.get().pipeline
+
+    def no_prediction(rows):
+        raise AssertionError('predicted again')
+    monkeypatch.setattr(pipeline, 'predict_rows', no_prediction)
+    response = client.post('/benchmark', json={'carbonData': records[1], 'resultToken': token, 'neighbours': 0})
+    assert response.status_code == 200
+    assert response.get_json()['similar'] == []
+
+
+def test_unanswered_slice_has_no_group(client):
+    body = client.post('/benchmark', json={'carbonData': {}}).get_json()
+    assert body['slices']['Diet'] is None
+
+
+@pytest.mark.parametrize('payload', [{'neighbours': 3}, {'carbonData': {}, 'neighbours': 51},
+                                     {'carbonData': {}, 'neighbours': True}])
+def test_malformed_bodies_are_400(client, payload):
+    assert client.post('/benchmark', json=payload).status_code == 400
+
+
+def test_invalid_answers_return_the_fields_map(client):
+    response = client.post('/benchmark', json={'carbonData': {'Diet': 'carnivore'}})
+    assert response.status_code == 400
+    assert response.get_json()['fields'] == {'Diet': "unknown answer 'carnivore'"}
+
+
+def test_benchmark_without_population_is_503(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.model_registry.get(), 'population', None)
+    response = client.post('/benchmark', json={'carbonData': {}})
+    assert response.status_code == 503
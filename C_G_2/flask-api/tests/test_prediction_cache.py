@@ -0,0 +1,113 @@
+"""
+PredictionCache: LRU and expiry, counters, and invalidation when the model file changes.
+"""
+import threading
+
+import pytest
+
+import prediction_cache
+from prediction_cache import LocalLRUBackend, PredictionCache, SharedBackend, canonical_key, file_fingerprint
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A monotonic clock the test moves by hand
+    """
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_lru_evicts_the_least_recently_used():
+    backend = LocalLRUBackend(max_size=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    assert backend.get('a') == 1
+    backend.set('c', 3, ttl=60)
+    assert backend.get('b') is None
+    assert (backend.get('a'), backend.get('c')) == (1, 3)
+    assert backend.evictions == 1
+    assert backend.size() == 2
+
+
+def test_entries_expire(clock):
+    backend = LocalLRUBackend()
+    backend.set('a', 1, ttl=10)
+    clock[0] += 9
+    assert backend.get('a') == 1
+    clock[0] += 2
+    assert backend.get('a') is None
+    assert backend.size() == 0
+
+
+def test_hits_and_misses_are_exact_under_concurrency():
+    cache = PredictionCache(LocalLRUBackend(16))
+    cache.set('hit', {'prediction': 1.0})
+
+    def lookups():
+        for i in range(5000):
+            cache.get('hit' if i % 2 else 'miss')
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (20000, 20000, 0.5)
+
+
+def test_shared_backend_read_failure_is_a_miss():
+    class DownClient:
+        def get(self, key):
+            raise ConnectionError('redis is down')
+
+    cache = PredictionCache(SharedBackend(DownClient()))
+    assert cache.get('key') is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_fingerprint_change_clears_the_cache(clock):
+    fingerprint = ['v1']
+    cache = PredictionCache(LocalLRUBackend(), fingerprint=lambda: fingerprint[0], check_interval=1.0)
+    row = ['vegan', 1.0]
+    key = cache.key(row)
+    cache.set(key, {'prediction': 1.0})
+    assert cache.get(key) == {'prediction': 1.0}
+
+    fingerprint[0] = 'v2'
+    # Not noticed until the check interval has passed
+    assert cache.key(row) == key
+    clock[0] += 1.0
+    new_key = cache.key(row)
+    assert new_key != key
+    assert cache.get(key) is None
+    assert cache.get(new_key) is None
+    assert cache.backend.size() == 0
+
+
+def test_keys_depend_on_row_and_extras():
+    assert canonical_key(['a', 1.0], 'fp') == canonical_key(['a', 1.0], 'fp')
+    assert canonical_key(['a', 1.0], 'fp') != canonical_key(['a', 2.0], 'fp')
+    assert canonical_key(['a', 1.0], 'fp') != canonical_key(['a', 1.0], 'fp2')
+    assert canonical_key(['a', 1.0], 'fp', 'native') != canonical_key(['a', 1.0], 'fp', 'kernel')
+
+
+def test_file_fingerprint_changes_with_the_file(tmp_path):
+    path = tmp_path / 'catboost_model.pkl'
+    assert file_fingerprint(path) == 'missing'
+    path.write_bytes(b'one')
+    first = file_fingerprint(path)
+    path.write_bytes(b'three')
+    assert file_fingerprint(path) not in (first, 'missing')
+
+
+def test_repeated_predict_is_served_from_the_cache(client, app_module, records):
+    cache = app_module.model_registry.get().pipeline.prediction_cache
+    record = dict(records[2], **{'Monthly Grocery Bill': 123.25})
+    first = client.post('/predict', json=record).get_json()
+    hits = cache.hits
+    second = client.post('/predict', json=record).get_json()
+    assert cache.hits == hits + 1
+    assert first == second
@@ -0,0 +1,37 @@
+"""
+RecommendationEngine built from recommendations.json.
+"""
+import json
+
+from recommendations import RECOMMENDATIONS_PATH, RecommendationEngine
+
+
+def test_matches_the_original_recommendations(baseline):
+    engine = RecommendationEngine.from_file()
+    for record, response in zip(baseline['records'], baseline['predict']):
+        assert engine.recommend(record, response['category_breakdown'],
+                                response['top_individual_features']) == response['recommendations']
+
+
+def test_batch_matches_single_calls(baseline):
+    engine = RecommendationEngine.from_file()
+    breakdowns = [response['category_breakdown'] for response in baseline['predict']]
+    top_features = [response['top_individual_features'] for response in baseline['predict']]
+    assert engine.recommend_batch(baseline['records'], breakdowns, top_features) == [
+        engine.recommend(*args) for args in zip(baseline['records'], breakdowns, top_features)
+    ]
+    assert engine.recommend_batch([], [], []) == []
+
+
+def test_config_edits_take_effect_and_change_the_version():
+    with open(RECOMMENDATIONS_PATH, encoding='utf-8') as f:
+        config = json.load(f)
+    engine = RecommendationEngine(config)
+    config['limits'] = dict(config.get('limits', {}), max_recommendations=1)
+    edited = RecommendationEngine(config)
+    assert edited.version != engine.version
+
+    breakdown = [{'name': 'Transportation', 'percentage': 60.0}, {'name': 'Home Energy', 'percentage': 30.0}]
+    data = {'Transport': 'private', 'Recycling': []}
+    assert len(engine.recommend(data, breakdown, [])) > 1
+    assert len(edited.recommend(data, breakdown, [])) == 1
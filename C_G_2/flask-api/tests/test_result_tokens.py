@@ -0,0 +1,56 @@
+"""
+Result tokens: /insights reuses a /predict result instead of scoring again, until it expires.
+"""
+import pytest
+
+import prediction_cache
+from scoring import RESULT_TOKEN_TTL
+
+
+@pytest.fixture
+def pipeline(app_module):
+    return app_module.model_registry.get().pipeline
+
+
+def test_insights_reuses_the_predict_result(client, pipeline, records, monkeypatch):
+    predicted = client.post('/predict', json=records[3]).get_json()
+    token = predicted.pop('resultToken')
+
+    def no_scoring(*args, **kwargs):
+        raise AssertionError('scored again')
+    monkeypatch.setattr(pipeline, 'score_with_tokens', no_scoring)
+
+    for payload in ({'resultToken': token}, {'resultToken': token, 'carbonData': records[3]}):
+        response = client.post('/insights', json=payload)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['carbonEmission'] == predicted['prediction']
+        assert body['insights']['recommendations'] == predicted['recommendations']
+
+
+def test_token_is_the_same_for_the_same_answers(client, records):
+    first = client.post('/predict', json=records[4]).get_json()['resultToken']
+    assert client.post('/predict', json=dict(records[4])).get_json()['resultToken'] == first
+    assert client.post('/predict', json=records[5]).get_json()['resultToken'] != first
+
+
+def test_unknown_token_without_data_is_404(client):
+    response = client.post('/insights', json={'resultToken': 'not-a-token'})
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Unknown or expired result token'}
+
+
+def test_token_of_other_answers_is_ignored(client, records):
+    token = client.post('/predict', json=records[6]).get_json()['resultToken']
+    expected = client.post('/insights', json={'carbonData': records[7]}).get_json()
+    response = client.post('/insights', json={'resultToken': token, 'carbonData': records[7]})
+    assert response.get_json() == expected
+
+
+def test_token_expires(client, records, monkeypatch):
+    token = client.post('/predict', json=records[8]).get_json()['resultToken']
+    assert client.post('/insights', json={'resultToken': token}).status_code == 200
+
+    now = prediction_cache.time.monotonic()
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now + RESULT_TOKEN_TTL + 1)
+    assert client.post('/insights', json={'resultToken': token}).status_code == 404
@@ -0,0 +1,76 @@
+"""
+Precomputed SHAP summary: the aggregates and GET /shap/summary with ETag revalidation.
+"""
+import numpy as np
+import pytest
+
+from app import etag_matches
+from categories import get_category_aggregator
+from feature_schema import DEFAULT_SCHEMA
+from shap_summary import aggregate
+
+
+@pytest.mark.parametrize('header, matches', [
+    (None, False),
+    ('', False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('*', True),
+    ('"other"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches('"abc"', header) is matches
+
+
+def test_aggregate_shares():
+    aggregator = get_category_aggregator(tuple(DEFAULT_SCHEMA.columns))
+    contributions = np.zeros((2, len(DEFAULT_SCHEMA.columns)))
+    diet, distance = DEFAULT_SCHEMA.columns.index('Diet'), DEFAULT_SCHEMA.columns.index('Vehicle Monthly Distance Km')
+    contributions[0, [diet, distance]] = [1.0, -4.0]
+    contributions[1, diet] = 2.0
+    result = aggregate(contributions, np.array([10.0, 20.0]), aggregator)
+
+    assert result['rows'] == 2
+    assert result['mean_prediction'] == 15.0
+    features = {f['feature']: f for f in result['features']}
+    assert features['Diet']['mean_abs_shap'] == 1.5
+    assert features['Vehicle Monthly Distance Km']['mean_shap'] == -2.0
+    # Row 1: Diet 20%, distance 80%; row 2: Diet 100%
+    assert features['Diet']['share'] == 60.0
+    assert features['Vehicle Monthly Distance Km']['share'] == 40.0
+    assert sum(c['share'] for c in result['categories']) == pytest.approx(100.0)
+    assert result['features'][0]['feature'] == 'Vehicle Monthly Distance Km'
+
+
+def test_summary_is_served_with_an_etag(client):
+    response = client.get('/shap/summary')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Vary'] == 'X-Model-Version'
+    assert 'max-age=' in response.headers['Cache-Control']
+    body = response.get_json()
+    assert body['overall']['rows'] == 10000
+    assert body['features'] == DEFAULT_SCHEMA.columns
+    assert sum(c['share'] for c in body['overall']['categories']) == pytest.approx(100.0, abs=0.05)
+
+    revalidated = client.get('/shap/summary', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+
+    assert client.get('/shap/summary', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_summary_of_another_model_is_not_served(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'model_guid', lambda model: 'another-model')
+    response = client.get('/shap/summary')
+    assert response.status_code == 404
+    assert 'another model' in response.get_json()['error']
+
+
+def test_missing_summary_is_404(client, app_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module.model_registry.get(), 'path', str(tmp_path / 'catboost_model.pkl'))
+    response = client.get('/shap/summary')
+    assert response.status_code == 404
+    assert 'run shap_summary.py' in response.get_json()['error']
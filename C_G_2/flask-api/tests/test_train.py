@@ -0,0 +1,33 @@
+"""
+Training data preparation and version directories.
+"""
+import json
+import os
+
+from feature_schema import DEFAULT_SCHEMA, SCHEMA_FILE_NAME
+from train import load_training_data, write_artifact
+
+
+def test_training_data_is_encoded_like_requests():
+    features, target = load_training_data()
+    assert list(features.columns) == DEFAULT_SCHEMA.columns
+    assert len(features) == len(target)
+    # People without a car get the schema's fill, as an empty answer does at request time
+    vehicle_types = set(features['Vehicle Type'])
+    assert '' not in vehicle_types and DEFAULT_SCHEMA.fills['Vehicle Type'] in vehicle_types
+    assert not features.isna().any().any()
+    assert features['Recycling'].iloc[0] == DEFAULT_SCHEMA.encode({'Recycling': features['Recycling'].iloc[0]})[
+        DEFAULT_SCHEMA.columns.index('Recycling')]
+
+
+def test_write_artifact_publishes_a_complete_directory(tmp_path):
+    metrics = {'r2': 0.9, 'timings': {'fit': 1.0}}
+    final_dir = write_artifact(str(tmp_path), '20260101-000000', {'model': 'stand-in'},
+                               DEFAULT_SCHEMA.to_dict(), metrics, started=0.0)
+    assert os.listdir(tmp_path) == ['20260101-000000']
+    assert sorted(os.listdir(final_dir)) == sorted(['catboost_model.pkl', 'metrics.json', SCHEMA_FILE_NAME])
+    with open(os.path.join(final_dir, 'metrics.json')) as f:
+        written = json.load(f)
+    assert set(written['timings']) == {'fit', 'save', 'total'}
+    with open(os.path.join(final_dir, SCHEMA_FILE_NAME)) as f:
+        assert json.load(f) == DEFAULT_SCHEMA.to_dict()
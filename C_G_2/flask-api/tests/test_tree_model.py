@@ -0,0 +1,59 @@
+"""
+The NumPy tree export predicts what CatBoost predicts.
+"""
+import numpy as np
+import pytest
+
+from feature_schema import DEFAULT_SCHEMA
+from tree_model import DEFAULT_TREES_PATH, ObliviousTreeModel, export_model, load_dataset_rows, matches_validation
+
+
+@pytest.fixture(scope='module')
+def model(app_module):
+    return app_module.model_registry.get().model
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return load_dataset_rows(limit=2000)
+
+
+def assert_same_predictions(tree_model, model, rows):
+    expected = model.predict(DEFAULT_SCHEMA.to_pool(rows))
+    assert np.allclose(tree_model.predict(rows), expected, rtol=0, atol=1e-6 * max(1.0, abs(tree_model.bias)))
+
+
+def test_bundled_export_matches_the_model(model, rows):
+    tree_model = ObliviousTreeModel.load(DEFAULT_TREES_PATH)
+    assert matches_validation(tree_model, model)
+    assert_same_predictions(tree_model, model, rows)
+
+
+def test_fresh_export_matches_the_model(model, rows, tmp_path):
+    export_model(model, tmp_path / 'trees', rows[:20])
+    tree_model = ObliviousTreeModel.load(tmp_path / 'trees', mmap=False)
+    assert matches_validation(tree_model)
+    assert_same_predictions(tree_model, model, rows)
+
+
+def test_unseen_and_default_answers(model):
+    rows = DEFAULT_SCHEMA.encode_many([
+        {},
+        {'Diet': 'vegan', 'Vehicle Type': 'unknown-fuel', 'Recycling': ['Metal', 'Glass']},
+        {'Monthly Grocery Bill': '1e6', 'Vehicle Monthly Distance Km': 'abc'},
+    ])
+    assert_same_predictions(ObliviousTreeModel.load(DEFAULT_TREES_PATH), model, rows)
+
+
+def test_pipeline_predicts_with_the_export(app_module, model, rows, monkeypatch):
+    pipeline = app_module.model_registry.get().pipeline
+    expected = pipeline.predict_rows(rows[:200])
+    monkeypatch.setattr(pipeline, 'tree_model', ObliviousTreeModel.load(DEFAULT_TREES_PATH))
+    assert np.allclose(pipeline.predict_rows(rows[:200]), expected, rtol=0, atol=1e-6)
+
+
+def test_export_of_another_model_is_rejected(model):
+    tree_model = ObliviousTreeModel.load(DEFAULT_TREES_PATH)
+    tree_model.meta = dict(tree_model.meta, validation_predictions=[
+        p + 1 for p in tree_model.meta['validation_predictions']])
+    assert not matches_validation(tree_model)
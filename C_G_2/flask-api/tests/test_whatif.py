@@ -0,0 +1,73 @@
+"""
+/whatif: prediction deltas for single-field changes, scored as one batch.
+"""
+import pytest
+
+from feature_schema import DEFAULT_SCHEMA
+
+
+def predict(client, record):
+    return client.post('/predict', json=record).get_json()['prediction']
+
+
+def test_every_alternative_answer_is_tried(client, records):
+    record = records[0]
+    response = client.post('/whatif', json={'carbonData': record})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['prediction'] == pytest.approx(predict(client, record))
+
+    row = DEFAULT_SCHEMA.encode(record)
+    expected = [
+        (field, value)
+        for field in DEFAULT_SCHEMA.columns if field in DEFAULT_SCHEMA.allowed_values
+        for value in DEFAULT_SCHEMA.allowed_values[field]
+        if value != row[DEFAULT_SCHEMA.columns.index(field)]
+    ]
+    assert [(c['field'], c['value']) for c in body['changes']] == expected
+    assert '' not in [c['value'] for c in body['changes'] if c['field'] == 'Vehicle Type']
+
+
+def test_deltas_match_separate_predictions(client, records):
+    record = records[1]
+    changes = [{'field': 'Diet', 'value': 'vegan'}, {'field': 'Vehicle Monthly Distance Km', 'value': 0}]
+    body = client.post('/whatif', json={'carbonData': record, 'changes': changes}).get_json()
+    assert [(c['field'], c['value']) for c in body['changes']] == [('Diet', 'vegan'), ('Vehicle Monthly Distance Km', 0)]
+    for change, result in zip(changes, body['changes']):
+        changed = predict(client, dict(record, **{change['field']: change['value']}))
+        assert result['prediction'] == pytest.approx(changed)
+        assert result['delta'] == pytest.approx(changed - body['prediction'])
+
+
+def test_fields_limit_the_alternatives(client, records):
+    body = client.post('/whatif', json={'carbonData': records[2], 'fields': ['Diet']}).get_json()
+    assert {c['field'] for c in body['changes']} == {'Diet'}
+    assert records[2]['Diet'] not in [c['value'] for c in body['changes']]
+
+
+def test_repeated_comparison_is_identical(client, records):
+    payload = {'carbonData': records[3], 'fields': ['Transport', 'Diet']}
+    assert client.post('/whatif', json=payload).get_json() == client.post('/whatif', json=payload).get_json()
+
+
+@pytest.mark.parametrize('payload, error', [
+    ({'changes': []}, 'Expected {"carbonData": {...}}'),
+    ({'carbonData': {}, 'changes': {'Diet': 'vegan'}}, 'Expected "changes": [{"field": ..., "value": ...}, ...]'),
+    ({'carbonData': {}, 'changes': [{'field': 'Shoe Size', 'value': 42}]}, "Unknown field 'Shoe Size'"),
+    ({'carbonData': {}, 'fields': 'Diet'}, 'Expected "fields": [field name, ...]'),
+    ({'carbonData': {}, 'fields': ['Monthly Grocery Bill']}, "No answer options for 'Monthly Grocery Bill'"),
+])
+def test_malformed_bodies_are_400(client, payload, error):
+    response = client.post('/whatif', json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_invalid_answers_return_the_fields_map(client):
+    response = client.post('/whatif', json={'carbonData': {'Diet': 'carnivore'}})
+    assert response.status_code == 400
+    assert response.get_json()['fields'] == {'Diet': "unknown answer 'carnivore'"}
+
+    response = client.post('/whatif', json={'carbonData': {}, 'changes': [{'field': 'Diet', 'value': 'carnivore'}]})
+    assert response.status_code == 400
+    assert response.get_json()['fields'] == {'Diet': "unknown answer 'carnivore'"}
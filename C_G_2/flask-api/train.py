@@ -0,0 +1,401 @@
+"""
+Training pipeline for the CatBoost model, extracted from Model Training/C_G_catboost.ipynb.
+
+Reads the dataset with explicit dtypes, optionally searches hyperparameters on a
+process pool within a wall-clock budget, refits the best settings on the
+training split and writes a versioned artifact directory:
+
+    models/<version>/catboost_model.pkl     joblib-pickled CatBoostRegressor, as app.py loads it
+    models/<version>/feature_schema.json    the feature schema it was trained against
+    models/<version>/metrics.json           R², adjusted R² and MSE, search trials, timings
+
+Run from the flask-api directory:
+
+    python train.py                                     # the notebook's settings, no search
+    python train.py --search --budget 600 --workers 4   # search for at most ~10 minutes
+    python train.py --search --install                  # and serve the result (replaces
+                                                        # catboost_model.pkl and its tree export)
+
+A running API loads new version directories in the background and serves them
+to requests that ask for them with an X-Model-Version header (model_registry.py).
+
+Runs are repeatable: the train/test split, the search order and CatBoost's seed
+are fixed, and the search only ever looks at a validation part of the training
+split, so test metrics stay comparable between runs.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+import joblib
+import pandas as pd
+
+from feature_schema import (
+    CATEGORICAL_FEATURES, DEFAULT_SCHEMA, EXPECTED_COLUMNS, LIST_FEATURES, NUMERICAL_FEATURES, SCHEMA_FILE_NAME,
+    parse_list_value,
+)
+from tree_model import API_DIR, DATASET_PATH, DEFAULT_MODEL_PATH, DEFAULT_TREES_PATH, export_model, load_dataset_rows
+
+TARGET = 'CarbonEmission'
+
+# Trained versions are written here, one directory each
+DEFAULT_MODELS_DIR = os.path.join(API_DIR, 'models')
+
+# Explicit dtypes: answers stay strings, numbers are floats (as CatBoost sees them)
+DTYPES = {
+    **{col: 'str' for col in CATEGORICAL_FEATURES},
+    **{col: 'float64' for col in NUMERICAL_FEATURES},
+    TARGET: 'float64',
+}
+
+# The notebook's settings; the search starts from them and always tries them first
+BASE_PARAMS = {
+    'iterations': 500,
+    'learning_rate': 0.1,
+    'depth': 6,
+    'loss_function': 'RMSE',
+    'random_seed': 42,
+}
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
+# Share of the training split the search validates candidates on
+VALIDATION_SIZE = 0.2
+
+# Values tried for each searched parameter (the rest come from BASE_PARAMS)
+SEARCH_SPACE = {
+    'depth': [4, 6, 8],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'l2_leaf_reg': [1, 3, 10],
+}
+
+# Set in the parent before the pool forks (shared copy-on-write) or by the
+# initializer under the spawn start method
+_search_data = None
+_thread_count = -1
+
+
+def load_training_data(path=DATASET_PATH):
+    """
+    (features, target) from the dataset CSV, prepared the way the notebook did
+
+    Missing answers are filled with the column's "fill" from the feature schema,
+    else its most common answer (so the 'Vehicle Type' of people without a car
+    becomes the mode, 'lpg', as in the served model; requests leaving it empty
+    are encoded the same way), and list answers are parsed and re-written in their str() form so
+    they match what feature_schema.py encodes for a request.
+    """
+    frame = pd.read_csv(path, dtype=DTYPES, usecols=EXPECTED_COLUMNS + [TARGET])
+    features = frame[EXPECTED_COLUMNS].copy()
+    for col in CATEGORICAL_FEATURES:
+        fill = DEFAULT_SCHEMA.fills.get(col, features[col].mode()[0])
+        features[col] = features[col].fillna(fill).astype(object)
+    for col in LIST_FEATURES:
+        features[col] = [str(parse_list_value(value)) for value in features[col]]
+    return features, frame[TARGET]
+
+
+def dataset_digest(path):
+    """
+    sha256 of the dataset file, recorded so a version can be traced to its data
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_pool(features, target=None, thread_count=-1):
+    from catboost import Pool
+    return Pool(data=features, label=target, cat_features=DEFAULT_SCHEMA.categorical_features,
+                thread_count=thread_count)
+
+
+def regression_metrics(target, predictions, n_features):
+    """
+    R², adjusted R² and MSE, computed as in the notebook
+    """
+    from sklearn.metrics import mean_squared_error, r2_score
+    n = len(target)
+    r2 = r2_score(target, predictions)
+    return {
+        'rows': n,
+        'r2': float(r2),
+        'adjusted_r2': float(1 - (1 - r2) * (n - 1) / (n - n_features - 1)),
+        'mse': float(mean_squared_error(target, predictions)),
+    }
+
+
+def search_candidates(space=SEARCH_SPACE, base_params=BASE_PARAMS, seed=SPLIT_SEED):
+    """
+    Parameter sets to try: base_params first, then the rest of the grid in a fixed shuffled order
+    """
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    random.Random(seed).shuffle(grid)
+    candidates = [dict(base_params)]
+    for overrides in grid:
+        params = dict(base_params, **overrides)
+        if params not in candidates:
+            candidates.append(params)
+    return candidates
+
+
+class StopAtDeadline:
+    """
+    CatBoost callback that stops training once the wall-clock deadline (time.time()) passes
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def after_iteration(self, info):
+        return time.time() < self.deadline
+
+
+def _init_worker(search_data, thread_count):
+    global _search_data, _thread_count
+    if _search_data is None:
+        _search_data = search_data
+    _thread_count = thread_count
+
+
+def fit_candidate(params, deadline=None):
+    """
+    Fit one parameter set on the search's training part; returns its trial record
+    """
+    from catboost import CatBoostRegressor
+    train_features, train_target, valid_features, valid_target = _search_data
+    started = time.perf_counter()
+    # allow_writing_files=False: parallel trials would all write to ./catboost_info
+    model = CatBoostRegressor(**params, thread_count=_thread_count, verbose=False, allow_writing_files=False)
+    model.fit(make_pool(train_features, train_target, _thread_count),
+              callbacks=[StopAtDeadline(deadline)] if deadline is not None else None)
+    predictions = model.predict(make_pool(valid_features, thread_count=_thread_count))
+    return {
+        'params': params,
+        'validation': regression_metrics(valid_target, predictions, train_features.shape[1]),
+        'trees': int(model.tree_count_),
+        # False when the deadline cut training short
+        'completed': int(model.tree_count_) == params['iterations'],
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def search(train_features, train_target, budget=None, workers=None, candidates=None):
+    """
+    Try candidates (search_candidates() by default) on a process pool; returns the trial records
+
+    Each trial fits on part of the training data and is scored on the rest. No new
+    trial starts after budget seconds, and running ones stop at that point too.
+    """
+    global _search_data, _thread_count
+    from sklearn.model_selection import train_test_split
+    candidates = search_candidates() if candidates is None else candidates
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    # Workers split the cores between them instead of each using all of them
+    thread_count = -1 if workers == 1 else max(1, (os.cpu_count() or 1) // workers)
+    fit_features, valid_features, fit_target, valid_target = train_test_split(
+        train_features, train_target, test_size=VALIDATION_SIZE, random_state=SPLIT_SEED
+    )
+    search_data = (fit_features, fit_target, valid_features, valid_target)
+    deadline = time.time() + budget if budget is not None else None
+
+    trials = []
+    if workers == 1:
+        _search_data, _thread_count = search_data, thread_count
+        for params in candidates:
+            if deadline is not None and time.time() >= deadline:
+                break
+            trials.append(fit_candidate(params, deadline))
+            _report_trial(trials[-1], len(trials), len(candidates))
+        return trials
+
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    if start_method == 'fork':
+        # Set here; forked workers share the frames
+        _search_data = search_data
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(search_data, thread_count)) as executor:
+        remaining = iter(candidates)
+        pending = set()
+        while True:
+            # Keep one trial per worker in flight until the budget runs out
+            while len(pending) < workers and (deadline is None or time.time() < deadline):
+                params = next(remaining, None)
+                if params is None:
+                    break
+                pending.add(executor.submit(fit_candidate, params, deadline))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                trials.append(future.result())
+                _report_trial(trials[-1], len(trials), len(candidates))
+    return trials
+
+
+def best_params(trials, base_params=BASE_PARAMS):
+    """
+    Parameters of the completed trial with the lowest validation MSE (base_params if none completed)
+    """
+    completed = [trial for trial in trials if trial['completed']]
+    if not completed:
+        return dict(base_params)
+    return min(completed, key=lambda trial: trial['validation']['mse'])['params']
+
+
+@contextmanager
+def timed(timings, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - started, 3)
+
+
+def new_version(models_dir):
+    """
+    UTC timestamp naming a new version directory (suffixed if that name is taken)
+    """
+    version = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+    candidate, n = version, 1
+    while os.path.exists(os.path.join(models_dir, candidate)):
+        n += 1
+        candidate = f'{version}-{n}'
+    return candidate
+
+
+def write_artifact(models_dir, version, model, schema_document, metrics, started=None):
+    """
+    Write a version directory; it appears under its final name only once complete
+
+    metrics.json is written last. With started (the run's time.perf_counter()
+    start), the 'save' and 'total' entries of metrics['timings'] are filled in
+    just before that, so the record is final before the directory is published.
+    """
+    final_dir = os.path.join(models_dir, version)
+    tmp_dir = os.path.join(models_dir, f'.{version}.tmp')
+    save_started = time.perf_counter()
+    os.makedirs(tmp_dir)
+    joblib.dump(model, os.path.join(tmp_dir, 'catboost_model.pkl'))
+    with open(os.path.join(tmp_dir, SCHEMA_FILE_NAME), 'w') as f:
+        json.dump(schema_document, f, indent=2)
+    if started is not None:
+        now = time.perf_counter()
+        metrics['timings']['save'] = round(now - save_started, 3)
+        metrics['timings']['total'] = round(now - started, 3)
+    with open(os.path.join(tmp_dir, 'metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp_dir, final_dir)
+    return final_dir
+
+
+def install_model(version_dir, model_path=DEFAULT_MODEL_PATH, trees_path=DEFAULT_TREES_PATH):
+    """
+    Serve a trained version: atomically replace model_path and rewrite its tree export
+    """
+    tmp_path = f'{model_path}.tmp'
+    shutil.copyfile(os.path.join(version_dir, 'catboost_model.pkl'), tmp_path)
+    os.replace(tmp_path, model_path)
+    export_model(joblib.load(model_path), trees_path, load_dataset_rows(limit=32))
+
+
+def train(dataset_path=DATASET_PATH, models_dir=DEFAULT_MODELS_DIR, run_search=False, budget=None,
+          workers=None, thread_count=-1):
+    """
+    Train, evaluate and save a new version; returns (version directory, metrics)
+    """
+    from catboost import CatBoostRegressor, __version__ as catboost_version
+    from sklearn.model_selection import train_test_split
+    timings = {}
+    started = time.perf_counter()
+
+    with timed(timings, 'load'):
+        features, target = load_training_data(dataset_path)
+        train_features, test_features, train_target, test_target = train_test_split(
+            features, target, test_size=TEST_SIZE, random_state=SPLIT_SEED
+        )
+
+    trials = []
+    params = dict(BASE_PARAMS)
+    if run_search:
+        with timed(timings, 'search'):
+            trials = search(train_features, train_target, budget, workers)
+        params = best_params(trials)
+
+    with timed(timings, 'fit'):
+        model = CatBoostRegressor(**params, thread_count=thread_count, verbose=False, allow_writing_files=False)
+        train_pool = make_pool(train_features, train_target, thread_count)
+        model.fit(train_pool)
+
+    with timed(timings, 'evaluate'):
+        n_features = train_features.shape[1]
+        metrics = {
+            'train': regression_metrics(train_target, model.predict(train_pool), n_features),
+            'test': regression_metrics(test_target, model.predict(make_pool(test_features)), n_features),
+        }
+
+    # The schema the model was trained against, so a version carries its own contract
+    schema_document = dict(DEFAULT_SCHEMA.to_dict(), target=TARGET)
+    version = new_version(models_dir)
+    os.makedirs(models_dir, exist_ok=True)
+    record = {
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'dataset': {'path': os.path.relpath(dataset_path, API_DIR), 'sha256': dataset_digest(dataset_path),
+                    'rows': len(features), 'test_size': TEST_SIZE, 'split_seed': SPLIT_SEED},
+        'params': params,
+        'metrics': metrics,
+        'search': {'budget_seconds': budget, 'space': SEARCH_SPACE, 'trials': trials} if run_search else None,
+        'timings': timings,
+        'environment': {'python': platform.python_version(), 'catboost': catboost_version,
+                        'cpu_count': os.cpu_count()},
+    }
+    version_dir = write_artifact(models_dir, version, model, schema_document, record, started)
+    return version_dir, record
+
+
+def _report_trial(trial, done, total):
+    params = ', '.join(f'{name}={trial["params"][name]}' for name in SEARCH_SPACE if name in trial['params'])
+    status = '' if trial['completed'] else f' (stopped at {trial["trees"]} trees)'
+    print(f"[{done}/{total}] {params}: validation MSE {trial['validation']['mse']:.1f}, "
+          f"{trial['seconds']:.1f}s{status}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train a new version of the CatBoost model')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='training CSV')
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR, help='where version directories are written')
+    parser.add_argument('--search', action='store_true', help='search hyperparameters before the final fit')
+    parser.add_argument('--budget', type=float, default=None, help='search wall-clock budget in seconds')
+    parser.add_argument('--workers', type=int, default=None, help='search worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=-1, help='CatBoost threads for the final fit')
+    parser.add_argument('--install', action='store_true',
+                        help='serve the new version: replace catboost_model.pkl and re-export its trees')
+    args = parser.parse_args(argv)
+
+    version_dir, record = train(args.dataset, args.models_dir, args.search, args.budget, args.workers, args.threads)
+    for split, values in record['metrics'].items():
+        print(f"{split}: R² {values['r2']:.4f}, adjusted R² {values['adjusted_r2']:.4f}, MSE {values['mse']:.1f}")
+    stages = ', '.join(f'{name} {seconds:.1f}s' for name, seconds in record['timings'].items() if name != 'total')
+    print(f"Trained in {record['timings']['total']:.1f}s ({stages})")
+    print(f"Saved {version_dir}")
+    if args.install:
+        install_model(version_dir)
+        print(f"Installed as {DEFAULT_MODEL_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""
+Flattened oblivious-tree export of the CatBoost model and a NumPy evaluator for it.
+
+The export is a directory of plain .npy arrays plus meta.json. Loading memory-maps
+the arrays, so every worker on a host shares the same page-cache pages, and it
+takes milliseconds without importing catboost or unpickling the model. The
+evaluator reproduces CatBoost's predictions exactly:
+- categorical values are hashed the way CatBoost hashes them (cityhash.py);
+- CTR features are looked up in tables of precomputed CTR values;
+- each tree's leaf comes from its binary split features.
+SHAP values still need the CatBoost model, so this covers the prediction-only paths.
+
+Run from the flask-api directory:
+
+    python tree_model.py export                        # catboost_model.pkl -> catboost_model.trees/
+    python tree_model.py validate                      # compare with model.predict on the dataset
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from cityhash import categorical_hash
+from feature_schema import DEFAULT_SCHEMA
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(API_DIR, 'catboost_model.pkl')
+DEFAULT_TREES_PATH = os.path.join(API_DIR, 'catboost_model.trees')
+DATASET_PATH = os.path.join(API_DIR, '..', '..', 'Dataset', 'Carbon Emission.csv')
+
+FORMAT_VERSION = 1
+
+# CatBoost's hash combiner for CTR projections: hash(a, b) = MAGIC * (a + MAGIC * b) mod 2**64
+_HASH_MAGIC = np.uint64(0x4906ba494954cb65)
+# Marks an empty slot in CatBoost's CTR hash maps (and in ours)
+_EMPTY = 0xFFFFFFFFFFFFFFFF
+
+ARRAY_NAMES = (
+    'split_float_feature', 'split_float_border',
+    'split_onehot_feature', 'split_onehot_value',
+    'split_ctr', 'split_ctr_border',
+    'projection_operands',
+    'operand_float_feature', 'operand_float_border',
+    'operand_onehot_feature', 'operand_onehot_value',
+    'table_projection', 'table_size', 'table_slot_keys', 'table_slot_buckets',
+    'ctr_table', 'ctr_value_offset', 'ctr_values',
+    'tree_splits', 'leaf_values',
+)
+
+
+def _combine_hash(a, b):
+    return _HASH_MAGIC * (a + _HASH_MAGIC * b)
+
+
+def _table_key(projection_hash, table):
+    # _combine_hash on Python ints, for the export side
+    magic = int(_HASH_MAGIC)
+    return (magic * ((projection_hash + magic * table) & _EMPTY)) & _EMPTY
+
+
+def _projection_operands(elements):
+    operands = []
+    for element in elements:
+        kind = element['combination_element']
+        if kind == 'cat_feature_value':
+            operands.append(('cat', element['cat_feature_index']))
+        elif kind == 'float_feature':
+            operands.append(('float', element['float_feature_index'], element['border']))
+        elif kind == 'cat_feature_exact_value':
+            operands.append(('onehot', element['cat_feature_index'], element['value']))
+        else:
+            raise ValueError(f"Unsupported projection element {kind}")
+    return operands
+
+
+def _ctr_values(ctr, table, counts):
+    """
+    Value of ctr for every bucket of its table, plus one for values unseen in training
+    """
+    counts = np.vstack([counts, np.zeros((1, counts.shape[1]))]).astype(np.float32)
+    if ctr['ctr_type'] == 'Borders':
+        # Share of training rows above the target border among rows with this value
+        numerator = counts[:, ctr['target_border_idx'] + 1:].sum(axis=1)
+        denominator = counts.sum(axis=1)
+    else:
+        # Frequency of the value: its count over the table's denominator
+        numerator = counts[:, 0]
+        denominator = np.full(len(counts), table['counter_denominator'], dtype=np.float32)
+    # float32 throughout, like CatBoost, so values land on the same side of every border
+    value = (numerator + np.float32(ctr['prior_numerator'])) / (denominator + np.float32(ctr['prior_denomerator']))
+    return (value + np.float32(ctr['shift'])) * np.float32(ctr['scale'])
+
+
+def flatten_model_json(model_json):
+    """
+    Turn CatBoost's JSON model dump into (arrays, meta) for ObliviousTreeModel
+    """
+    features = model_json['features_info']
+    float_features = features.get('float_features', [])
+    cat_features = features.get('categorical_features', [])
+    ctrs = features.get('ctrs', [])
+    ctr_data = model_json.get('ctr_data', {})
+    trees = model_json['oblivious_trees']
+    if not isinstance(trees, list):
+        raise ValueError('Only symmetric (oblivious) trees can be exported')
+    for ctr in ctrs:
+        if ctr['ctr_type'] not in ('Borders', 'Counter'):
+            raise ValueError(f"Unsupported CTR type {ctr['ctr_type']}")
+
+    # Binary features in CatBoost's split_index order: float borders, one-hot values, CTR borders
+    split_float = [(i, border) for i, f in enumerate(float_features) for border in f.get('borders') or []]
+    split_onehot = [(i, value) for i, f in enumerate(cat_features) for value in f.get('values') or []]
+    split_ctr = [(i, border) for i, c in enumerate(ctrs) for border in c.get('borders') or []]
+
+    # A table per CTR identifier, a projection per distinct element list; the
+    # longest projections come first so each hashing step covers a prefix
+    table_ids = list(dict.fromkeys(ctr['identifier'] for ctr in ctrs))
+    table_elements = {ctr['identifier']: tuple(_projection_operands(ctr['elements'])) for ctr in ctrs}
+    projections = sorted(set(table_elements.values()), key=lambda p: (-len(p), p))
+    # Operands hashed into projections: categorical hashes, then each binarized float and one-hot match
+    float_operands = sorted({op for p in projections for op in p if op[0] == 'float'})
+    onehot_operands = sorted({op for p in projections for op in p if op[0] == 'onehot'})
+    operand_index = {op: len(cat_features) + i for i, op in enumerate(float_operands + onehot_operands)}
+    projection_operands = np.full((len(projections), max(map(len, projections), default=0)), -1, dtype=np.int32)
+    for p, projection in enumerate(projections):
+        for j, op in enumerate(projection):
+            projection_operands[p, j] = op[1] if op[0] == 'cat' else operand_index[op]
+
+    # Every table's buckets in one open-addressing hash table keyed by
+    # hash(projection hash, table); a slot holds the bucket's index in its table
+    table_keys, table_counts = [], []
+    for t, identifier in enumerate(table_ids):
+        table = ctr_data[identifier]
+        entries = np.array(table['hash_map'], dtype=object).reshape(-1, table['hash_stride'])
+        entries = entries[[int(bucket) != _EMPTY for bucket in entries[:, 0]]]
+        table_keys.append([_table_key(int(bucket), t) for bucket in entries[:, 0]])
+        table_counts.append(entries[:, 1:].astype(np.float64))
+    slot_bits = max(4, (2 * sum(map(len, table_keys))).bit_length())
+    slot_keys = np.full(1 << slot_bits, _EMPTY, dtype=np.uint64)
+    # One extra slot, never filled, is where lookups of unseen values land
+    slot_buckets = np.full((1 << slot_bits) + 1, -1, dtype=np.int32)
+    probe_limit = 1
+    for keys in table_keys:
+        for bucket, key in enumerate(keys):
+            if key == _EMPTY:
+                raise ValueError('CTR table key collides with the empty marker; cannot flatten this model')
+            slot = key >> (64 - slot_bits)
+            probes = 1
+            while int(slot_keys[slot]) != _EMPTY:
+                if int(slot_keys[slot]) == key:
+                    raise ValueError('CTR table keys collide; cannot flatten this model')
+                slot = (slot + 1) & ((1 << slot_bits) - 1)
+                probes += 1
+            slot_keys[slot] = key
+            slot_buckets[slot] = bucket
+            probe_limit = max(probe_limit, probes)
+
+    # Each CTR's value for every bucket of its table, computed once here
+    ctr_table = np.array([table_ids.index(ctr['identifier']) for ctr in ctrs], dtype=np.int32)
+    values = [_ctr_values(ctr, ctr_data[ctr['identifier']], table_counts[t]) for ctr, t in zip(ctrs, ctr_table)]
+    ctr_value_offset = np.cumsum([0] + [len(v) for v in values[:-1]]).astype(np.int64)
+
+    depth = max((len(tree['splits']) for tree in trees), default=0)
+    n_binary = len(split_float) + len(split_onehot) + len(split_ctr)
+    # Trees shallower than the deepest one are padded with an always-false split
+    tree_splits = np.full((len(trees), depth), n_binary, dtype=np.int32)
+    leaf_values = np.zeros((len(trees), 1 << depth), dtype=np.float64)
+    for t, tree in enumerate(trees):
+        for d, split in enumerate(tree['splits']):
+            tree_splits[t, d] = split['split_index']
+        leaf_values[t, :len(tree['leaf_values'])] = tree['leaf_values']
+
+    scale, bias = model_json.get('scale_and_bias', [1, [0]])
+    arrays = {
+        'split_float_feature': np.array([f for f, _ in split_float], dtype=np.int32),
+        'split_float_border': np.array([b for _, b in split_float], dtype=np.float32),
+        'split_onehot_feature': np.array([f for f, _ in split_onehot], dtype=np.int32),
+        'split_onehot_value': np.array([v for _, v in split_onehot], dtype=np.uint32),
+        'split_ctr': np.array([c for c, _ in split_ctr], dtype=np.int32),
+        'split_ctr_border': np.array([b for _, b in split_ctr], dtype=np.float32),
+        'projection_operands': projection_operands,
+        'operand_float_feature': np.array([op[1] for op in float_operands], dtype=np.int32),
+        'operand_float_border': np.array([op[2] for op in float_operands], dtype=np.float32),
+        'operand_onehot_feature': np.array([op[1] for op in onehot_operands], dtype=np.int32),
+        'operand_onehot_value': np.array([op[2] for op in onehot_operands], dtype=np.uint32),
+        'table_projection': np.array([projections.index(table_elements[t]) for t in table_ids], dtype=np.int32),
+        'table_size': np.array([len(keys) for keys in table_keys], dtype=np.int32),
+        'table_slot_keys': slot_keys,
+        'table_slot_buckets': slot_buckets,
+        'ctr_table': ctr_table,
+        'ctr_value_offset': ctr_value_offset,
+        'ctr_values': np.concatenate(values) if values else np.zeros(0, dtype=np.float32),
+        'tree_splits': tree_splits,
+        'leaf_values': leaf_values,
+    }
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'model_guid': model_json.get('model_info', {}).get('model_guid'),
+        'float_columns': [f['flat_feature_index'] for f in float_features],
+        'cat_columns': [f['flat_feature_index'] for f in cat_features],
+        'scale': float(scale),
+        'bias': float(bias[0]) if isinstance(bias, list) else float(bias),
+        'trees': len(trees),
+        'depth': depth,
+        'table_slot_bits': slot_bits,
+        'table_probe_limit': probe_limit,
+    }
+    return arrays, meta
+
+
+class ObliviousTreeModel:
+    """
+    NumPy evaluator for a flattened CatBoost model (see export_model)
+    """
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        for name in ARRAY_NAMES:
+            # Plain ndarray views: indexing the np.memmap subclass is slower
+            setattr(self, name, np.asarray(arrays[name]))
+        self.float_columns = list(meta['float_columns'])
+        self.cat_columns = list(meta['cat_columns'])
+        self.scale = meta['scale']
+        self.bias = meta['bias']
+        # Hashing step j folds operand j into the first _hash_steps[j] projections
+        self._hash_steps = [int((column >= 0).sum()) for column in self.projection_operands.T]
+        self._table_ids = np.arange(len(self.table_projection), dtype=np.uint64)[:, None]
+        self._slot_shift = np.uint64(64 - meta['table_slot_bits'])
+        self._slot_mask = (1 << meta['table_slot_bits']) - 1
+        self._tree_index = np.arange(len(self.tree_splits))[:, None]
+        self._leaf_dtype = np.uint8 if self.tree_splits.shape[1] <= 8 else np.intp
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load an export; with mmap the arrays stay in the page cache, shared between processes
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported tree model format {meta.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in ARRAY_NAMES
+        }
+        return cls(arrays, meta)
+
+    def _features(self, rows):
+        # Feature-major (feature, row) layout from here on: every gather below
+        # picks whole features, which are contiguous rows of these arrays
+        rows = np.asarray(rows, dtype=object).reshape(len(rows), -1)
+        floats = rows[:, self.float_columns].T.astype(np.float32)
+        hashes = np.array([[categorical_hash(value) for value in column] for column in rows[:, self.cat_columns].T],
+                          dtype=np.uint32).reshape(len(self.cat_columns), len(rows))
+        return floats, hashes
+
+    def _ctr_features(self, floats, hashes):
+        operands = np.concatenate([
+            # Categorical hashes enter projections sign-extended to 64 bits
+            hashes.astype(np.int32).astype(np.int64).view(np.uint64),
+            (floats[self.operand_float_feature] > self.operand_float_border[:, None]).astype(np.uint64),
+            (hashes[self.operand_onehot_feature] == self.operand_onehot_value[:, None]).astype(np.uint64),
+        ])
+        projections = np.zeros((len(self.projection_operands), floats.shape[1]), dtype=np.uint64)
+        for step, count in enumerate(self._hash_steps):
+            projections[:count] = _combine_hash(projections[:count], operands[self.projection_operands[:count, step]])
+
+        keys = _combine_hash(projections[self.table_projection], self._table_ids)
+        buckets = self.table_slot_buckets[self._find_slots(keys.reshape(-1))].reshape(keys.shape)
+        buckets = np.where(buckets < 0, self.table_size[:, None], buckets)
+        return self.ctr_values[self.ctr_value_offset[:, None] + buckets[self.ctr_table]]
+
+    def _find_slots(self, keys):
+        """
+        Hash-table slot of every key; keys in no table get the spare slot past the end
+        """
+        starts = (keys >> self._slot_shift).astype(np.intp)
+        slots = starts.copy()
+        stored = self.table_slot_keys[slots]
+        hit = stored == keys
+        # Probing continues past slots holding other keys and stops at an empty one
+        pending = np.flatnonzero(~hit & (stored != _EMPTY))
+        slots[~hit] = self._slot_mask + 1
+        for probe in range(1, self.meta['table_probe_limit']):
+            if not len(pending):
+                break
+            candidates = (starts[pending] + probe) & self._slot_mask
+            stored = self.table_slot_keys[candidates]
+            hit = stored == keys[pending]
+            slots[pending[hit]] = candidates[hit]
+            pending = pending[~hit & (stored != _EMPTY)]
+        return slots
+
+    def binary_features(self, rows):
+        """
+        (binary features + 1, rows) bool matrix of every split condition; the last
+        feature is the always-false split that pads shallow trees
+        """
+        floats, hashes = self._features(rows)
+        return np.concatenate([
+            floats[self.split_float_feature] > self.split_float_border[:, None],
+            hashes[self.split_onehot_feature] == self.split_onehot_value[:, None],
+            self._ctr_features(floats, hashes)[self.split_ctr] > self.split_ctr_border[:, None],
+            np.zeros((1, floats.shape[1]), dtype=bool),
+        ])
+
+    def tree_leaves(self, binary, trees=None):
+        """
+        (trees, rows) leaf index of every tree (or just the given trees) from binary_features output
+        """
+        splits = self.tree_splits if trees is None else self.tree_splits[trees]
+        leaves = np.zeros((len(splits), binary.shape[1]), dtype=self._leaf_dtype)
+        for depth, features in enumerate(splits.T):
+            leaves |= binary[features].astype(self._leaf_dtype) << depth
+        return leaves
+
+    def predict(self, rows):
+        """
+        Raw predictions for model-ordered rows (schema.encode output or a DataFrame's values)
+        """
+        leaves = self.tree_leaves(self.binary_features(rows))
+        return self.leaf_values[self._tree_index, leaves].sum(axis=0) * self.scale + self.bias
+
+
+def export_model(model, directory, validation_rows=()):
+    """
+    Write model's flattened trees to directory (.npy arrays + meta.json)
+
+    validation_rows are stored with model's predictions for them, so a loader can
+    check the export still matches the model it is served next to.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'model.json')
+        model.save_model(json_path, format='json')
+        with open(json_path) as f:
+            arrays, meta = flatten_model_json(json.load(f))
+
+    validation_rows = [list(row) for row in validation_rows]
+    if validation_rows:
+        meta['validation_rows'] = validation_rows
+        meta['validation_predictions'] = [float(p) for p in model.predict(DEFAULT_SCHEMA.to_pool(validation_rows))]
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def matches_validation(tree_model, model=None, tolerance=1e-6):
+    """
+    True if tree_model reproduces model's predictions (or, without a model, the
+    ones stored at export time) on the validation rows stored with it
+    """
+    rows = tree_model.meta.get('validation_rows')
+    if not rows:
+        return False
+    if model is not None:
+        expected = model.predict(DEFAULT_SCHEMA.to_pool(rows))
+    else:
+        expected = np.asarray(tree_model.meta['validation_predictions'])
+    return bool(np.allclose(tree_model.predict(rows), expected, rtol=0,
+                            atol=tolerance * max(1.0, abs(tree_model.bias))))
+
+
+def load_dataset_rows(path=DATASET_PATH, limit=None):
+    with open(path, newline='') as f:
+        records = list(itertools.islice(csv.DictReader(f), limit))
+    return DEFAULT_SCHEMA.encode_many(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('command', choices=['export', 'validate'])
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='pickled CatBoost model')
+    parser.add_argument('--trees', default=DEFAULT_TREES_PATH, help='export directory')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='rows to validate against')
+    parser.add_argument('--rows', type=int, default=None, help='validate on the first N dataset rows')
+    args = parser.parse_args(argv)
+
+    import joblib
+    model = joblib.load(args.model)
+    if args.command == 'export':
+        meta = export_model(model, args.trees, load_dataset_rows(args.dataset, 32))
+        print(f"Exported {meta['trees']} trees (depth {meta['depth']}) to {args.trees}")
+        return
+
+    rows = load_dataset_rows(args.dataset, args.rows)
+    tree_model = ObliviousTreeModel.load(args.trees)
+    started = time.perf_counter()
+    expected = model.predict(DEFAULT_SCHEMA.to_pool(rows))
+    catboost_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = tree_model.predict(rows)
+    numpy_seconds = time.perf_counter() - started
+    difference = np.abs(actual - expected)
+    print(f"{len(rows)} rows: max abs difference {difference.max():.3g}, mean {difference.mean():.3g}")
+    print(f"model.predict {catboost_seconds * 1000:.1f} ms, tree_model.predict {numpy_seconds * 1000:.1f} ms")
+    if difference.max() > 1e-6 * max(1.0, abs(tree_model.bias)):
+        raise SystemExit('Export does not match the model')
+
+
+if __name__ == '__main__':
+    main()
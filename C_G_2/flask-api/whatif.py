@@ -0,0 +1,103 @@
+"""
+What-if comparisons: how the prediction moves when one answer changes.
+
+A base questionnaire plus a list of single-field changes becomes one batch of
+rows - the base row and one copy per change with only that field replaced -
+scored with a single model call (the memory-mapped tree export when the
+pipeline uses it). Without explicit changes every other answer of every
+categorical question is tried, which is about 60 rows for a typical record.
+Results are cached per (record, changes, model), so a frontend re-rendering
+the same comparison is served without scoring again.
+"""
+import os
+
+from instrumentation import stage
+from prediction_cache import PREDICTION_CACHE_TTL, LocalLRUBackend, canonical_key
+
+# Comparisons kept per process (each is one base record with all its changes)
+WHATIF_CACHE_SIZE = int(os.environ.get('WHATIF_CACHE_SIZE', 1024))
+
+
+class WhatIfScorer:
+    """
+    Prediction deltas for single-field changes to a record, scored as one batch
+    """
+
+    def __init__(self, options=None, max_changes=1000, cache_size=WHATIF_CACHE_SIZE):
+        # Answers tried per categorical field; None uses the scoring schema's allowed values
+        self.options = options
+        self.max_changes = max_changes
+        self.results = LocalLRUBackend(cache_size)
+
+    def alternatives(self, row, schema, fields=None):
+        """
+        [(field, value), ...] for every known answer of each categorical field
+        (all of them by default) that differs from the encoded row's answer
+        """
+        options = self.options if self.options is not None else schema.allowed_values
+        columns = schema.columns
+        if fields is None:
+            fields = [field for field in columns if field in options]
+        unknown = [field for field in fields if field not in options]
+        if unknown:
+            raise ValueError(f"No answer options for {', '.join(map(repr, unknown))}")
+        return [
+            (field, value)
+            for field in fields
+            for value in options[field]
+            if value != row[columns.index(field)]
+        ]
+
+    def parse_changes(self, changes, columns):
+        """
+        [{'field': ..., 'value': ...}, ...] -> [(field, value), ...]; raises ValueError
+        for anything that is not a change to a known field
+        """
+        if not isinstance(changes, list) or not all(
+                isinstance(change, dict) and 'field' in change and 'value' in change for change in changes):
+            raise ValueError('Expected "changes": [{"field": ..., "value": ...}, ...]')
+        if len(changes) > self.max_changes:
+            raise ValueError(f'Too many changes: {len(changes)} (max {self.max_changes})')
+        columns = set(columns)
+        unknown = [change['field'] for change in changes if change['field'] not in columns]
+        if unknown:
+            raise ValueError(f"Unknown field {unknown[0]!r}")
+        return [(change['field'], change['value']) for change in changes]
+
+    def compare(self, pipeline, data, changes=None, fields=None):
+        """
+        Prediction for data and for data with each change applied on its own, from
+        pipeline's model (its schema, model, tree export and fingerprint are used)
+
+        changes is a list of (field, value); without it, every alternative answer of
+        fields (all categorical fields by default) is tried. Returns
+        {'prediction': ..., 'changes': [{'field', 'value', 'prediction', 'delta'}, ...]}
+        in the order the changes were given.
+        """
+        schema = pipeline.schema
+        with stage('preprocess'):
+            row = schema.encode(data)
+            if changes is None:
+                changes = self.alternatives(row, schema, fields)
+            key = canonical_key(row, pipeline.fingerprint(), 'whatif', [list(c) for c in changes])
+
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        with stage('preprocess'):
+            rows = [row] + [schema.encode({**data, field: value}) for field, value in changes]
+        with stage('predict'):
+            predictions = pipeline.predict_rows(rows)
+
+        base = float(predictions[0])
+        result = {
+            'prediction': base,
+            'changes': [
+                {'field': field, 'value': value, 'prediction': float(prediction),
+                 'delta': float(prediction) - base}
+                for (field, value), prediction in zip(changes, predictions[1:])
+            ],
+        }
+        self.results.set(key, result, PREDICTION_CACHE_TTL)
+        return result